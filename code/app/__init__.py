@@ -14,6 +14,10 @@ def create_app(config_name='default'):
     db.init_app(app)
     migrate = Migrate(app, db)
 
+    # 查询结果缓存容量
+    from app.utils.cache import init_cache
+    init_cache(app)
+
     # 初始化Flask-Login
     login_manager = LoginManager()
     login_manager.init_app(app)
@@ -130,12 +130,20 @@ TRANSLATIONS = {
         'Modified data becomes LABELED;': '修改的数据将变为 LABELED；',
         'Prelabeled must be checked as "Accept" to become LABELED;': '预打标须勾选“接受”才会变为 LABELED；',
         'Historical stays unchanged if not modified.': '历史数据未修改则保持不变。',
+        'First': '首页',
+        'Last': '末页',
+        'Sort by': '排序',
+        'Review date, newest first': '评论日期(新→旧)',
+        'Review date, oldest first': '评论日期(旧→新)',
+        'Brand, A to Z': '品牌(A→Z)',
+        'Brand, Z to A': '品牌(Z→A)',
         'Previous': '上一页',
         'Next': '下一页',
         'Go to page': '跳转到',
         'Page number': '页码',
         'Go': '跳转',
         'records in total': '条记录共计',
+        'Estimated from a sample of rows': '按抽样行估算',
         'page': '页',
         'Select All': '全选',
         'Clear': '清空',
@@ -318,10 +326,47 @@ TRANSLATIONS = {
         'File is': '文件大小为',
         'import may take a while, do not close the page. Continue?': '导入可能需要较长时间，请勿关闭页面，是否继续？',
         'Importing, please wait...': '正在导入，请稍候...',
+        'Uploading, please wait...': '正在上传，请稍候...',
+        'Import runs in the background, you can leave this page': '导入在后台执行，可离开本页面',
+        'Import Progress': '导入进度',
+        'Cancel Import': '取消导入',
+        'Cancel this import? Chunks already imported are kept.': '确认取消导入吗？已导入的数据块会保留。',
+        'Speed': '速度',
+        'rows/s': '条/秒',
+        'Elapsed': '已用时',
+        'ETA': '预计剩余',
+        'Recent Import Jobs': '最近导入任务',
+        'File': '文件',
+        'Message': '信息',
+        'No import jobs': '暂无导入任务',
+        'Import Mode': '导入模式',
+        'Standard (chunked)': '标准(分块导入)',
+        'Parallel (multi-core, for large files)': '并行(多核解析，适合大文件)',
+        'Streaming bulk load (LOAD DATA, all-or-nothing)': '流式极速导入(LOAD DATA，失败整体回滚)',
+        'Monthly merge (keep labels, match by business key)': '月度合并导入(按业务键匹配，保留打标)',
+        'Import Checkpoints': '导入检查点',
+        'Processed rows': '已处理行数',
+        'Imported': '已导入',
+        'Rejected': '已拒绝',
+        'Updated At': '更新时间',
+        'Resume': '续传',
+        'Rejected rows': '拒绝行',
+        'Standard import can be resumed from the last committed chunk; rows that cannot be converted are written to a downloadable reject file': '标准导入失败或中断后可从最后提交的数据块续传；无法转换的行会写入可下载的拒绝文件',
+        'Replace all data (staging table, atomic swap)': '整表替换(影子表导入后原子切换)',
+        'Delete rows whose business key is not in this file': '删除本次文件中不存在的业务数据',
+        'Monthly merge updates metrics of existing rows and keeps their labels (Labeled becomes Historical)': '月度合并导入会更新已有数据的指标列并保留打标结果（Labeled 转为 Historical）',
         'Labeled count': '已打标',
         'Unlabeled count': '未打标',
         'Export all data': '导出所有数据',
         'Export labeled data': '导出已打标数据',
+        'Compress as gzip (.csv.gz)': '压缩为 gzip (.csv.gz)',
+        'Export Options': '导出选项',
+        'File format': '文件格式',
+        'Parquet (columnar, smaller and faster to load in pandas)': 'Parquet(列式存储，文件更小，pandas 读取更快)',
+        'Columns': '导出列',
+        'Labels only': '仅标签列',
+        'Export filtered results': '导出筛选结果',
+        'Export the rows matching the applied filters as CSV': '按当前已应用的筛选条件导出 CSV',
         'Export all sample data from the database (labeled and unlabeled)': '导出数据库中的所有样本数据(包含已打标和未打标)',
         "Export data with status 'Labeled' and 'Historical'": "导出状态为'Labeled'和'Historical'的数据",
         'Download All Data': '下载全部数据',
@@ -17,6 +17,9 @@ class User(UserMixin, db.Model):
     role = db.Column(db.Enum('Data_admin', 'BU_admin', 'Labeller'), nullable=False)
     category_arr = db.Column(db.JSON)  # NULL表示全部权限
     brand_arr = db.Column(db.JSON)     # NULL表示全部权限
+    # 物化权限范围的 key(见 PermissionScopeValue)，与当前 category_arr/brand_arr 不一致时查询回退为 IN 列表
+    category_scope_key = db.Column(db.String(32))
+    brand_scope_key = db.Column(db.String(32))
     is_active = db.Column(db.Boolean, default=True)
 
     def set_password(self, password):
@@ -63,9 +66,30 @@ class User(UserMixin, db.Model):
         return f'<User {self.username}>'
 
 
+class PermissionScopeValue(db.Model):
+    """物化的权限范围：一组 category_arr 或 brand_arr 取值展开为 (scope_key, value) 行。
+
+    scope_key 是 (维度, 排序去重后的取值) 的哈希，内容相同的权限共享同一组行，
+    查询按 scope_key 走主键索引取值并与 sample_data 半连接，代替在每条 SQL 中内联 IN 列表。
+    由 admin 创建/编辑用户时写入并记录到 user.category_scope_key/brand_scope_key(见 app/utils/permission_scope.py)。
+    """
+    __tablename__ = 'permission_scope_value'
+
+    scope_key = db.Column(db.String(32), primary_key=True)
+    value = db.Column(db.String(255), primary_key=True)
+
+    def __repr__(self):
+        return f'<PermissionScopeValue {self.scope_key} {self.value}>'
+
+
 class SampleData(db.Model):
     """样本数据模型 - 严格按照CSV表头"""
     __tablename__ = 'sample_data'
+    __table_args__ = (
+        # 列表页排序 + 键集分页：(权限范围, 排序列, id)
+        db.Index('ix_sample_data_category_review_date', 'category', 'latest_review_date', 'id'),
+        db.Index('ix_sample_data_category_brand_id', 'category', 'brand', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     eRetailer = db.Column(db.String(255))
@@ -193,3 +217,47 @@ class AuditLog(db.Model):
 
     def __repr__(self):
         return f'<AuditLog {self.id} {self.action} {self.entity_type}:{self.entity_id}>'
+
+
+class ImportCheckpoint(db.Model):
+    """导入检查点：标准导入每提交一个数据块，同一事务内记录已处理的源文件行数。
+
+    导入失败或进程中断后，可从最后一个已提交的数据块继续导入，无需清空重传。
+    转换失败的行写入拒绝文件(reject_path)，reject_bytes 为与检查点一致的拒绝文件长度，
+    续传时据此截断，保证拒绝文件中每行只出现一次。
+    """
+    __tablename__ = 'import_checkpoint'
+
+    id = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(db.String(32), index=True)  # 最近一次执行该导入的后台任务
+    filename = db.Column(db.String(255))
+    file_path = db.Column(db.String(500))
+    file_size = db.Column(db.BigInteger)              # 续传前校验文件未被替换
+    status = db.Column(db.String(20), index=True)     # queued/running/completed/failed/cancelled
+    rows_done = db.Column(db.Integer, default=0)      # 已处理的源文件数据行(含被拒绝的行)
+    imported = db.Column(db.Integer, default=0)
+    rejected = db.Column(db.Integer, default=0)
+    reject_path = db.Column(db.String(500))
+    reject_bytes = db.Column(db.BigInteger, default=0)
+    message = db.Column(db.Text)
+    username = db.Column(db.String(50))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'task_id': self.task_id,
+            'filename': self.filename,
+            'status': self.status,
+            'rows_done': self.rows_done,
+            'imported': self.imported,
+            'rejected': self.rejected,
+            'message': self.message,
+            'username': self.username,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else '',
+            'updated_at': self.updated_at.strftime('%Y-%m-%d %H:%M:%S') if self.updated_at else '',
+        }
+
+    def __repr__(self):
+        return f'<ImportCheckpoint {self.id} {self.status} {self.rows_done}>'
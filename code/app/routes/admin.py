@@ -1,17 +1,23 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file, jsonify
-from app.models import User, SampleData, db
+from flask import (Blueprint, render_template, request, redirect, url_for, flash, send_file, jsonify, current_app,
+                   Response, stream_with_context)
+from app.models import User, SampleData, ImportCheckpoint, db
 from app.utils.decorators import admin_required
-from app.utils.csv_handler import allowed_file, import_csv_to_db, export_samples_to_csv, get_unique_categories, get_unique_brands
+from app.utils.csv_handler import (allowed_file, iter_samples_csv, gzip_chunks, resolve_export_columns, EXPORT_COLUMNS,
+                                   get_unique_categories, get_unique_brands)
+from app.utils.columnar_export import iter_samples_parquet, PARQUET_AVAILABLE, PARQUET_MIMETYPE
 from app.utils.progress_tracker import progress_tracker
-from app.utils.cache import clear_cache
-from app.utils.audit import log_action
+from app.utils.import_jobs import import_job_runner, IMPORT_MODES
+from app.utils.checkpoint_import import (claim_for_resume, create_checkpoint, import_csv_with_checkpoint,
+                                         list_checkpoints)
+from app.utils.cache import clear_cache, invalidate_scopes
+from app.utils.audit import log_action, capture_actor
+from app.utils.permission_scope import materialize_user_scope, prune_unused_scopes
 import os
 import uuid
 from datetime import datetime
 from datetime import timedelta
 import re
 from werkzeug.utils import secure_filename
-from threading import Thread
 from sqlalchemy import text
 
 bp = Blueprint('admin', __name__, url_prefix='/admin')
@@ -63,6 +69,16 @@ def _apply_log_change(log, use_old_values):
     return True, '', [s.id for s in matches]
 
 
+def _invalidate_sample_scopes(sample_ids):
+    """回滚后只失效被改动样本所在 (category, brand) 范围的缓存"""
+    sample_ids = list(sample_ids)
+    scopes = set()
+    for start in range(0, len(sample_ids), 1000):
+        scopes.update(db.session.query(SampleData.category, SampleData.brand)
+                      .filter(SampleData.id.in_(sample_ids[start:start + 1000])).distinct().all())
+    invalidate_scopes(scopes)
+
+
 def _find_batch_logs(seed_log):
     """定位与 seed_log 同一次批量提交产生的日志集合。"""
     from app.models import AuditLog
@@ -127,24 +143,34 @@ def upload():
             filepath = os.path.join(upload_folder, filename)
             file.save(filepath)
 
-            # 直接同步导入(简单可靠)
-            success, message = import_csv_to_db(filepath)
-            if success:
-                # 导入成功后清空缓存,使新导入的数据在筛选和打标候选项中立即可见
-                clear_cache()
-                log_action('upload', 'data', detail=f'上传导入文件 {filename}: {message}')
+            # 提交后台导入任务,请求立即返回,页面轮询进度
+            mode = request.form.get('mode', 'standard')
+            import_func = IMPORT_MODES.get(mode, IMPORT_MODES['standard'])
+            import_kwargs = {}
+            actor = capture_actor()
+            checkpoint = None
+            if import_func is import_csv_with_checkpoint:
+                # 标准导入按数据块记录检查点，失败或中断后可续传
+                checkpoint = create_checkpoint(filepath, filename, actor.get('username'))
+                import_kwargs['checkpoint_id'] = checkpoint.id
+            if mode == 'merge' and request.form.get('delete_missing') == '1':
+                import_kwargs['delete_missing'] = True
+            task_id = import_job_runner.submit(current_app._get_current_object(), filepath, filename,
+                                               actor, import_func=import_func, **import_kwargs)
+            if checkpoint is not None:
+                checkpoint.task_id = task_id
                 db.session.commit()
-                flash(message, 'success')
-            else:
-                flash(message, 'danger')
-
-            return redirect(url_for('admin.upload'))
+            flash(f'文件 {filename} 已上传，正在后台导入', 'info')
+            return redirect(url_for('admin.upload', task_id=task_id))
         else:
             flash('只支持CSV和XLSX文件', 'danger')
             return redirect(request.url)
 
-    # GET请求,显示上传页面
-    return render_template('admin/upload.html')
+    # GET请求,显示上传页面及最近的导入任务
+    return render_template('admin/upload.html',
+                           task_id=request.args.get('task_id', ''),
+                           jobs=import_job_runner.list_jobs(),
+                           checkpoints=list_checkpoints())
 
 @bp.route('/upload/progress/<task_id>')
 @admin_required
@@ -156,6 +182,50 @@ def upload_progress(task_id):
     else:
         return jsonify({'status': 'not_found', 'message': '任务不存在'}), 404
 
+@bp.route('/upload/jobs')
+@admin_required
+def upload_jobs():
+    """最近的导入任务列表(AJAX接口)"""
+    return jsonify(import_job_runner.list_jobs())
+
+@bp.route('/upload/jobs/<task_id>/cancel', methods=['POST'])
+@admin_required
+def cancel_upload_job(task_id):
+    """取消导入任务(AJAX接口)"""
+    if import_job_runner.cancel(task_id):
+        return jsonify({'status': 'ok', 'message': '已请求取消导入'})
+    return jsonify({'status': 'not_found', 'message': '任务不存在或已结束'}), 404
+
+@bp.route('/upload/checkpoints/<int:checkpoint_id>/resume', methods=['POST'])
+@admin_required
+def resume_upload(checkpoint_id):
+    """从检查点续传失败/中断的导入"""
+    checkpoint = ImportCheckpoint.query.get_or_404(checkpoint_id)
+    actor = capture_actor()
+    # 先占用检查点再提交任务：重复提交时只有一个请求能占用成功
+    task_id = import_job_runner.reserve(checkpoint.filename, actor)
+    if not claim_for_resume(checkpoint, task_id):
+        import_job_runner.release(task_id)
+        flash('该导入无法续传（正在执行、已完成或上传文件已不存在）', 'warning')
+        return redirect(url_for('admin.upload'))
+
+    import_job_runner.submit(current_app._get_current_object(), checkpoint.file_path, checkpoint.filename, actor,
+                             import_func=import_csv_with_checkpoint, task_id=task_id, checkpoint_id=checkpoint.id)
+    flash(f'文件 {checkpoint.filename} 将从第 {checkpoint.rows_done + 1} 行继续导入', 'info')
+    return redirect(url_for('admin.upload', task_id=task_id))
+
+@bp.route('/upload/checkpoints/<int:checkpoint_id>/rejects')
+@admin_required
+def download_rejects(checkpoint_id):
+    """下载导入时被拒绝的数据行"""
+    checkpoint = ImportCheckpoint.query.get_or_404(checkpoint_id)
+    if not checkpoint.rejected or not os.path.exists(checkpoint.reject_path or ''):
+        flash('该导入没有被拒绝的数据行', 'warning')
+        return redirect(url_for('admin.upload'))
+    stem = os.path.splitext(checkpoint.filename or 'import')[0]
+    return send_file(checkpoint.reject_path, as_attachment=True, download_name=f'{stem}_rejects.csv',
+                     mimetype='text/csv')
+
 @bp.route('/users', methods=['GET'])
 @admin_required
 def users():
@@ -191,6 +261,7 @@ def create_user():
         user.set_password(password)
 
         db.session.add(user)
+        materialize_user_scope(user)
         db.session.commit()
 
         log_action('user_create', 'user', user.id, detail=f'创建用户 {username}（角色 {role}）')
@@ -224,6 +295,9 @@ def edit_user(user_id):
         if new_password:
             user.set_password(new_password)
 
+        # 刷新物化权限范围，并删除已无用户引用的旧范围
+        materialize_user_scope(user)
+        prune_unused_scopes()
         db.session.commit()
         log_action('user_edit', 'user', user.id, detail=f'编辑用户 {user.username}')
         db.session.commit()
@@ -260,6 +334,10 @@ def brands_for_category():
     brand_names = [brand[0] for brand in brands if brand[0]]
     return jsonify(sorted(brand_names))
 
+# 下载页"仅标签列"快捷选择：业务定位列 + 打标结果，不含描述/链接等长文本
+LABEL_EXPORT_COLUMNS = ['eRetailer', 'category', 'brand', 'sku', 'sku_id', 'prod_attributes1', 'prod_attributes2',
+                        'prod_attributes3', 'prod_attributes4', 'prod_attributes5', 'status']
+
 @bp.route('/download', methods=['GET', 'POST'])
 @admin_required
 def download():
@@ -267,31 +345,36 @@ def download():
     if request.method == 'POST':
         download_type = request.form.get('type', 'all')
 
-        # 根据类型获取数据
+        # 根据类型确定过滤条件
         if download_type == 'labeled':
             # 将 HISTORICAL 一并视为已打标
-            samples = SampleData.query.filter(SampleData.status.in_(['Labeled', 'Historical'])).all()
+            criteria = (SampleData.status.in_(['Labeled', 'Historical']),)
         else:
-            samples = SampleData.query.all()
+            criteria = ()
 
-        if not samples:
+        if db.session.query(SampleData.id).filter(*criteria).first() is None:
             flash('没有数据可导出', 'warning')
             return redirect(url_for('admin.download'))
 
-        # 生成文件
+        # 流式导出: 分批读取、边编码边发送，不在内存或磁盘上生成完整文件
+        export_format = request.form.get('format', 'csv')
+        if export_format == 'parquet' and not PARQUET_AVAILABLE:
+            flash('服务器未安装 pyarrow，无法导出 Parquet', 'danger')
+            return redirect(url_for('admin.download'))
+        columns = resolve_export_columns(request.form.getlist('columns'))
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"export_{download_type}_{timestamp}.csv"
-        output_folder = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'exports')
-        os.makedirs(output_folder, exist_ok=True)
-
-        output_path = os.path.join(output_folder, filename)
-        success, message = export_samples_to_csv(samples, output_path)
-
-        if success:
-            return send_file(output_path, as_attachment=True, download_name=filename)
+        if export_format == 'parquet':
+            filename = f"export_{download_type}_{timestamp}.parquet"
+            chunks, mimetype = iter_samples_parquet(*criteria, columns=columns), PARQUET_MIMETYPE
+        elif export_format == 'csv_gz':
+            filename = f"export_{download_type}_{timestamp}.csv.gz"
+            chunks, mimetype = gzip_chunks(iter_samples_csv(*criteria, columns=columns)), 'application/gzip'
         else:
-            flash(message, 'danger')
-            return redirect(url_for('admin.download'))
+            filename = f"export_{download_type}_{timestamp}.csv"
+            chunks, mimetype = iter_samples_csv(*criteria, columns=columns), 'text/csv'
+        return Response(stream_with_context(chunks), mimetype=mimetype,
+                        headers={'Content-Disposition': f'attachment; filename={filename}',
+                                 'X-Accel-Buffering': 'no'})
 
     # 统计信息
     total_count = SampleData.query.count()
@@ -302,7 +385,10 @@ def download():
     return render_template('admin/download.html',
                          total_count=total_count,
                          labeled_count=labeled_count,
-                         unlabeled_count=unlabeled_count)
+                         unlabeled_count=unlabeled_count,
+                         export_columns=EXPORT_COLUMNS,
+                         label_columns=LABEL_EXPORT_COLUMNS,
+                         parquet_available=PARQUET_AVAILABLE)
 
 @bp.route('/clear_data', methods=['POST'])
 @admin_required
@@ -513,7 +599,7 @@ def logs_revert(log_id):
                detail=f'回滚日志 #{log.id}，匹配 {len(matched_ids)} 条（当前 ID: {ids_str}）',
                sample=_find_samples_by_business_key(log)[0])
     db.session.commit()
-    clear_cache()
+    _invalidate_sample_scopes(matched_ids)
 
     if len(matched_ids) > 1:
         flash(f'检测到 {len(matched_ids)} 条相同业务数据，已全部回滚至修改前状态（ID: {ids_str}）', 'warning')
@@ -557,7 +643,7 @@ def logs_revert_batch(log_id):
     log_action('batch_revert', 'sample', min(affected_ids) if affected_ids else None,
                detail=detail, sample=sample_for_log)
     db.session.commit()
-    clear_cache()
+    _invalidate_sample_scopes(affected_ids)
 
     flash(f'批量回滚完成（整批）：回滚日志 {reverted_count} 条，影响样本 {len(affected_ids)} 条', 'success')
     return redirect(url_for('admin.logs'))
@@ -614,7 +700,7 @@ def logs_revert_user_before():
     log_action('time_revert', 'sample', min(affected_ids) if affected_ids else None,
                detail=detail, sample=sample_for_log)
     db.session.commit()
-    clear_cache()
+    _invalidate_sample_scopes(affected_ids)
 
     flash(f'已将用户 {username} 回滚至 {before_str} 之前：回滚日志 {reverted_count} 条，影响样本 {len(affected_ids)} 条', 'success')
     return redirect(url_for('admin.logs'))
@@ -656,7 +742,7 @@ def logs_undo_revert(log_id):
                    detail=f'撤销整批回滚: seed_log #{log.id}, 恢复日志 {restored_logs} 条, 样本 {len(affected_ids)} 条',
                    sample=sample_for_log)
         db.session.commit()
-        clear_cache()
+        _invalidate_sample_scopes(affected_ids)
         flash(f'撤销整批回滚成功：恢复日志 {restored_logs} 条，影响样本 {len(affected_ids)} 条', 'success')
         return redirect(url_for('admin.logs'))
 
@@ -671,7 +757,7 @@ def logs_undo_revert(log_id):
                detail=f'撤销单条回滚日志 #{log.id}，恢复 {len(matched_ids)} 条样本',
                sample=sample_for_log)
     db.session.commit()
-    clear_cache()
+    _invalidate_sample_scopes(matched_ids)
 
     flash(f'撤销单条回滚成功：恢复样本 {len(matched_ids)} 条', 'success')
     return redirect(url_for('admin.logs'))
@@ -1,10 +1,19 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import (Blueprint, render_template, request, redirect, url_for, flash, jsonify, session, Response,
+                   stream_with_context, current_app)
 from flask_login import current_user
 from app.models import SampleData, db
 from app.utils.decorators import login_required
-from app.utils.cache import cached, clear_cache
+from app.utils.cache import cached, invalidate_scopes
+from app.utils.facet_index import FacetIndex
+from app.utils.filter_spec import FilterSpecCompiler
+from app.utils.fulltext_search import FulltextSearch
+from app.utils.keyset import KeysetPaginator
+from app.utils.label_taxonomy import LabelTaxonomy
+from app.utils.permission_scope import scope_condition
 from app.utils.audit import log_action, diff_fields, snapshot_fields
-from sqlalchemy import and_, or_, func, case
+from app.utils.csv_handler import iter_samples_csv
+from sqlalchemy import and_, or_, func, case, literal, select, union_all
+from werkzeug.datastructures import MultiDict
 from datetime import datetime
 import re
 import uuid
@@ -29,12 +38,32 @@ CASCADE_FIELD_MAP = {
 
 ATTRIBUTE_FILTER_KEYS = {'attr1', 'attr2', 'attr3', 'attr4', 'attr5'}
 EMPTY_FILTER_VALUE = '__FILTER_EMPTY__'
+# 联动候选项的进程内分面索引(见 app/utils/facet_index.py)
+cascade_facet_index = FacetIndex(CASCADE_FIELD_MAP, empty_marker=EMPTY_FILTER_VALUE)
 SEARCH_FIELD_MAP = {
     'product_description': SampleData.product_description,
     'sku': SampleData.sku,
     'category': SampleData.category,
 }
 SEARCH_FIELDS = tuple(SEARCH_FIELD_MAP.values())
+# 搜索字段的 ngram 全文索引(见 app/utils/fulltext_search.py)，不可用时回退为 LIKE
+fulltext_search = FulltextSearch(SampleData.__tablename__)
+# 列表页可排序字段(sort 参数，前加 '-' 为降序)；均有 (category, 字段, id) 复合索引，按键集分页。
+# total_comments 为文本列(取值为原始文本，按字符串比较时 "9" 排在 "100" 之后)，不提供排序
+SAMPLE_SORT_FIELD_MAP = {
+    'latest_review_date': SampleData.latest_review_date,
+    'brand': SampleData.brand,
+}
+sample_paginator = KeysetPaginator(SampleData.id, SAMPLE_SORT_FIELD_MAP)
+# 状态筛选值 -> summarize_status_query 中对应的计数
+STATUS_STAT_KEYS = {
+    'Unlabeled': 'unlabeled',
+    'Labeled': 'labeled',
+    'Prelabeled': 'prelabeled',
+    'Historical': 'historical',
+    'Incomplete': 'incomplete',
+    'Uncertain': 'uncertain',
+}
 MAX_SEARCH_TERMS = 10
 MAX_SEARCH_TERM_LENGTH = 100
 
@@ -75,6 +104,22 @@ def ci_contains(field, value):
     return func.lower(func.coalesce(field, '')).like(f'%{escaped}%', escape='\\')
 
 
+def search_term_condition(fields, term):
+    """term 出现在 fields 任一字段中(不区分大小写的子串)。
+    有全文索引的字段先由索引取候选行，再用 ci_contains 在候选行上精确复核。
+    """
+    engine = db.session.get_bind()
+    conditions = []
+    for field in fields:
+        match = fulltext_search.match_condition(field, term, engine)
+        if match is None:
+            conditions.append(ci_contains(field, term))
+        else:
+            candidates = select(SampleData.id).where(match, ci_contains(field, term))
+            conditions.append(SampleData.id.in_(candidates))
+    return or_(*conditions)
+
+
 def empty_field_condition(field):
     """NULL、空字符串和仅含空白的字符串均视为空值。"""
     return or_(field.is_(None), func.trim(field) == '')
@@ -103,33 +148,76 @@ def apply_selected_filters(query, selected, excluded_key=None):
                 query = query.filter(condition)
     return query
 
-@cached(timeout=120, user_specific=True)
-def compute_cascade_options(selected):
-    """计算各筛选字段的候选项，实现多级联动。
+def sorted_selection(values):
+    """多选值去重排序：缓存 key 计入列表顺序，相同的选择以同一顺序传给缓存函数"""
+    return sorted(set(values))
+
+@cached(timeout=120, user_specific=True, stale_ttl=300)
+def compute_facet_counts(selected):
+    """计算各筛选字段每个候选项在当前已选条件下的行数，实现多级联动。
     selected: dict, 键为筛选键, 值为已选值列表。
-    每个字段的候选项基于权限 + 除自身外的其它已选条件计算。
-    返回: dict, 键为筛选键, 值为排序后的候选项列表。
+    每个字段基于权限 + 除自身外的其它已选条件计算，每个字段只做一次分组统计。
+    返回: dict, 键为筛选键, 值为 {候选项: 行数}；空值(NULL/空白)计入 EMPTY_FILTER_VALUE。
     """
-    options = {}
+    if cascade_facet_index.ensure_fresh():
+        return cascade_facet_index.facet_counts(selected, current_user.category_arr, current_user.brand_arr)
+
+    # 分面索引未就绪(首次构建/导入后重建中)时回退为 SQL：各字段的分组统计合并为一条语句
+    members = []
     for key, field in CASCADE_FIELD_MAP.items():
-        opt_query = db.session.query(field)
+        stmt = apply_permission_scope(select(field.label('value'), func.count(SampleData.id).label('n')))
+        # 应用其它筛选条件（联动），排除自身
+        stmt = apply_selected_filters(stmt, selected, excluded_key=key)
+        members.append((key, stmt.group_by(field)))
 
-        # 权限过滤
-        if current_user.category_arr is not None:
-            opt_query = opt_query.filter(SampleData.category.in_(current_user.category_arr))
-        if current_user.brand_arr is not None:
-            opt_query = opt_query.filter(SampleData.brand.in_(current_user.brand_arr))
+    counts = {key: {} for key in CASCADE_FIELD_MAP}
+    for key, value, count in facet_union_rows(members):
+        if value is None or not value.strip():
+            value = EMPTY_FILTER_VALUE
+        counts[key][value] = counts[key].get(value, 0) + count
+    return counts
+
+
+def facet_union_rows(members):
+    """把多个字段的候选项子查询合并为一条 UNION ALL 语句执行(一次数据库往返)。
+    members: [(字段键, select)]，各 select 的列数相同。
+    返回: 结果行列表，每行为 (字段键, *select 的列)。
+    """
+    parts = []
+    for key, stmt in members:
+        # 包一层子查询：带 LIMIT/GROUP BY 的成员在各方言的 UNION 中都合法
+        sub = stmt.subquery()
+        parts.append(select(literal(key).label('facet'), *sub.c))
+    return db.session.execute(union_all(*parts)).all()
+
+
+def compute_cascade_options(selected):
+    """计算各筛选字段的候选项，实现多级联动。
+    selected: dict, 键为筛选键, 值为已选值列表。
+    返回: dict, 键为筛选键, 值为排序后的候选项列表(属性字段首项为空值标记)。
+    """
+    return options_from_counts(compute_facet_counts(selected))
 
-        # 应用其它筛选条件（联动），排除自身
-        opt_query = apply_selected_filters(opt_query, selected, excluded_key=key)
 
-        results = opt_query.filter(field.isnot(None), func.trim(field) != '').distinct().limit(1000).all()
-        values = sorted([item[0] for item in results])
+def options_from_counts(counts):
+    """由 compute_facet_counts 的结果得到排序后的候选项列表(每个字段最多 1000 项)"""
+    options = {}
+    for key in CASCADE_FIELD_MAP:
+        values = sorted(value for value in counts[key] if value != EMPTY_FILTER_VALUE)[:1000]
         if key in ATTRIBUTE_FILTER_KEYS:
             values.insert(0, EMPTY_FILTER_VALUE)
         options[key] = values
     return options
 
+
+def option_counts(options, counts):
+    """只保留候选项列表中出现的值的行数"""
+    return {key: {value: counts[key][value] for value in values if value in counts[key]}
+            for key, values in options.items()}
+
+# 批量候选标签接口单次最多处理的行数
+MAX_LABEL_OPTION_ROWS = 500
+
 # 打标候选标签字段：仅 Brand + Attribute1-5 参与联动（不含时间/评论量等条件）
 LABEL_FIELD_MAP = {
     'brand': SampleData.brand,
@@ -139,27 +227,34 @@ LABEL_FIELD_MAP = {
     'attr4': SampleData.prod_attributes4,
     'attr5': SampleData.prod_attributes5,
 }
+# 候选标签的进程内属性组合图(见 app/utils/label_taxonomy.py)
+label_taxonomy = LabelTaxonomy(empty_marker=EMPTY_FILTER_VALUE)
+
+def _label_options_scope(brand_values, attr_values):
+    """候选标签只依赖已选品牌(含空值标记时不缩小范围)"""
+    if EMPTY_FILTER_VALUE in (brand_values or []):
+        return None, None
+    return None, brand_values
 
-@cached(timeout=120, user_specific=True)
+@cached(timeout=120, user_specific=True, scope_args=_label_options_scope, stale_ttl=300)
 def compute_label_options(brand_values, attr_values):
     """计算单条打标的候选标签（attr1-5），仅受 Brand + Attribute1-5 影响。
     brand_values: 已选品牌列表。
     attr_values: dict, 键 attr1-5, 值为该字段当前值列表（用于联动，排除自身）。
     返回: dict, 键 attr1-5, 值为排序后的候选项列表。
     """
+    if label_taxonomy.ensure_fresh():
+        return label_taxonomy.label_options(brand_values, attr_values,
+                                            current_user.category_arr, current_user.brand_arr)
+
+    # 组合图未就绪(首次构建/导入后重建中)时回退为 SQL
     selected = {'brand': brand_values}
     selected.update(attr_values)
 
-    options = {}
+    members = []
     for key in ('attr1', 'attr2', 'attr3', 'attr4', 'attr5'):
         field = LABEL_FIELD_MAP[key]
-        opt_query = db.session.query(field).filter(field.isnot(None), field != '')
-
-        # 权限过滤
-        if current_user.category_arr is not None:
-            opt_query = opt_query.filter(SampleData.category.in_(current_user.category_arr))
-        if current_user.brand_arr is not None:
-            opt_query = opt_query.filter(SampleData.brand.in_(current_user.brand_arr))
+        stmt = apply_permission_scope(select(field.label('value')).where(field.isnot(None), field != ''))
 
         # 应用 Brand + 其它 Attribute 条件（联动），排除自身
         for fkey, fvalues in selected.items():
@@ -169,11 +264,15 @@ def compute_label_options(brand_values, attr_values):
             if ffield is not None:
                 condition = selected_value_condition(ffield, fvalues)
                 if condition is not None:
-                    opt_query = opt_query.filter(condition)
+                    stmt = stmt.where(condition)
 
-        results = opt_query.distinct().limit(1000).all()
-        options[key] = sorted([item[0] for item in results])
-    return options
+        members.append((key, stmt.distinct().limit(1000)))
+
+    # 5 个字段的候选标签一条语句取回
+    options = {key: [] for key, _ in members}
+    for key, value in facet_union_rows(members):
+        options[key].append(value)
+    return {key: sorted(values) for key, values in options.items()}
 
 # 缓存辅助函数
 @cached(timeout=600, user_specific=True)  # 缓存10分钟,并根据用户权限区分
@@ -193,10 +292,7 @@ def get_distinct_options_for_user(field_name):
 
     # 根据用户权限过滤
     if current_user.is_authenticated:
-        if current_user.brand_arr is not None:
-            query = query.filter(SampleData.brand.in_(current_user.brand_arr))
-        if current_user.category_arr is not None:
-            query = query.filter(SampleData.category.in_(current_user.category_arr))
+        query = apply_permission_scope(query)
 
     # 获取不重复的值
     results = query.distinct().limit(1000).all()
@@ -222,10 +318,7 @@ def get_attribute_options_for_user(attr_num):
 
     # 根据用户权限过滤
     if current_user.is_authenticated:
-        if current_user.brand_arr is not None:
-            query = query.filter(SampleData.brand.in_(current_user.brand_arr))
-        if current_user.category_arr is not None:
-            query = query.filter(SampleData.category.in_(current_user.category_arr))
+        query = apply_permission_scope(query)
 
     # 获取不重复的值
     results = query.distinct().limit(1000).all()
@@ -234,18 +327,60 @@ def get_attribute_options_for_user(attr_num):
     options = sorted([item[0] for item in results])
     return options
 
-@cached(timeout=120, user_specific=True)
+@cached(timeout=120, user_specific=True, stale_ttl=300)
 def get_progress_stats_for_user():
     """按当前用户权限获取列表页进度统计（缓存短时复用）。"""
-    prog_query = db.session.query(SampleData)
-    if current_user.category_arr is not None:
-        prog_query = prog_query.filter(SampleData.category.in_(current_user.category_arr))
-    if current_user.brand_arr is not None:
-        prog_query = prog_query.filter(SampleData.brand.in_(current_user.brand_arr))
+    prog_query = apply_permission_scope(db.session.query(SampleData))
 
     return summarize_status_query(prog_query)
 
 
+# 抽样估算：保留 (id × 乘数) mod 素数 小于阈值的行。直接按 id 步长抽样会与导入顺序中的
+# 周期性规律(如品牌交替出现)对齐，造成成倍的偏差
+COUNT_SAMPLE_MODULUS = 10007
+COUNT_SAMPLE_MULTIPLIER = 7919
+
+
+def sample_filter_args(args):
+    """request.args -> 规范化的筛选参数(不含 status/分页/排序)，作为筛选进度统计的缓存 key"""
+    return sample_filters.from_args(args).without('status').args
+
+
+def has_sample_filters(filters):
+    """parse_sample_filters 的结果中是否有生效的筛选条件(status 除外)"""
+    return bool(filters['keyword_terms'] or filters['excluded_terms'] or filters['start_date']
+                or filters['end_date'] or any(filters[key] for key in CASCADE_FIELD_MAP))
+
+
+@cached(timeout=120, user_specific=True, stale_ttl=300)
+def get_filtered_progress_stats(filter_args):
+    """按当前用户权限 + 筛选条件(不含 status)统计状态分布，翻页时复用同一结果。
+    filter_args: sample_filter_args 的结果(FilterSpec.args)。
+    无筛选条件时直接复用权限范围的进度统计；权限范围行数超过 APPROX_COUNT_THRESHOLD 时
+    只统计 id 按固定步长抽样的行并按步长放大(approximate=True)，避免大范围筛选的计数阻塞页面。
+    """
+    spec = sample_filters.from_args(MultiDict([(key, value) for key, values in filter_args.items()
+                                               for value in values]))
+    scope_stats = get_progress_stats_for_user()
+    if not has_sample_filters(spec.parsed):
+        return dict(scope_stats, approximate=False)
+
+    query = SampleData.query
+    threshold = current_app.config.get('APPROX_COUNT_THRESHOLD', 0)
+    cutoff = COUNT_SAMPLE_MODULUS
+    if threshold and scope_stats['total'] > threshold:
+        sample_rows = current_app.config.get('APPROX_COUNT_SAMPLE_ROWS', 100000)
+        cutoff = max(1, COUNT_SAMPLE_MODULUS * sample_rows // scope_stats['total'])
+    if cutoff < COUNT_SAMPLE_MODULUS:
+        # 抽样条件放在最前，其余筛选条件只对样本行求值
+        query = query.filter(SampleData.id * COUNT_SAMPLE_MULTIPLIER % COUNT_SAMPLE_MODULUS < cutoff)
+    stats = summarize_status_query(spec.apply(apply_permission_scope(query), status=False))
+    if cutoff >= COUNT_SAMPLE_MODULUS:
+        return dict(stats, approximate=False)
+    scale = COUNT_SAMPLE_MODULUS / cutoff
+    return dict({key: round(value * scale) for key, value in stats.items()}, approximate=True)
+
+
 def summarize_status_query(query):
     """一次聚合查询返回指定数据范围的状态分布。"""
     row = query.with_entities(
@@ -268,174 +403,200 @@ def summarize_status_query(query):
         'uncertain': int(row[6] or 0),
     }
 
-@bp.route('/samples')
-@login_required
-def samples():
-    """样本列表（根据权限过滤）"""
-    page = request.args.get('page', 1, type=int)
-    per_page = 50
-
-    # 基础查询
-    query = SampleData.query
-
-    # 根据用户权限过滤category
-    if current_user.category_arr is not None:
-        query = query.filter(SampleData.category.in_(current_user.category_arr))
+def apply_permission_scope(query):
+    """按当前用户的 category_arr/brand_arr 权限过滤(None 表示全部权限)。
+    已物化的权限范围通过 permission_scope_value 的主键半连接过滤，否则回退为 IN 列表"""
+    for column, dimension in ((SampleData.category, 'category'), (SampleData.brand, 'brand')):
+        condition = scope_condition(column, dimension, current_user)
+        if condition is not None:
+            query = query.filter(condition)
+    return query
 
-    # 根据用户权限过滤brand
-    if current_user.brand_arr is not None:
-        query = query.filter(SampleData.brand.in_(current_user.brand_arr))
 
-    # 文本搜索：统一覆盖 category、product_description、sku。
-    keyword = request.args.get('keyword', '').strip()
-    keyword_mode = request.args.get('keyword_mode', 'all')
+def parse_sample_filters(args):
+    """解析样本列表的筛选参数(列表页与筛选结果导出共用)。
+    args: request.args
+    返回: dict, 含搜索词、各多选筛选值、日期范围和状态；非法输入以 *_truncated/date_invalid 标记。
+    """
+    keyword = args.get('keyword', '').strip()
+    keyword_mode = args.get('keyword_mode', 'all')
     if keyword_mode not in ('all', 'any'):
         keyword_mode = 'all'
-    exclude_terms = request.args.get('exclude_terms', '').strip()
-    keyword_field_names, keyword_search_fields = resolve_search_fields(
-        request.args.getlist('keyword_fields')
-    )
-    exclude_field_names, exclude_search_fields = resolve_search_fields(
-        request.args.getlist('exclude_fields')
-    )
-
+    exclude_terms = args.get('exclude_terms', '').strip()
+    keyword_field_names, keyword_search_fields = resolve_search_fields(args.getlist('keyword_fields'))
+    exclude_field_names, exclude_search_fields = resolve_search_fields(args.getlist('exclude_fields'))
     keyword_terms, keyword_truncated = parse_search_terms(keyword)
     excluded_terms, excluded_truncated = parse_search_terms(exclude_terms)
-    if keyword_truncated or excluded_truncated:
-        flash(f'每组最多支持 {MAX_SEARCH_TERMS} 个搜索词且单词最长 {MAX_SEARCH_TERM_LENGTH} 个字符，超出部分已忽略', 'warning')
 
-    if keyword_terms:
-        term_conditions = [or_(*(ci_contains(field, term) for field in keyword_search_fields))
-                           for term in keyword_terms]
-        query = query.filter(and_(*term_conditions) if keyword_mode == 'all'
-                             else or_(*term_conditions))
+    filters = {
+        'keyword': keyword,
+        'keyword_mode': keyword_mode,
+        'exclude_terms': exclude_terms,
+        'keyword_field_names': keyword_field_names,
+        'keyword_search_fields': keyword_search_fields,
+        'exclude_field_names': exclude_field_names,
+        'exclude_search_fields': exclude_search_fields,
+        'keyword_terms': keyword_terms,
+        'excluded_terms': excluded_terms,
+        'search_truncated': keyword_truncated or excluded_truncated,
+        'start_date_str': args.get('start_date', ''),
+        'end_date_str': args.get('end_date', ''),
+        'start_date': None,
+        'end_date': None,
+        'date_invalid': False,
+        'status': args.getlist('status'),
+    }
+    # 联动筛选键与 URL 参数名一致(eRetailer 的参数名为小写 eretailer)
+    for key in CASCADE_FIELD_MAP:
+        filters[key] = args.getlist('eretailer' if key == 'eRetailer' else key)
 
-    if excluded_terms:
-        excluded_condition = or_(*(
-            ci_contains(field, term)
-            for term in excluded_terms
-            for field in exclude_search_fields
-        ))
-        query = query.filter(~excluded_condition)
+    # 筛选：latest_review_date (日期范围)
+    try:
+        if filters['start_date_str']:
+            filters['start_date'] = datetime.strptime(filters['start_date_str'], '%Y-%m-%d').date()
+        if filters['end_date_str']:
+            filters['end_date'] = datetime.strptime(filters['end_date_str'], '%Y-%m-%d').date()
+    except ValueError:
+        filters['date_invalid'] = True
+    return filters
 
-    # 筛选：eRetailer
-    eretailer_filter = request.args.getlist('eretailer')
-    if eretailer_filter:
-        query = query.filter(SampleData.eRetailer.in_(eretailer_filter))
 
-    # 筛选：online_store
-    online_store_filter = request.args.getlist('online_store')
-    if online_store_filter:
-        query = query.filter(SampleData.online_store.in_(online_store_filter))
+def canonical_sample_filter_args(filters):
+    """parse_sample_filters 的结果 -> 规范化的 URL 参数 {参数名: 值列表}。
+    去掉空值与默认值，多选值去重排序；再次解析得到相同的筛选条件，作为缓存 key 与透传参数。
+    """
+    args = {}
+    if filters['keyword_terms']:
+        args['keyword'] = [', '.join(filters['keyword_terms'])]
+    if filters['keyword_mode'] != 'all':
+        args['keyword_mode'] = [filters['keyword_mode']]
+    if filters['excluded_terms']:
+        args['exclude_terms'] = [', '.join(filters['excluded_terms'])]
+    for name, field_names in (('keyword_fields', filters['keyword_field_names']),
+                              ('exclude_fields', filters['exclude_field_names'])):
+        if set(field_names) != set(SEARCH_FIELD_MAP):
+            args[name] = sorted(field_names)
+    for name in ('start_date', 'end_date'):
+        if filters[name]:
+            args[name] = [filters[name].isoformat()]
+    for key in CASCADE_FIELD_MAP:
+        if filters[key]:
+            args['eretailer' if key == 'eRetailer' else key] = sorted(set(filters[key]))
+    if filters['status']:
+        args['status'] = sorted(set(filters['status']))
+    return args
+
+
+def sample_filter_criteria(filters):
+    """parse_sample_filters 的结果(不含 status) -> WHERE 条件列表"""
+    criteria = []
+    # 文本搜索：统一覆盖 category、product_description、sku。
+    if filters['keyword_terms']:
+        term_conditions = [search_term_condition(filters['keyword_search_fields'], term)
+                           for term in filters['keyword_terms']]
+        criteria.append(and_(*term_conditions) if filters['keyword_mode'] == 'all' else or_(*term_conditions))
 
-    # 筛选：brand
-    brand_filter = request.args.getlist('brand')
-    if brand_filter:
-        query = query.filter(SampleData.brand.in_(brand_filter))
+    if filters['excluded_terms']:
+        excluded_condition = or_(*(
+            search_term_condition(filters['exclude_search_fields'], term)
+            for term in filters['excluded_terms']
+        ))
+        criteria.append(~excluded_condition)
 
-    # 筛选：note
-    note_filter = request.args.getlist('note')
-    if note_filter:
-        query = query.filter(SampleData.note.in_(note_filter))
+    # 联动筛选字段：普通字段按值过滤，属性1-5 额外支持"空值"标记
+    for key, field in CASCADE_FIELD_MAP.items():
+        values = filters[key]
+        if not values:
+            continue
+        if key in ATTRIBUTE_FILTER_KEYS:
+            criteria.append(selected_value_condition(field, values))
+        else:
+            criteria.append(field.in_(values))
 
-    # 筛选：is_competitor
-    is_competitor_filter = request.args.getlist('is_competitor')
-    if is_competitor_filter:
-        query = query.filter(SampleData.is_competitor.in_(is_competitor_filter))
+    if filters['start_date']:
+        criteria.append(SampleData.latest_review_date >= filters['start_date'])
+    if filters['end_date']:
+        criteria.append(SampleData.latest_review_date <= filters['end_date'])
+    return criteria
 
-    # 筛选：latest_review_date (日期范围)
-    start_date_str = request.args.get('start_date', '')
-    end_date_str = request.args.get('end_date', '')
-    start_date, end_date = None, None
-    try:
-        if start_date_str:
-            start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-            query = query.filter(SampleData.latest_review_date >= start_date)
-        if end_date_str:
-            end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-            query = query.filter(SampleData.latest_review_date <= end_date)
-    except ValueError:
-        flash('日期格式无效，请使用 YYYY-MM-DD 格式', 'warning')
 
+def apply_sample_filters(query, filters):
+    """把 parse_sample_filters 的结果(不含 status)应用到样本查询(不经过编译缓存)"""
+    criteria = sample_filter_criteria(filters)
+    return query.filter(*criteria) if criteria else query
 
-    # 筛选：total_comments
-    total_comments_filter = request.args.getlist('total_comments')
-    if total_comments_filter:
-        query = query.filter(SampleData.total_comments.in_(total_comments_filter))
 
-    # 筛选：last_total_comments
-    last_total_comments_filter = request.args.getlist('last_total_comments')
-    if last_total_comments_filter:
-        query = query.filter(SampleData.last_total_comments.in_(last_total_comments_filter))
+def count_for_statuses(stats, status_values):
+    """由 summarize_status_query 的结果得到状态筛选后的行数；含未知状态值时返回 None"""
+    if not status_values:
+        return stats['total']
+    keys = {STATUS_STAT_KEYS.get(value) for value in status_values}
+    if None in keys:
+        return None
+    return sum(stats[key] for key in keys)
 
-    # 筛选：属性1-5
-    attr1_filter = request.args.getlist('attr1')
-    if attr1_filter:
-        query = query.filter(selected_value_condition(SampleData.prod_attributes1, attr1_filter))
 
-    attr2_filter = request.args.getlist('attr2')
-    if attr2_filter:
-        query = query.filter(selected_value_condition(SampleData.prod_attributes2, attr2_filter))
+def status_filter_criteria(filters):
+    """状态过滤条件；Unlabeled 同时匹配 NULL 和空字符串，未选择时不过滤"""
+    status_values = filters['status']
+    if not status_values:
+        return []
+    conditions = []
+    other_values = [value for value in status_values if value != 'Unlabeled']
+    if 'Unlabeled' in status_values:
+        conditions.append(or_(SampleData.status == 'Unlabeled', SampleData.status.is_(None), SampleData.status == ''))
+    if other_values:
+        conditions.append(SampleData.status.in_(other_values))
+    return [or_(*conditions)]
 
-    attr3_filter = request.args.getlist('attr3')
-    if attr3_filter:
-        query = query.filter(selected_value_condition(SampleData.prod_attributes3, attr3_filter))
 
-    attr4_filter = request.args.getlist('attr4')
-    if attr4_filter:
-        query = query.filter(selected_value_condition(SampleData.prod_attributes4, attr4_filter))
+def apply_status_filter(query, status_values):
+    """状态过滤；空列表表示不过滤"""
+    criteria = status_filter_criteria({'status': status_values})
+    return query.filter(*criteria) if criteria else query
 
-    attr5_filter = request.args.getlist('attr5')
-    if attr5_filter:
-        query = query.filter(selected_value_condition(SampleData.prod_attributes5, attr5_filter))
 
-    # 当前任务进度使用相同的业务筛选范围，但故意排除 status：完成一条后
-    # 状态会变化，任务分母不应随之缩小。
-    filtered_progress_stats = summarize_status_query(query)
+# 列表页、筛选计数、导出与批量打标共用的筛选条件(见 app/utils/filter_spec.py)
+sample_filters = FilterSpecCompiler(parse_sample_filters, canonical_sample_filter_args,
+                                    sample_filter_criteria, status_filter_criteria)
 
-    # 状态过滤：status
-    status_filter = request.args.getlist('status')
-    # 保存原始的status_filter用于模板显示（不被修改）
-    status_filter_display = status_filter.copy()
-    
-    if status_filter:
-        conditions = []
-        # 如果 'Unlabeled' 在筛选条件中，需要特殊处理
-        if 'Unlabeled' in status_filter:
-            conditions.append(or_(SampleData.status == 'Unlabeled', SampleData.status.is_(None), SampleData.status == ''))
-            status_filter.remove('Unlabeled') # 避免重复处理
-        
-        # 添加其他状态的筛选条件
-        if status_filter:
-            conditions.append(SampleData.status.in_(status_filter))
-            
-        # 使用 or_ 组合所有条件
-        if conditions:
-            query = query.filter(or_(*conditions))
 
-    # 如果status_filter为空字符串或'all',则不添加状态筛选,显示全部
+@bp.route('/samples')
+@login_required
+def samples():
+    """样本列表（根据权限过滤）"""
+    page = request.args.get('page', 1, type=int)
+    per_page = 50
+
+    spec = sample_filters.from_args(request.args)
+    filters = spec.parsed
+    if filters['search_truncated']:
+        flash(f'每组最多支持 {MAX_SEARCH_TERMS} 个搜索词且单词最长 {MAX_SEARCH_TERM_LENGTH} 个字符，超出部分已忽略', 'warning')
+    if filters['date_invalid']:
+        flash('日期格式无效，请使用 YYYY-MM-DD 格式', 'warning')
+    query = spec.apply(apply_permission_scope(SampleData.query))
 
-    # 分页
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    # 当前任务进度使用相同的业务筛选范围，但故意排除 status：完成一条后
+    # 状态会变化，任务分母不应随之缩小。一次聚合同时得到总数与各状态计数，按筛选条件缓存，
+    # 翻页时不再重复统计；无筛选时复用整体进度，超大范围时为抽样估算值。
+    filtered_progress_stats = get_filtered_progress_stats(spec.without('status').args)
+
+    # 键集分页：上一页/下一页按 cursor 令牌定位，深页与第一页代价相同；
+    # 总数直接由上面的状态分布得出，不再单独执行 COUNT
+    total = count_for_statuses(filtered_progress_stats, filters['status'])
+    if total is None:
+        total = query.order_by(None).count()
+    sort = request.args.get('sort', '')
+    pagination = sample_paginator.paginate(query, sort, request.args.get('cursor', ''), per_page, total, page=page)
     samples = pagination.items
 
     # 多级联动筛选：每个下拉框的候选项基于"其它已选筛选条件"动态计算，
     # 从而实现选择一个条件后，其它条件的候选项自动缩小到对应范围。
-    selected_filters = {
-        'eRetailer': eretailer_filter,
-        'online_store': online_store_filter,
-        'brand': brand_filter,
-        'note': note_filter,
-        'is_competitor': is_competitor_filter,
-        'total_comments': total_comments_filter,
-        'last_total_comments': last_total_comments_filter,
-        'attr1': attr1_filter,
-        'attr2': attr2_filter,
-        'attr3': attr3_filter,
-        'attr4': attr4_filter,
-        'attr5': attr5_filter,
-    }
-    cascade_options = compute_cascade_options(selected_filters)
+    selected_filters = {key: sorted_selection(filters[key]) for key in CASCADE_FIELD_MAP}
+    counts = compute_facet_counts(selected_filters)
+    cascade_options = options_from_counts(counts)
+    # 每个候选项在当前筛选下的行数，显示在下拉选项后
+    facet_counts = option_counts(cascade_options, counts)
 
     eretailer_options = cascade_options['eRetailer']
     online_store_options = cascade_options['online_store']
@@ -452,14 +613,8 @@ def samples():
 
     # 属性字段选项（候选标签）：仅受 Brand + Attribute1-5 影响，时间/评论量等不参与
     label_options = compute_label_options(
-        brand_filter,
-        {
-            'attr1': attr1_filter,
-            'attr2': attr2_filter,
-            'attr3': attr3_filter,
-            'attr4': attr4_filter,
-            'attr5': attr5_filter,
-        }
+        selected_filters['brand'],
+        {key: selected_filters[key] for key in ('attr1', 'attr2', 'attr3', 'attr4', 'attr5')}
     )
     attr1_options = label_options['attr1']
     attr2_options = label_options['attr2']
@@ -473,29 +628,31 @@ def samples():
     return render_template('labeling/samples.html',
                          samples=samples,
                          pagination=pagination,
-                         keyword=keyword,
-                         keyword_mode=keyword_mode,
-                         exclude_terms=exclude_terms,
-                         keyword_fields=keyword_field_names,
-                         exclude_fields=exclude_field_names,
+                         sort=pagination.sort,
+                         keyword=filters['keyword'],
+                         keyword_mode=filters['keyword_mode'],
+                         exclude_terms=filters['exclude_terms'],
+                         keyword_fields=filters['keyword_field_names'],
+                         exclude_fields=filters['exclude_field_names'],
                          empty_filter_value=EMPTY_FILTER_VALUE,
+                         facet_counts=facet_counts,
                          progress_stats=progress_stats,
                          filtered_progress_stats=filtered_progress_stats,
-                         status_filter=status_filter_display,
-                         eretailer_filter=eretailer_filter,
-                         online_store_filter=online_store_filter,
-                         brand_filter=brand_filter,
-                         note_filter=note_filter,
-                         is_competitor_filter=is_competitor_filter,
-                         start_date=start_date_str,
-                         end_date=end_date_str,
-                         total_comments_filter=total_comments_filter,
-                         last_total_comments_filter=last_total_comments_filter,
-                         attr1_filter=attr1_filter,
-                         attr2_filter=attr2_filter,
-                         attr3_filter=attr3_filter,
-                         attr4_filter=attr4_filter,
-                         attr5_filter=attr5_filter,
+                         status_filter=filters['status'],
+                         eretailer_filter=filters['eRetailer'],
+                         online_store_filter=filters['online_store'],
+                         brand_filter=filters['brand'],
+                         note_filter=filters['note'],
+                         is_competitor_filter=filters['is_competitor'],
+                         start_date=filters['start_date_str'],
+                         end_date=filters['end_date_str'],
+                         total_comments_filter=filters['total_comments'],
+                         last_total_comments_filter=filters['last_total_comments'],
+                         attr1_filter=filters['attr1'],
+                         attr2_filter=filters['attr2'],
+                         attr3_filter=filters['attr3'],
+                         attr4_filter=filters['attr4'],
+                         attr5_filter=filters['attr5'],
                          eretailer_options=eretailer_options,
                          online_store_options=online_store_options,
                          brand_options=brand_options,
@@ -514,15 +671,29 @@ def samples():
                          attr4_options=attr4_options,
                          attr5_options=attr5_options)
 
+@bp.route('/samples/export')
+@login_required
+def export_samples():
+    """流式导出当前筛选结果(与列表页相同的筛选条件和用户权限范围)"""
+    query = sample_filters.from_args(request.args).apply(apply_permission_scope(SampleData.query))
+    criteria = () if query.whereclause is None else (query.whereclause,)
+
+    filename = f"samples_filtered_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    return Response(stream_with_context(iter_samples_csv(*criteria)), mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename={filename}',
+                             'X-Accel-Buffering': 'no'})
+
 @bp.route('/filter-options')
 @login_required
 def filter_options():
-    """返回各筛选字段的联动候选项（AJAX）。
+    """返回各筛选字段的联动候选项及每个候选项的行数（AJAX）。
     根据当前已选条件实时计算其它字段的候选项，但不刷新数据列表。
+    返回: {"options": {筛选键: [候选项]}, "counts": {筛选键: {候选项: 行数}}}
     """
-    selected = {key: request.args.getlist(key) for key in CASCADE_FIELD_MAP}
-    options = compute_cascade_options(selected)
-    return jsonify(options)
+    selected = {key: sorted_selection(request.args.getlist(key)) for key in CASCADE_FIELD_MAP}
+    counts = compute_facet_counts(selected)
+    options = options_from_counts(counts)
+    return jsonify(options=options, counts=option_counts(options, counts))
 
 @bp.route('/label-options')
 @login_required
@@ -531,11 +702,45 @@ def label_options():
     仅受 Brand + Attribute1-5 影响：选填某 Attribute 会缩小其它 Attribute 候选。
     参数: brand[] 当前筛选品牌; attr1-5 当前行已填写的值。
     """
-    brand_values = request.args.getlist('brand')
-    attr_values = {f'attr{i}': request.args.getlist(f'attr{i}') for i in range(1, 6)}
+    brand_values = sorted_selection(request.args.getlist('brand'))
+    attr_values = {f'attr{i}': sorted_selection(request.args.getlist(f'attr{i}')) for i in range(1, 6)}
     options = compute_label_options(brand_values, attr_values)
     return jsonify(options)
 
+def _option_values(values):
+    """JSON 请求中的候选参数规范化为去重排序后的字符串元组(非列表视为未选择)"""
+    if not isinstance(values, list):
+        return ()
+    return tuple(sorted({str(value) for value in values if value is not None}))
+
+@bp.route('/label-options/batch', methods=['POST'])
+@login_required
+def label_options_batch():
+    """一次返回整页多行的候选标签（AJAX）。
+    请求体: {"rows": {行id: {"brand": [...], "attr1": [...], ..., "attr5": [...]}}}
+    相同的 brand + attr1-5 组合只计算一次(逐组合走 compute_label_options 缓存)。
+    返回: {行id: {attr1-5: 候选项列表}}
+    """
+    payload = request.get_json(silent=True) or {}
+    rows = payload.get('rows')
+    if not isinstance(rows, dict):
+        return jsonify({'status': 'error', 'message': '请求格式错误：缺少 rows'}), 400
+    if len(rows) > MAX_LABEL_OPTION_ROWS:
+        return jsonify({'status': 'error', 'message': f'单次最多请求 {MAX_LABEL_OPTION_ROWS} 行'}), 400
+
+    options_by_combo = {}
+    result = {}
+    for row_id, params in rows.items():
+        params = params if isinstance(params, dict) else {}
+        combo = (_option_values(params.get('brand')),
+                 tuple(_option_values(params.get(f'attr{i}')) for i in range(1, 6)))
+        if combo not in options_by_combo:
+            brand_values, attr_values = combo
+            options_by_combo[combo] = compute_label_options(
+                list(brand_values), {f'attr{i}': list(values) for i, values in enumerate(attr_values, 1)})
+        result[row_id] = options_by_combo[combo]
+    return jsonify(result)
+
 @bp.route('/samples/<int:sample_id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_sample(sample_id):
@@ -599,8 +804,9 @@ def edit_sample(sample_id):
                        snapshot_fields(old_values, new_values),
                        detail=f'单条打标 ID {sample.id}', sample=sample)
 
+        scope = (sample.category, sample.brand)
         db.session.commit()
-        clear_cache(user_specific=True)  # 只清空当前用户相关的缓存
+        invalidate_scopes([scope])  # 只失效该样本所在品类/品牌的缓存
         flash('打标成功', 'success')
 
         # 跳转到下一条未打标数据
@@ -616,10 +822,7 @@ def edit_sample(sample_id):
         )
 
         # 权限过滤
-        if current_user.category_arr is not None:
-            next_sample = next_sample.filter(SampleData.category.in_(current_user.category_arr))
-        if current_user.brand_arr is not None:
-            next_sample = next_sample.filter(SampleData.brand.in_(current_user.brand_arr))
+        next_sample = apply_permission_scope(next_sample)
 
         next_sample = next_sample.first()
 
@@ -660,22 +863,10 @@ def edit_sample(sample_id):
 @login_required
 def batch_label():
     """批量打标"""
-    # 收集需要透传的筛选条件（用于返回列表时保留 filter）
-    filter_keys_multi = ['status', 'eretailer', 'online_store', 'brand', 'note',
-                         'is_competitor', 'total_comments', 'last_total_comments',
-                         'attr1', 'attr2', 'attr3', 'attr4', 'attr5',
-                         'keyword_fields', 'exclude_fields']
-    filter_keys_single = ['keyword', 'keyword_mode', 'exclude_terms', 'start_date', 'end_date', 'page']
+    # 需要透传的筛选条件与列表位置（用于返回列表时保留 filter）
     source = request.form if request.method == 'POST' else request.args
-    saved_filters = {}
-    for k in filter_keys_multi:
-        vals = source.getlist(k)
-        if vals:
-            saved_filters[k] = vals
-    for k in filter_keys_single:
-        v = source.get(k)
-        if v:
-            saved_filters[k] = v
+    saved_filters = sample_filters.from_args(source).url_args(
+        page=source.get('page'), sort=source.get('sort'), cursor=source.get('cursor'))
 
     # 获取选中的ID列表
     ids_str = request.args.get('ids', '')
@@ -774,8 +965,11 @@ def batch_label():
                            snapshot_fields(old_values, new_values),
                            detail=f'批量打标 ID {sample.id} [grp:{batch_group}]', sample=sample)
 
+        # 提交前取出范围(提交后属性过期，逐条访问会重新查询)
+        touched_scopes = {(sample.category, sample.brand) for sample in samples}
         db.session.commit()
-        clear_cache()  # 清空缓存,使新打标值立即可用
+        # 只失效被修改样本所在品类/品牌的缓存，使新打标值立即可用
+        invalidate_scopes(touched_scopes)
         flash(f'成功批量打标 {len(samples)} 条记录', 'success')
         return redirect(url_for('labeling.samples', **saved_filters))
 
@@ -829,6 +1023,7 @@ def batch_save():
         manual_update_count = 0
         prelabel_accept_count = 0
         uncertain_update_count = 0
+        touched_scopes = set()  # 被修改样本的 (category, brand)，提交后按范围失效缓存
 
         # 同一次提交的批量日志打同一个分组 token，便于一键批量回滚
         batch_group = uuid.uuid4().hex[:12]
@@ -905,6 +1100,7 @@ def batch_save():
                     sample.status = 'Unlabeled'
                 else:
                     sample.status = 'Incomplete'
+                touched_scopes.add((sample.category, sample.brand))
                 if changed:
                     manual_update_count += 1
                 if uncertainty_changed:
@@ -927,6 +1123,7 @@ def batch_save():
                 else:
                     sample.status = 'Incomplete'
                 prelabel_accept_count += 1
+                touched_scopes.add((sample.category, sample.brand))
                 # 接受预打标虽未改属性，但同样记录全部属性快照（old==new），
                 # 保证长期归档后仅凭日志即可完整恢复整行数据
                 accept_attrs = {
@@ -956,7 +1153,7 @@ def batch_save():
             flash_messages.append(f'更新 {uncertain_update_count} 条疑难标记')
 
         if flash_messages:
-            clear_cache()
+            invalidate_scopes(touched_scopes)
             flash('；'.join(flash_messages), 'success')
         else:
             flash('没有检测到任何修改或需要确认的数据', 'info')
@@ -965,65 +1162,19 @@ def batch_save():
         db.session.rollback()
         flash(f'保存失败: {str(e)}', 'danger')
 
-    # 获取当前页码和所有筛选条件
-    current_page = int(request.form.get('current_page', 1))
-    keyword = request.form.get('keyword', '')
-    keyword_mode = request.form.get('keyword_mode', 'all')
-    exclude_terms = request.form.get('exclude_terms', '')
-    keyword_fields = request.form.getlist('keyword_fields')
-    exclude_fields = request.form.getlist('exclude_fields')
-    
-    # 获取所有筛选条件（多值字段使用getlist）
-    status_filter = request.form.getlist('status')
-    eretailer_filter = request.form.getlist('eretailer')
-    online_store_filter = request.form.getlist('online_store')
-    brand_filter = request.form.getlist('brand')
-    note_filter = request.form.getlist('note')
-    is_competitor_filter = request.form.getlist('is_competitor')
-    start_date = request.form.get('start_date', '')
-    end_date = request.form.get('end_date', '')
-    total_comments_filter = request.form.getlist('total_comments')
-    last_total_comments_filter = request.form.getlist('last_total_comments')
-    attr1_filter = request.form.getlist('attr1')
-    attr2_filter = request.form.getlist('attr2')
-    attr3_filter = request.form.getlist('attr3')
-    attr4_filter = request.form.getlist('attr4')
-    attr5_filter = request.form.getlist('attr5')
-
     # 保存后保持当前筛选条件，跳转到当前页（因为打标后数据会自动移除，下一批数据会补上）
-    return redirect(url_for('labeling.samples',
-                           page=current_page,
-                           keyword=keyword,
-                           keyword_mode=keyword_mode,
-                           exclude_terms=exclude_terms,
-                           keyword_fields=keyword_fields,
-                           exclude_fields=exclude_fields,
-                           status=status_filter,
-                           eretailer=eretailer_filter,
-                           online_store=online_store_filter,
-                           brand=brand_filter,
-                           note=note_filter,
-                           is_competitor=is_competitor_filter,
-                           start_date=start_date,
-                           end_date=end_date,
-                           total_comments=total_comments_filter,
-                           last_total_comments=last_total_comments_filter,
-                           attr1=attr1_filter,
-                           attr2=attr2_filter,
-                           attr3=attr3_filter,
-                           attr4=attr4_filter,
-                           attr5=attr5_filter))
+    current_page = request.form.get('current_page', 1, type=int)
+    spec = sample_filters.from_args(request.form)
+    return redirect(url_for('labeling.samples', **spec.url_args(page=current_page,
+                                                                sort=request.form.get('sort', ''),
+                                                                cursor=request.form.get('cursor', ''))))
 
 @bp.route('/stats')
 @login_required
 def stats():
     """数据统计页面"""
     # 基础查询,应用权限
-    base_query = SampleData.query
-    if current_user.category_arr is not None:
-        base_query = base_query.filter(SampleData.category.in_(current_user.category_arr))
-    if current_user.brand_arr is not None:
-        base_query = base_query.filter(SampleData.brand.in_(current_user.brand_arr))
+    base_query = apply_permission_scope(SampleData.query)
 
     # 总体统计
     total_count = base_query.count()
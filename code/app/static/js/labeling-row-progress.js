@@ -73,7 +73,8 @@
         return {
             handled: numberFromDataset(dock, prefix + 'Handled'),
             uncertain: numberFromDataset(dock, prefix + 'Uncertain'),
-            total: numberFromDataset(dock, prefix + 'Total')
+            total: numberFromDataset(dock, prefix + 'Total'),
+            approximate: dock.dataset[prefix + 'Approximate'] === '1'
         };
     }
 
@@ -90,7 +91,7 @@
         var processedPct = progress.total ? processed / progress.total * 100 : 0;
         var values = {
             progressDockPercent: Math.round(processedPct) + '%',
-            progressDockFraction: processed + ' / ' + progress.total,
+            progressDockFraction: (progress.approximate ? '≈' : '') + processed + ' / ' + progress.total,
             progressDockHandled: progress.handled,
             progressDockUncertain: progress.uncertain,
             progressDockRemaining: remaining
@@ -44,16 +44,29 @@ def snapshot_fields(old_values, new_values):
 
 
 
-def log_action(action, entity_type, entity_id=None, changes=None, detail='', sample=None):
+def capture_actor():
+    """在请求上下文中捕获操作人身份，供后台任务写审计日志时使用。"""
+    authenticated = getattr(current_user, 'is_authenticated', False)
+    return {
+        'user_id': current_user.id if authenticated else None,
+        'username': current_user.username if authenticated else None,
+        'ip': request.remote_addr if request else None,
+    }
+
+
+def log_action(action, entity_type, entity_id=None, changes=None, detail='', sample=None, actor=None):
     """追加一条审计日志（不 commit，交由调用方与业务一起提交）。
 
     sample: 可选的 SampleData 实例；若提供，则记录其业务身份四列，
             用于下游联动与跨月回滚。
+    actor: 可选的 capture_actor() 结果；后台线程无请求上下文时用它代替 current_user。
     """
     try:
-        uid = current_user.id if getattr(current_user, 'is_authenticated', False) else None
-        uname = current_user.username if getattr(current_user, 'is_authenticated', False) else None
-        ip = request.remote_addr if request else None
+        if actor is None:
+            actor = capture_actor()
+        uid = actor['user_id']
+        uname = actor['username']
+        ip = actor['ip']
         log = AuditLog(
             user_id=uid,
             username=uname,
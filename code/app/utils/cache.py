@@ -1,66 +1,443 @@
+"""查询结果缓存
+
+默认后端为进程内 LRUCache；多 worker 部署可配置 CACHE_BACKEND=file 使用同一主机共享的
+FileCache(见 cache_backends.py)，失效对所有 worker 立即生效。两种后端约束相同:
+
+- 有界：同时限制条目数(CACHE_MAX_ENTRIES)和估算内存(CACHE_MAX_BYTES)，超出时按 LRU 淘汰
+- 过期：读取时惰性检查 TTL，过期条目立即删除，不会一直占用内存
+- 线程安全：所有读写在同一把锁内完成，clear_cache 不再替换全局字典
+- 规范化 key：参数按结构规范化后哈希，多选值列表与顺序无关，
+  {'brand': ['A', 'B']} 与 {'brand': ['B', 'A']} 命中同一条缓存
+- 按范围失效：每个 (category, brand) 范围有一个代数(generation)。条目写入时记下当时的全局代数，
+  命中时若其依赖的任一范围代数更新则视为过期。打标/回滚只调用 invalidate_scopes 提升被修改数据
+  所在范围的代数，其它品类/品牌的缓存继续有效；clear_cache 仍用于导入、清空数据等全量变更
+- 单飞(single-flight)：同一进程内相同 key 的并发未命中只计算一次，其余请求等待并共享结果，
+  失效后大量打标人员同时刷新页面不会把同一组 DISTINCT 查询重复打到数据库
+- 过期后仍可用(stale-while-revalidate)：设置 stale_ttl 的函数在 TTL 到期后的 stale_ttl 秒内
+  直接返回旧结果，同时由后台线程刷新；被 invalidate_scopes/clear_cache 失效的条目不走旧值，
+  保证打标人员保存后立即看到新值
+"""
+import hashlib
+import json
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
 from functools import wraps
-from datetime import datetime, timedelta
+from threading import Event, Lock, RLock
+
+from flask import copy_current_request_context, current_app, has_app_context, has_request_context
 from flask_login import current_user
 
-# 简单的内存缓存
-_cache = {}
-_cache_expiry = {}
+DEFAULT_MAX_ENTRIES = 2048
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# 范围代数的通配值(不限品类/品牌)与空值(category/brand 为 NULL 的数据)，不会与真实取值冲突
+WILDCARD = '\x00*'
+NULL_SCOPE = '\x00null'
+# 等待同 key 计算结果的最长时间(秒)，超时后自行计算
+FLIGHT_WAIT_TIMEOUT = 60
+# 后台刷新线程数
+REFRESH_WORKERS = 2
+
+
+def estimate_size(value, _seen=None):
+    """递归估算对象占用的字节数(容器 + 元素)，用于缓存的内存预算"""
+    if _seen is None:
+        _seen = set()
+    if id(value) in _seen:
+        return 0
+    _seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k, _seen) + estimate_size(v, _seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item, _seen) for item in value)
+    return size
+
+
+def _canonical(value):
+    """把参数转换为 JSON 结构。
+
+    dict 按键排序、set/frozenset 按元素规范化后的文本排序；list/tuple(含位置参数)保持原顺序，
+    f('a', 'b') 与 f('b', 'a') 是不同的调用。与顺序无关的多选值由调用方排序后传入(见 sorted_selection)。
+    """
+    if isinstance(value, dict):
+        return {'__dict__': sorted([str(k), _canonical(v)] for k, v in value.items())}
+    if isinstance(value, (set, frozenset)):
+        items = [_canonical(item) for item in value]
+        return {'__set__': sorted(items, key=lambda item: json.dumps(item, sort_keys=True, ensure_ascii=False))}
+    if isinstance(value, (list, tuple)):
+        return {'__seq__': [_canonical(item) for item in value]}
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, (date, datetime)):
+        return {'__date__': value.isoformat()}
+    return {'__repr__': repr(value)}
+
+
+def make_key_digest(args, kwargs):
+    """参数的规范化哈希(与 kwargs、dict 键和 set 元素的顺序无关，位置参数与列表的顺序计入)"""
+    payload = json.dumps([_canonical(list(args)), _canonical(kwargs)], sort_keys=True, ensure_ascii=False)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def permission_scope():
+    """当前用户的权限范围标识；None(全部权限)与空列表(无权限)区分开"""
+    def part(values):
+        return '*' if values is None else ','.join(sorted(values))
+
+    return f'cats={part(current_user.category_arr)}|brands={part(current_user.brand_arr)}'
+
+
+def _scope_value(value):
+    return NULL_SCOPE if value is None else str(value)
+
+
+def expand_scope_pairs(pairs):
+    """把被修改数据的 (category, brand) 展开为需要提升代数的范围 key。
+
+    除精确范围外还包括 (category, *)、(*, brand)、(*, *)，分别对应只限品类、只限品牌和全部权限的缓存。
+    """
+    keys = set()
+    for category, brand in pairs:
+        category, brand = _scope_value(category), _scope_value(brand)
+        keys.update({(category, brand), (category, WILDCARD), (WILDCARD, brand), (WILDCARD, WILDCARD)})
+    return keys
+
+
+def scope_dimensions(categories, brands):
+    """缓存条目依赖的范围：None(不限)用通配值表示，返回 (品类 key 列表, 品牌 key 列表)"""
+    def keys(values):
+        return [WILDCARD] if values is None else sorted({_scope_value(v) for v in values})
+
+    return keys(categories), keys(brands)
+
+
+class LRUCache:
+    """有界、线程安全的 LRU + TTL 缓存"""
+
+    # 代数只在本进程内可见：其它 worker 的 invalidate_scopes/clear_cache 不会反映到 changed_scopes
+    shared = False
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()  # {key: (value, expires_at, size)}
+        self._bytes = 0
+        self._lock = RLock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0}
+        self._generation = 0      # 全局代数，每次失效 +1
+        self._floor = 0           # 最近一次 clear 时的代数，之前写入的条目全部过期
+        self._generations = {}    # {(category, brand): 该范围最近一次失效时的代数}
+
+    def configure(self, max_entries=None, max_bytes=None):
+        with self._lock:
+            if max_entries is not None:
+                self.max_entries = max_entries
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            self._evict()
+
+    def get(self, key):
+        """返回 (是否命中, 值)；过期条目在此时删除"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return False, None
+            value, expires_at, _ = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return False, None
+            self._data.move_to_end(key)
+            self._stats['hits'] += 1
+            return True, value
+
+    def set(self, key, value, timeout):
+        size = estimate_size(value)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            if size > self.max_bytes:
+                return  # 单个结果超过整体预算，不缓存
+            self._data[key] = (value, time.monotonic() + timeout, size)
+            self._bytes += size
+            self._evict()
+
+    def delete_where(self, predicate):
+        """删除 key 满足 predicate 的条目，返回删除数量"""
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+            # 提升下限：正在计算中的结果(以旧代数写入)也视为过期
+            self._generation += 1
+            self._floor = self._generation
+            self._generations.clear()
+
+    def current_generation(self):
+        with self._lock:
+            return self._generation
+
+    def bump_generations(self, pairs):
+        """使与 pairs 中任一 (category, brand) 重叠的条目失效，返回新的代数"""
+        keys = expand_scope_pairs(pairs)
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._generations[key] = self._generation
+            return self._generation
+
+    def scope_generation(self, categories, brands):
+        """范围内最近一次失效的代数(categories/brands 为 None 表示不限)"""
+        cat_keys, brand_keys = scope_dimensions(categories, brands)
+        with self._lock:
+            generation = self._floor
+            if len(cat_keys) * len(brand_keys) <= len(self._generations):
+                for cat in cat_keys:
+                    for brand in brand_keys:
+                        generation = max(generation, self._generations.get((cat, brand), 0))
+            else:
+                cat_set, brand_set = set(cat_keys), set(brand_keys)
+                for (cat, brand), gen in self._generations.items():
+                    if cat in cat_set and brand in brand_set:
+                        generation = max(generation, gen)
+            return generation
+
+    def changed_scopes(self, since):
+        """自代数 since 以来被失效的精确 (category, brand) 范围。
+
+        返回 (当前代数, 范围列表)；其间发生过 clear 时范围列表为 None(需要全量刷新)。
+        """
+        with self._lock:
+            if since is None or self._floor > since:
+                return self._generation, None
+            return self._generation, [key for key, gen in self._generations.items()
+                                      if gen > since and WILDCARD not in key]
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._data), bytes=self._bytes,
+                        max_entries=self.max_entries, max_bytes=self.max_bytes,
+                        generation=self._generation)
 
-def cached(timeout=300, user_specific=False):
+    def _remove(self, key):
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def _evict(self):
+        while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+            key = next(iter(self._data))
+            self._remove(key)
+            self._stats['evictions'] += 1
+
+
+# 全局缓存实例(当前后端，由 init_cache 按配置选择)
+cache_store = LRUCache()
+
+
+def invalidation_is_shared():
+    """当前后端的失效(代数)是否对同一主机的所有 worker 可见"""
+    return cache_store.shared
+
+
+def init_cache(app):
+    """按应用配置选择缓存后端(memory/file)并设置容量"""
+    global cache_store
+    max_entries = app.config.get('CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)
+    max_bytes = app.config.get('CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)
+    backend = app.config.get('CACHE_BACKEND', 'memory')
+    if backend == 'file':
+        from app.utils.cache_backends import FileCache
+        cache_store = FileCache(app.config['CACHE_FILE_PATH'], max_entries=max_entries, max_bytes=max_bytes)
+    elif backend == 'memory':
+        if not isinstance(cache_store, LRUCache):
+            cache_store = LRUCache()
+        cache_store.configure(max_entries=max_entries, max_bytes=max_bytes)
+    else:
+        raise ValueError(f'未知的缓存后端: {backend}')
+
+
+def _narrow(allowed, selected):
+    """权限范围与调用参数中已选值的交集；未选择时保持权限范围"""
+    if not selected:
+        return allowed
+    if allowed is None:
+        return list(selected)
+    allowed = set(allowed)
+    return [value for value in selected if value in allowed]
+
+
+class _Flight:
+    """一次进行中的计算；stamp 为开始计算前的全局代数"""
+
+    def __init__(self, stamp):
+        self.stamp = stamp
+        self.done = Event()
+        self.result = None
+        self.error = None
+
+
+_flights = {}          # {cache_key: _Flight}
+_refreshing = set()    # 已提交后台刷新的 cache_key
+_flights_lock = Lock()
+_refresh_executor = None
+
+
+def _run_single_flight(cache_key, categories, brands, compute):
+    """相同 key 的并发调用只执行一次 compute(stamp)，其余调用等待并复用结果。
+
+    只复用在最近一次相关失效之后开始的计算，否则自行重新计算。
+    """
+    stamp = cache_store.current_generation()
+    with _flights_lock:
+        flight = _flights.get(cache_key)
+        leader = flight is None
+        if leader:
+            flight = _flights[cache_key] = _Flight(stamp)
+
+    if not leader:
+        generation = cache_store.scope_generation(categories, brands)
+        if (generation is not None and flight.stamp is not None and generation <= flight.stamp
+                and flight.done.wait(FLIGHT_WAIT_TIMEOUT) and flight.error is None):
+            return flight.result
+        return compute(cache_store.current_generation())
+
+    try:
+        flight.result = compute(stamp)
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            if _flights.get(cache_key) is flight:
+                del _flights[cache_key]
+        flight.done.set()
+    return flight.result
+
+
+def _bind_context(task):
+    """后台线程沿用当前请求(current_user、数据库会话)或应用上下文"""
+    if has_request_context():
+        return copy_current_request_context(task)
+    if has_app_context():
+        app = current_app._get_current_object()
+
+        def run():
+            with app.app_context():
+                return task()
+        return run
+    return task
+
+
+def _get_refresh_executor():
+    global _refresh_executor
+    with _flights_lock:
+        if _refresh_executor is None:
+            _refresh_executor = ThreadPoolExecutor(max_workers=REFRESH_WORKERS, thread_name_prefix='cache-refresh')
+        return _refresh_executor
+
+
+def _refresh_in_background(cache_key, categories, brands, compute):
+    """提交后台刷新；同一 key 已在刷新或计算中时不重复提交"""
+    with _flights_lock:
+        if cache_key in _refreshing or cache_key in _flights:
+            return
+        _refreshing.add(cache_key)
+
+    def refresh():
+        try:
+            _run_single_flight(cache_key, categories, brands, compute)
+        except Exception as e:
+            # 刷新失败时旧结果继续可用直到 stale 窗口结束
+            print(f'缓存后台刷新失败 {cache_key[0]}: {e}')
+        finally:
+            with _flights_lock:
+                _refreshing.discard(cache_key)
+
+    try:
+        _get_refresh_executor().submit(_bind_context(refresh))
+    except RuntimeError:
+        # 解释器退出中，线程池已关闭
+        with _flights_lock:
+            _refreshing.discard(cache_key)
+
+
+def cached(timeout=300, user_specific=False, scope_args=None, stale_ttl=0):
     """
     缓存装饰器
     timeout: 缓存过期时间(秒),默认5分钟
     user_specific: 是否根据用户权限生成独立缓存
+    scope_args: 可选，(*args, **kwargs) -> (categories, brands)，结果只依赖这些品类/品牌时
+                返回已选值，缩小条目的失效范围(None 表示该维度不限)
+    stale_ttl: 过期后仍可返回旧结果的时间(秒)，期间由后台线程刷新；0 表示不启用
     """
     def decorator(func):
+        name = f'{func.__module__}.{func.__qualname__}'
+
         @wraps(func)
         def wrapper(*args, **kwargs):
-            # 基础缓存key
-            base_key = f"{func.__name__}:{str(args)}:{str(kwargs)}"
-
-            # 如果是用户相关的缓存，添加用户权限信息到key中
+            # 缓存key: (函数, 权限范围, 参数哈希)；用户相关的缓存按权限范围区分
             if user_specific and current_user.is_authenticated:
-                brand_key = tuple(sorted(current_user.brand_arr)) if current_user.brand_arr else ()
-                category_key = tuple(sorted(current_user.category_arr)) if current_user.category_arr else ()
-                cache_key = f"{base_key}:user_brands={brand_key}:user_cats={category_key}"
+                scope = permission_scope()
+                categories, brands = current_user.category_arr, current_user.brand_arr
             else:
-                cache_key = base_key
+                scope, categories, brands = '', None, None
+            if scope_args is not None:
+                selected_categories, selected_brands = scope_args(*args, **kwargs)
+                categories, brands = _narrow(categories, selected_categories), _narrow(brands, selected_brands)
+            cache_key = (name, scope, make_key_digest(args, kwargs))
 
-            # 检查缓存是否存在且未过期
-            if cache_key in _cache:
-                expiry_time = _cache_expiry.get(cache_key)
-                if expiry_time and datetime.now() < expiry_time:
-                    return _cache[cache_key]
+            def compute(stamp):
+                # stamp 在计算前取得：计算期间发生的失效会使本次结果在下次读取时过期
+                result = func(*args, **kwargs)
+                if stamp is not None:
+                    cache_store.set(cache_key, (result, stamp, time.time() + timeout), timeout + stale_ttl)
+                return result
 
-            # 执行函数并缓存结果
-            result = func(*args, **kwargs)
-            _cache[cache_key] = result
-            _cache_expiry[cache_key] = datetime.now() + timedelta(seconds=timeout)
+            hit, entry = cache_store.get(cache_key)
+            if hit:
+                value, stamp, fresh_until = entry
+                # 写入后依赖范围内没有发生过失效才有效
+                generation = cache_store.scope_generation(categories, brands)
+                if generation is not None and generation <= stamp:
+                    if stale_ttl and fresh_until <= time.time():
+                        _refresh_in_background(cache_key, categories, brands, compute)
+                    return value
 
-            return result
+            return _run_single_flight(cache_key, categories, brands, compute)
         return wrapper
     return decorator
 
+
+def invalidate_scopes(pairs):
+    """
+    按范围失效：只使依赖 pairs 中任一 (category, brand) 的缓存条目失效
+    pairs: 被修改数据的 (category, brand) 集合
+    """
+    pairs = set(pairs)
+    if pairs:
+        cache_store.bump_generations(pairs)
+
+
 def clear_cache(user_specific=False):
     """
     清空缓存
     user_specific: 如果为True, 只清空当前用户权限相关的缓存
     """
-    global _cache, _cache_expiry
-    
     if not user_specific or not current_user.is_authenticated:
         # 清空所有缓存
-        _cache = {}
-        _cache_expiry = {}
+        cache_store.clear()
     else:
         # 只清空与当前用户权限相关的缓存
-        brand_key = tuple(sorted(current_user.brand_arr)) if current_user.brand_arr else ()
-        category_key = tuple(sorted(current_user.category_arr)) if current_user.category_arr else ()
-        user_key_part = f":user_brands={brand_key}:user_cats={category_key}"
-        
-        keys_to_delete = [key for key in _cache if user_key_part in key]
-        for key in keys_to_delete:
-            if key in _cache:
-                del _cache[key]
-            if key in _cache_expiry:
-                del _cache_expiry[key]
+        scope = permission_scope()
+        cache_store.delete_where(lambda key: key[1] == scope)
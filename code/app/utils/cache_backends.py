@@ -0,0 +1,269 @@
+"""跨 worker 共享的缓存后端
+
+默认的进程内 LRUCache 每个 worker 各一份：worker A 保存打标后，其它 worker 的候选项/进度统计
+缓存要等 TTL 到期才更新，且每个 worker 都要各自重复执行同样的昂贵查询。
+
+FileCache 把缓存放在同一台主机所有 worker 共享的 SQLite 文件中(WAL 模式，读写并发安全)：
+- 任一 worker 计算的结果其它 worker 直接复用
+- clear_cache 删除的是共享存储中的条目，对所有 worker 立即生效(失效广播)
+- 与 LRUCache 相同的容量约束：条目数 + 字节预算，按最近访问时间淘汰，读取时惰性过期；
+  条目数与总字节数由触发器维护在 cache_meta 中，写入时只读一行判断是否超出预算，不扫描全表
+- 范围代数(cache_generation)同样存放在共享文件中，invalidate_scopes 对所有 worker 生效
+
+配置 CACHE_BACKEND=file 启用，CACHE_FILE_PATH 指定文件位置(需在所有 worker 可写的本地磁盘上)。
+缓存存储故障(文件被锁、磁盘错误)只当作未命中处理，不影响请求。
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from app.utils.cache import WILDCARD, expand_scope_pairs, scope_dimensions
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache_entry ('
+    ' func TEXT NOT NULL, scope TEXT NOT NULL, digest TEXT NOT NULL,'
+    ' value BLOB NOT NULL, size INTEGER NOT NULL, expires_at REAL NOT NULL, last_access REAL NOT NULL,'
+    ' PRIMARY KEY (func, scope, digest))'
+)
+GENERATION_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache_generation ('
+    ' category TEXT NOT NULL, brand TEXT NOT NULL, gen INTEGER NOT NULL, PRIMARY KEY (category, brand))'
+)
+# generation: 全局代数；floor: 最近一次 clear 时的代数；entries/bytes: cache_entry 的条目数与总字节数
+META_SCHEMA = 'CREATE TABLE IF NOT EXISTS cache_meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)'
+# 所有 worker 的增删都经过触发器累加到 entries/bytes(INSERT OR REPLACE 删除旧行需开启 recursive_triggers)
+TOTALS_TRIGGERS = (
+    'CREATE TRIGGER IF NOT EXISTS cache_entry_added AFTER INSERT ON cache_entry BEGIN'
+    " UPDATE cache_meta SET value = value + 1 WHERE name = 'entries';"
+    " UPDATE cache_meta SET value = value + NEW.size WHERE name = 'bytes'; END",
+    'CREATE TRIGGER IF NOT EXISTS cache_entry_removed AFTER DELETE ON cache_entry BEGIN'
+    " UPDATE cache_meta SET value = value - 1 WHERE name = 'entries';"
+    " UPDATE cache_meta SET value = value - OLD.size WHERE name = 'bytes'; END",
+)
+# 触发器建立后按现有条目初始化一次(单条语句，与其它 worker 的写入互不遗漏)
+INIT_TOTALS = ("INSERT OR IGNORE INTO cache_meta SELECT 'entries', COUNT(*) FROM cache_entry"
+               " UNION ALL SELECT 'bytes', COALESCE(SUM(size), 0) FROM cache_entry")
+LAST_ACCESS_INDEX = 'CREATE INDEX IF NOT EXISTS ix_cache_entry_last_access ON cache_entry (last_access)'
+# 命中时更新访问时间的最小间隔(秒)：近似 LRU，避免每次命中都产生一次写事务
+TOUCH_INTERVAL = 5.0
+
+
+class FileCache:
+    """基于本地 SQLite 文件的共享缓存，key 为 (函数, 权限范围, 参数哈希) 三元组"""
+
+    # 代数存放在共享文件中，changed_scopes 包含所有 worker 的写入
+    shared = True
+
+    def __init__(self, path, max_entries=2048, max_bytes=64 * 1024 * 1024):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0, 'errors': 0}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def configure(self, max_entries=None, max_bytes=None):
+        if max_entries is not None:
+            self.max_entries = max_entries
+        if max_bytes is not None:
+            self.max_bytes = max_bytes
+
+    def _connect(self):
+        # 每个线程(及 fork 后的每个进程)使用独立连接
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA recursive_triggers=ON')
+            for statement in (SCHEMA, GENERATION_SCHEMA, META_SCHEMA, LAST_ACCESS_INDEX, *TOTALS_TRIGGERS, INIT_TOTALS):
+                conn.execute(statement)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def get(self, key):
+        """返回 (是否命中, 值)"""
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute('SELECT value, expires_at, last_access FROM cache_entry '
+                               'WHERE func = ? AND scope = ? AND digest = ?', key).fetchone()
+            if row is None:
+                self._count('misses')
+                return False, None
+            value, expires_at, last_access = row
+            if expires_at <= now:
+                conn.execute('DELETE FROM cache_entry WHERE func = ? AND scope = ? AND digest = ?', key)
+                self._count('expired')
+                self._count('misses')
+                return False, None
+            if now - last_access > TOUCH_INTERVAL:
+                conn.execute('UPDATE cache_entry SET last_access = ? WHERE func = ? AND scope = ? AND digest = ?',
+                             (now, *key))
+            result = pickle.loads(value)
+        except (sqlite3.Error, pickle.PickleError, EOFError):
+            self._count('errors')
+            self._count('misses')
+            return False, None
+        self._count('hits')
+        return True, result
+
+    def set(self, key, value, timeout):
+        try:
+            payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PickleError, TypeError, AttributeError):
+            return  # 无法序列化的结果不缓存
+        if len(payload) > self.max_bytes:
+            return
+        now = time.time()
+        try:
+            conn = self._connect()
+            conn.execute('INSERT OR REPLACE INTO cache_entry VALUES (?, ?, ?, ?, ?, ?, ?)',
+                         (*key, payload, len(payload), now + timeout, now))
+            self._evict(conn, now)
+        except sqlite3.Error:
+            self._count('errors')
+
+    def _totals(self, conn):
+        """(条目数, 总字节数)，读取触发器维护的计数"""
+        totals = dict(conn.execute("SELECT name, value FROM cache_meta WHERE name IN ('entries', 'bytes')"))
+        return totals.get('entries', 0), totals.get('bytes', 0)
+
+    def _evict(self, conn, now):
+        entries, total = self._totals(conn)
+        if entries <= self.max_entries and total <= self.max_bytes:
+            return
+        # 超出预算时先删除已过期的条目，仍超出再按最近访问时间从旧到新删除，直到同时满足条目数与字节预算
+        self._count('expired', conn.execute('DELETE FROM cache_entry WHERE expires_at <= ?', (now,)).rowcount)
+        entries, total = self._totals(conn)
+        if entries <= self.max_entries and total <= self.max_bytes:
+            return
+        removed = 0
+        victims = []
+        rows = conn.execute('SELECT func, scope, digest, size FROM cache_entry ORDER BY last_access')
+        for func, scope, digest, size in rows:
+            if entries - removed <= self.max_entries and total <= self.max_bytes:
+                break
+            victims.append((func, scope, digest))
+            removed += 1
+            total -= size
+        rows.close()
+        conn.executemany('DELETE FROM cache_entry WHERE func = ? AND scope = ? AND digest = ?', victims)
+        self._count('evictions', len(victims))
+
+    def delete_where(self, predicate):
+        """删除 key 满足 predicate 的条目(对所有 worker 生效)，返回删除数量"""
+        try:
+            conn = self._connect()
+            keys = [tuple(row) for row in conn.execute('SELECT func, scope, digest FROM cache_entry')]
+            victims = [key for key in keys if predicate(key)]
+            conn.executemany('DELETE FROM cache_entry WHERE func = ? AND scope = ? AND digest = ?', victims)
+            return len(victims)
+        except sqlite3.Error:
+            self._count('errors')
+            return 0
+
+    def _next_generation(self, conn):
+        conn.execute("INSERT INTO cache_meta VALUES ('generation', 1) "
+                     "ON CONFLICT(name) DO UPDATE SET value = value + 1")
+        return conn.execute("SELECT value FROM cache_meta WHERE name = 'generation'").fetchone()[0]
+
+    def _write(self, operation):
+        """在一个写事务(BEGIN IMMEDIATE)中执行 operation(conn)，多个 worker 的代数递增互不覆盖"""
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            result = operation(conn)
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return result
+
+    def clear(self):
+        def operation(conn):
+            generation = self._next_generation(conn)
+            conn.execute("INSERT OR REPLACE INTO cache_meta VALUES ('floor', ?)", (generation,))
+            conn.execute('DELETE FROM cache_generation')
+            conn.execute('DELETE FROM cache_entry')
+
+        try:
+            self._write(operation)
+        except sqlite3.Error:
+            self._count('errors')
+
+    def current_generation(self):
+        """当前全局代数；读取失败返回 None(本次结果不缓存)"""
+        try:
+            row = self._connect().execute("SELECT value FROM cache_meta WHERE name = 'generation'").fetchone()
+        except sqlite3.Error:
+            self._count('errors')
+            return None
+        return row[0] if row else 0
+
+    def bump_generations(self, pairs):
+        """使与 pairs 中任一 (category, brand) 重叠的条目失效(对所有 worker 生效)"""
+        keys = expand_scope_pairs(pairs)
+
+        def operation(conn):
+            generation = self._next_generation(conn)
+            conn.executemany('INSERT OR REPLACE INTO cache_generation VALUES (?, ?, ?)',
+                             [(cat, brand, generation) for cat, brand in keys])
+            return generation
+
+        try:
+            return self._write(operation)
+        except sqlite3.Error:
+            self._count('errors')
+            return None
+
+    def scope_generation(self, categories, brands):
+        """范围内最近一次失效的代数；读取失败返回 None(按未命中处理)"""
+        cat_keys, brand_keys = scope_dimensions(categories, brands)
+        sql = ("SELECT MAX(gen) FROM ("
+               " SELECT value AS gen FROM cache_meta WHERE name = 'floor'"
+               " UNION ALL SELECT gen FROM cache_generation"
+               f" WHERE category IN ({','.join('?' * len(cat_keys))}) AND brand IN ({','.join('?' * len(brand_keys))}))")
+        try:
+            row = self._connect().execute(sql, (*cat_keys, *brand_keys)).fetchone()
+        except sqlite3.Error:
+            self._count('errors')
+            return None
+        return row[0] or 0
+
+    def changed_scopes(self, since):
+        """自代数 since 以来被失效的精确 (category, brand) 范围(含其它 worker 的写入)。
+
+        返回 (当前代数, 范围列表)；其间发生过 clear 时范围列表为 None，读取失败时当前代数为 None。
+        """
+        try:
+            conn = self._connect()
+            meta = dict(conn.execute('SELECT name, value FROM cache_meta').fetchall())
+            generation = meta.get('generation', 0)
+            if since is None or meta.get('floor', 0) > since:
+                return generation, None
+            pairs = conn.execute('SELECT category, brand FROM cache_generation '
+                                 'WHERE gen > ? AND category != ? AND brand != ?',
+                                 (since, WILDCARD, WILDCARD)).fetchall()
+        except sqlite3.Error:
+            self._count('errors')
+            return None, None
+        return generation, [tuple(pair) for pair in pairs]
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        try:
+            entries, total = self._totals(self._connect())
+        except sqlite3.Error:
+            entries, total = None, None
+        return dict(stats, entries=entries, bytes=total, max_entries=self.max_entries, max_bytes=self.max_bytes,
+                    generation=self.current_generation())
@@ -0,0 +1,271 @@
+"""可续传导入：按数据块记录检查点，转换失败的行隔离到拒绝文件
+
+标准导入每提交一个数据块，都在同一事务中更新 import_checkpoint.rows_done，因此：
+- 导入失败、被取消或进程中断后，已提交的数据块与检查点一致，续传时跳过这些行继续导入，
+  无需清空后从头重传
+- 无法转换的行(日期无法解析、字符串超出列长度、数据库拒绝的行)写入拒绝文件
+  <上传文件>.rejects.csv(原始值 + 行号 + 原因)，不再中止整个导入
+
+数据库在整块插入时报错，会用保存点二分定位出错的行，只隔离这些行，其余行照常导入。
+"""
+import os
+from functools import partial
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import update
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.models import ImportCheckpoint, SampleData, db
+from app.utils.csv_handler import (
+    DATE_COLUMNS, IMPORT_COLUMNS, ImportCancelled, _report_commit, _report_progress, column_as_str, insert_mappings,
+    iter_file_chunks, normalize_columns,
+)
+from app.utils.progress_tracker import progress_tracker
+
+REJECT_SUFFIX = '.rejects.csv'
+# 可续传的检查点状态(interrupted: 状态仍为 queued/running 但已没有对应的后台任务，如进程重启)
+RESUMABLE_STATUSES = ('failed', 'cancelled', 'interrupted')
+
+
+def create_checkpoint(file_path, filename, username=None):
+    """为一次新的导入创建检查点"""
+    checkpoint = ImportCheckpoint(
+        filename=filename, file_path=file_path, file_size=os.path.getsize(file_path), status='running',
+        rows_done=0, imported=0, rejected=0, reject_path=file_path + REJECT_SUFFIX, reject_bytes=0,
+        username=username,
+    )
+    db.session.add(checkpoint)
+    db.session.commit()
+    return checkpoint
+
+
+def _column_limits():
+    """String(n) 列的最大长度(超长值在 MySQL 严格模式下会使整块插入失败)"""
+    return {col.name: col.type.length for col in SampleData.__table__.columns
+            if col.name in IMPORT_COLUMNS and getattr(col.type, 'length', None)}
+
+
+def find_conversion_errors(df_chunk, arrays):
+    """逐列向量化检查转换结果，返回每行的拒绝原因数组(None 表示可以导入)。
+
+    arrays: normalize_columns 的结果。日期列原值非空但解析为 None 视为转换失败。
+    """
+    reasons = np.full(len(df_chunk), None, dtype=object)
+    limits = _column_limits()
+    for pos, col in enumerate(IMPORT_COLUMNS):
+        if col not in df_chunk.columns:
+            continue
+        values = arrays[pos]
+        if col in DATE_COLUMNS:
+            raw = column_as_str(df_chunk[col])
+            bad = (raw != None) & (values == None)  # noqa: E711 - 逐元素比较
+            for i in np.flatnonzero(bad & (reasons == None)):  # noqa: E711
+                reasons[i] = f'{col} 无法解析为日期: {raw[i]}'
+        elif col in limits:
+            mask = values != None  # noqa: E711
+            if not mask.any():
+                continue
+            bad = np.zeros(len(values), dtype=bool)
+            bad[mask] = pd.Series(values[mask], dtype=object).str.len().to_numpy() > limits[col]
+            for i in np.flatnonzero(bad & (reasons == None)):  # noqa: E711
+                reasons[i] = f'{col} 超出最大长度 {limits[col]}'
+    return reasons
+
+
+def _insert_isolating_failures(mappings, row_idx, rejects):
+    """以保存点插入，失败时二分定位出错行并记入 rejects，返回成功插入的行数"""
+    try:
+        with db.session.begin_nested():
+            insert_mappings(mappings)
+        return len(mappings)
+    except SQLAlchemyError as e:
+        if len(mappings) == 1:
+            rejects.append((row_idx[0], f'数据库拒绝: {getattr(e, "orig", e)}'))
+            return 0
+        mid = len(mappings) // 2
+        return (_insert_isolating_failures(mappings[:mid], row_idx[:mid], rejects)
+                + _insert_isolating_failures(mappings[mid:], row_idx[mid:], rejects))
+
+
+def _insert_chunk(mappings, row_idx, rejects):
+    """整块插入；数据库报错时回滚本块，改为逐段隔离出错行"""
+    if not mappings:
+        return 0
+    try:
+        insert_mappings(mappings)
+        return len(mappings)
+    except SQLAlchemyError:
+        db.session.rollback()
+        return _insert_isolating_failures(mappings, row_idx, rejects)
+
+
+def _skip_done_rows(reader, rows_done):
+    """丢弃检查点之前已处理的行(只解析不入库)，之后按块继续产出"""
+    for df_chunk in reader:
+        if rows_done >= len(df_chunk):
+            rows_done -= len(df_chunk)
+            continue
+        if rows_done:
+            df_chunk = df_chunk.iloc[rows_done:].reset_index(drop=True)
+            rows_done = 0
+        yield df_chunk
+
+
+def _reset_reject_file(checkpoint):
+    """把拒绝文件截断到检查点记录的长度(丢弃未提交数据块写入的拒绝行)"""
+    path = checkpoint.reject_path
+    if not path or not os.path.exists(path):
+        return
+    if checkpoint.reject_bytes:
+        os.truncate(path, checkpoint.reject_bytes)
+    else:
+        os.remove(path)
+
+
+def _append_rejects(checkpoint, df_chunk, rejects):
+    """追加拒绝行(行号 + 原因 + 原始各列)，返回追加后的文件长度"""
+    rejects = sorted(rejects)
+    idx = [i for i, _ in rejects]
+    frame = df_chunk.iloc[idx].copy()
+    # 行号与 Excel 中看到的行号一致(表头为第1行)
+    frame.insert(0, '_reject_reason', [reason for _, reason in rejects])
+    frame.insert(0, '_row_number', [checkpoint.rows_done + i + 2 for i in idx])
+
+    path = checkpoint.reject_path
+    new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+    with open(path, 'a', encoding='utf-8-sig' if new_file else 'utf-8', newline='') as f:
+        frame.to_csv(f, index=False, header=new_file)
+        f.flush()
+        os.fsync(f.fileno())
+    return os.path.getsize(path)
+
+
+def _finish(checkpoint, status, message):
+    checkpoint.status = status
+    checkpoint.message = message
+    db.session.commit()
+
+
+def import_csv_with_checkpoint(file_path, chunk_size=5000, progress_callback=None, cancel_event=None,
+                               total_hint=0, checkpoint_id=None, commit_callback=None):
+    """
+    可续传的标准导入
+
+    参数同 import_csv_to_db，另有:
+        checkpoint_id: 续传的检查点 id；为空时新建检查点从头导入
+
+    每个数据块与检查点在同一事务中提交；失败/取消后保留已提交的数据，可按检查点续传。
+    """
+    if checkpoint_id:
+        checkpoint = db.session.get(ImportCheckpoint, checkpoint_id)
+        if checkpoint is None:
+            return False, '导入检查点不存在'
+    else:
+        checkpoint = create_checkpoint(file_path, os.path.basename(file_path))
+
+    if not os.path.exists(file_path) or os.path.getsize(file_path) != checkpoint.file_size:
+        _finish(checkpoint, 'failed', '上传文件已不存在或已被修改，无法续传')
+        return False, checkpoint.message
+
+    checkpoint.status = 'running'
+    db.session.commit()
+    # 续传时检查点包含之前运行已导入的行，本次提交的行数从此处起算
+    imported_before = checkpoint.imported
+    try:
+        _reset_reject_file(checkpoint)
+        reader, total_rows = iter_file_chunks(file_path, chunk_size, progress_callback)
+        total_rows = total_rows or total_hint
+        if checkpoint.rows_done and progress_callback:
+            progress_callback(checkpoint.rows_done, total_rows or checkpoint.rows_done,
+                              f'从第 {checkpoint.rows_done + 1} 行继续导入...')
+
+        date_cache = {}
+        for df_chunk in _skip_done_rows(reader, checkpoint.rows_done):
+            if cancel_event is not None and cancel_event.is_set():
+                raise ImportCancelled()
+            if not len(df_chunk):
+                continue
+
+            arrays = normalize_columns(df_chunk, date_cache)
+            reasons = find_conversion_errors(df_chunk, arrays)
+            valid_idx = np.flatnonzero(reasons == None)  # noqa: E711
+            rejects = [(int(i), reasons[i]) for i in np.flatnonzero(reasons != None)]  # noqa: E711
+            mappings = list(map(dict, map(partial(zip, IMPORT_COLUMNS),
+                                          zip(*(array[valid_idx] for array in arrays)))))
+            imported = _insert_chunk(mappings, valid_idx.tolist(), rejects)
+
+            if rejects:
+                checkpoint.reject_bytes = _append_rejects(checkpoint, df_chunk, rejects)
+            checkpoint.rows_done += len(df_chunk)
+            checkpoint.imported += imported
+            checkpoint.rejected += len(rejects)
+            # 数据块与检查点同一事务提交
+            db.session.commit()
+            _report_commit(commit_callback, checkpoint.imported - imported_before)
+            _report_progress(progress_callback, checkpoint.rows_done, total_rows)
+
+        message = f'成功导入 {checkpoint.imported} 条数据'
+        if checkpoint.rejected:
+            message += f'，{checkpoint.rejected} 条无法转换的数据已写入拒绝文件'
+        _finish(checkpoint, 'completed', message)
+        return True, message
+
+    except ImportCancelled:
+        db.session.rollback()
+        _finish(checkpoint, 'cancelled',
+                f'导入已取消，已导入 {checkpoint.imported} 条数据，可从第 {checkpoint.rows_done + 1} 行续传')
+        return False, checkpoint.message
+    except Exception as e:
+        db.session.rollback()
+        _finish(checkpoint, 'failed',
+                f'导入失败: {str(e)}（已提交 {checkpoint.rows_done} 行，可从第 {checkpoint.rows_done + 1} 行续传）')
+        return False, checkpoint.message
+
+
+def _job_active(task_id):
+    task = progress_tracker.get_progress(task_id) if task_id else None
+    return bool(task) and task['status'] in ('queued', 'processing')
+
+
+def checkpoint_state(checkpoint):
+    """检查点的展示状态：queued/running 但没有对应的活动任务时视为 interrupted"""
+    if checkpoint.status in ('queued', 'running') and not _job_active(checkpoint.task_id):
+        return 'interrupted'
+    return checkpoint.status
+
+
+def is_resumable(checkpoint):
+    return checkpoint_state(checkpoint) in RESUMABLE_STATUSES and os.path.exists(checkpoint.file_path or '')
+
+
+def claim_for_resume(checkpoint, task_id):
+    """把可续传的检查点改为 queued 并记下 task_id；不可续传或已被其它请求抢先续传时返回 False。
+
+    按读到的 (status, task_id) 条件更新，重复提交的续传请求只有一个能更新成功，
+    不会排入两个续传任务重复导入同一批行。task_id 需先由 import_job_runner.reserve() 登记为排队中，
+    否则提交任务前其它请求会把检查点视为 interrupted。
+    """
+    if not is_resumable(checkpoint):
+        return False
+    current_task = (ImportCheckpoint.task_id.is_(None) if checkpoint.task_id is None
+                    else ImportCheckpoint.task_id == checkpoint.task_id)
+    result = db.session.execute(
+        update(ImportCheckpoint)
+        .where(ImportCheckpoint.id == checkpoint.id, ImportCheckpoint.status == checkpoint.status, current_task)
+        .values(status='queued', task_id=task_id)
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def list_checkpoints(limit=10):
+    """最近的导入检查点(含续传/拒绝文件下载所需的标记)，按创建时间倒序"""
+    items = []
+    for checkpoint in ImportCheckpoint.query.order_by(ImportCheckpoint.id.desc()).limit(limit).all():
+        item = checkpoint.to_dict()
+        item['status'] = checkpoint_state(checkpoint)
+        item['resumable'] = is_resumable(checkpoint)
+        item['has_rejects'] = bool(checkpoint.rejected) and os.path.exists(checkpoint.reject_path or '')
+        items.append(item)
+    return items
@@ -0,0 +1,103 @@
+"""按数据库排序规则比较取值(进程内索引与 SQL 判断"同一个值"的规则保持一致)
+
+SQL 路径的 GROUP BY / IN / = 按列的排序规则比较：MySQL 默认的 utf8mb4_general_ci、utf8mb4_0900_ai_ci
+不区分大小写与重音，PAD SPACE 排序规则(除 *_0900_* 外的 MySQL 排序规则)还忽略尾部空格，
+'Apple'、'apple'、'Apple ' 是同一个值。分面索引与标签组合图若按字符串精确匹配，同一筛选的
+结果会因索引是否就绪而不同。
+
+column_folds() 读取各列的排序规则并返回折叠函数：折叠结果相同的两个取值视为相等
+(不区分大小写 -> casefold；不区分重音 -> 去掉 NFKD 分解后的组合附加符号；PAD SPACE -> 去掉尾部空格)。
+这是对排序规则的近似，覆盖常见的大小写/重音/全半角/尾部空格差异；无法识别的排序规则或方言返回 None，
+调用方不建索引、始终使用 SQL。
+"""
+import re
+import string
+import unicodedata
+
+from sqlalchemy import text
+
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def identity(value):
+    return value
+
+
+def _strip_pad(value):
+    return value.rstrip(' ')
+
+
+def _strip_accents(value):
+    return ''.join(ch for ch in unicodedata.normalize('NFKD', value) if not unicodedata.combining(ch))
+
+
+def _ascii_lower(value):
+    return value.translate(_ASCII_LOWER)
+
+
+def _compose(*steps):
+    steps = [step for step in steps if step is not None]
+    if not steps:
+        return identity
+
+    def fold(value):
+        for step in steps:
+            value = step(value)
+        return value
+
+    return fold
+
+
+def mysql_fold(collation):
+    """MySQL 排序规则名 -> 折叠函数(无法识别时返回 None)"""
+    name = collation.lower()
+    if name == 'binary':
+        return identity
+    pad = None if '_0900_' in name else _strip_pad  # MySQL 8 的 *_0900_* 为 NO PAD，其余为 PAD SPACE
+    if name.endswith(('_bin', '_cs')):
+        return _compose(pad)
+    if name.endswith('_ci'):
+        return _compose(pad, None if '_as_' in name else _strip_accents, str.casefold)
+    return None
+
+
+def sqlite_fold(collation):
+    """SQLite 内置排序规则 -> 折叠函数(NOCASE 只折叠 ASCII 字母)"""
+    return {'binary': identity, 'nocase': _ascii_lower, 'rtrim': _strip_pad}.get(collation.lower())
+
+
+def _mysql_collations(session, table_name):
+    rows = session.execute(text('SELECT COLUMN_NAME, COLLATION_NAME FROM information_schema.COLUMNS '
+                                'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table'), {'table': table_name})
+    return {name: collation for name, collation in rows if collation}
+
+
+def _sqlite_collations(session, table_name):
+    ddl = session.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :table"),
+                          {'table': table_name}).scalar() or ''
+    collations = {}
+    # 建表语句括号内按不在括号中的逗号拆分为各列定义(跳过 VARCHAR(255)、DECIMAL(10, 2) 等类型参数)
+    for definition in re.split(r',(?![^(]*\))', ddl[ddl.find('(') + 1:ddl.rfind(')')]):
+        match = re.match(r'\s*["`\[]?(\w+)["`\]]?\s.*\bCOLLATE\s+["`]?(\w+)', definition, re.I | re.S)
+        if match:
+            collations[match.group(1)] = match.group(2)
+    return collations
+
+
+def column_folds(session, table_name, column_names):
+    """{列名: 折叠函数}；任一列的排序规则无法识别(或非 MySQL/SQLite)时返回 None"""
+    dialect = session.get_bind().dialect.name
+    if dialect == 'mysql':
+        # 非字符串列(日期、数字)没有排序规则，按二进制比较
+        collations, default, to_fold = _mysql_collations(session, table_name), 'binary', mysql_fold
+    elif dialect == 'sqlite':
+        collations, default, to_fold = _sqlite_collations(session, table_name), 'BINARY', sqlite_fold
+    else:
+        return None
+    folds = {}
+    for name in column_names:
+        fold = to_fold(collations.get(name, default))
+        if fold is None:
+            return None
+        folds[name] = fold
+    return folds
@@ -1,226 +1,624 @@
 import pandas as pd
+import numpy as np
+import csv
+import io
 import os
+import multiprocessing
+import shutil
+import tempfile
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from threading import Event, Thread
 from werkzeug.utils import secure_filename
 from app.models import SampleData, db
-from sqlalchemy import text
+from sqlalchemy import select, text
 from dateutil.parser import parse as date_parse
+from openpyxl import load_workbook
 
 def allowed_file(filename):
     """检查文件扩展名是否允许"""
     ALLOWED_EXTENSIONS = {'csv', 'xlsx'}
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def import_csv_to_db(file_path, chunk_size=5000, progress_callback=None):
+# 导入列（按数据库列顺序），文件中缺失的列按 NULL 导入
+IMPORT_COLUMNS = [
+    'eRetailer', 'online_store', 'category', 'brand', 'is_competitor',
+    'product_description', 'url', 'sku_url', 'sku', 'sku_id',
+    'retailer_product_code', 'latest_review_date', 'image_url',
+    'total', 'total_comments', 'last_month_total', 'last_total_comments',
+    'note',
+    'prod_attributes1', 'prod_attributes2', 'prod_attributes3',
+    'prod_attributes4', 'prod_attributes5', 'status'
+]
+DATE_COLUMNS = ('latest_review_date',)
+ISO_DATE_FORMAT = '%Y-%m-%d'
+
+
+def _empty_column(length):
+    return np.full(length, None, dtype=object)
+
+
+def column_as_str(series):
+    """整列转换为 str/None：NaN、None、空串均为 None，数字按 str() 规则转字符串。"""
+    result = _empty_column(len(series))
+    mask = series.notna().to_numpy()
+    if mask.any():
+        strs = series[mask].astype(str).to_numpy(dtype=object)
+        strs[strs == ''] = None
+        result[mask] = strs
+    return result
+
+
+def parse_date_value(value):
+    """解析单个日期字符串为 date，无法解析返回 None。"""
+    try:
+        # 尝试将各种格式的日期字符串解析为date对象
+        return date_parse(value).date()
+    except (ValueError, TypeError, OverflowError):
+        return None
+
+
+def column_as_date(series, date_cache=None):
+    """整列解析日期：先去重，再对不重复的日期字符串解析一次。
+
+    ISO 格式(YYYY-MM-DD)走 pandas 向量化解析，其余格式回退 dateutil；
+    date_cache 可跨数据块复用（月度文件中不重复日期通常只有几百个）。
+    """
+    if date_cache is None:
+        date_cache = {}
+    strs = column_as_str(series)
+    mask = strs != None  # noqa: E711 - 逐元素比较
+    if not mask.any():
+        return strs
+
+    distinct = [value for value in pd.unique(strs[mask]) if value not in date_cache]
+    if distinct:
+        parsed = pd.to_datetime(pd.Series(distinct, dtype=object), format=ISO_DATE_FORMAT, errors='coerce')
+        for value, ts in zip(distinct, parsed):
+            date_cache[value] = ts.date() if not pd.isna(ts) else parse_date_value(value)
+
+    result = _empty_column(len(strs))
+    result[mask] = pd.Series(strs[mask], dtype=object).map(date_cache).to_numpy(dtype=object)
+    return result
+
+
+def normalize_columns(df_chunk, date_cache=None):
+    """按列转换一个数据块，返回与 IMPORT_COLUMNS 一一对应的 object 数组列表。"""
+    length = len(df_chunk)
+    arrays = []
+    for col in IMPORT_COLUMNS:
+        if col not in df_chunk.columns:
+            arrays.append(_empty_column(length))
+        elif col in DATE_COLUMNS:
+            arrays.append(column_as_date(df_chunk[col], date_cache))
+        else:
+            arrays.append(column_as_str(df_chunk[col]))
+
+    # 优先使用文件中的status,否则默认为Unlabeled
+    status = arrays[-1]
+    status[status == None] = 'Unlabeled'  # noqa: E711 - 逐元素比较
+    return arrays
+
+
+def normalize_chunk(df_chunk, date_cache=None):
+    """按列把一个数据块转换为 bulk_insert_mappings 所需的字典列表。
+
+    与逐行 iterrows + safe_value 的结果一致，但转换全部在列级完成；
+    组装字典时使用 map/zip，避免逐行执行 Python 代码。
+    """
+    arrays = normalize_columns(df_chunk, date_cache)
+    return list(map(dict, map(partial(zip, IMPORT_COLUMNS), zip(*arrays))))
+
+
+def estimate_csv_rows(file_path, block_size=4 * 1024 * 1024):
+    """按换行符快速估算CSV数据行数(不含表头)，仅用于进度百分比和 ETA。
+
+    字段内含换行时会略微高估；二进制分块扫描，500MB 文件约需数百毫秒。
+    """
+    lines = 0
+    last = b''
+    with open(file_path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            lines += block.count(b'\n')
+            last = block
+    if last and not last.endswith(b'\n'):
+        lines += 1
+    return max(lines - 1, 0)
+
+
+def iter_xlsx_chunks(file_path, chunk_size=5000):
+    """以 openpyxl 只读模式流式读取首个工作表，返回(数据块迭代器, 总行数估计)。
+
+    第一行为表头；整行为空的行跳过。总行数取自工作表维度信息，缺失时为0。
+    """
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    sheet = workbook.worksheets[0]
+    total_rows = max((sheet.max_row or 1) - 1, 0)
+
+    def chunks():
+        try:
+            rows = sheet.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            columns = [str(name) if name is not None else f'Unnamed: {idx}'
+                       for idx, name in enumerate(header)]
+            width = len(columns)
+            buffer = []
+            for row in rows:
+                if not any(value is not None and value != '' for value in row):
+                    continue
+                buffer.append(row[:width] + (None,) * (width - len(row)))
+                if len(buffer) >= chunk_size:
+                    yield pd.DataFrame.from_records(buffer, columns=columns)
+                    buffer = []
+            if buffer:
+                yield pd.DataFrame.from_records(buffer, columns=columns)
+        finally:
+            workbook.close()
+
+    return chunks(), total_rows
+
+
+def iter_file_chunks(file_path, chunk_size=5000, progress_callback=None):
+    """按文件类型返回数据块迭代器及总行数(未知时为0)。"""
+    if file_path.endswith('.csv'):
+        if progress_callback:
+            progress_callback(0, 0, '正在读取文件...')
+
+        # 直接分块读取,不预先统计行数(避免读取两遍)
+        return pd.read_csv(file_path, encoding='utf-8-sig', chunksize=chunk_size), 0
+    elif file_path.endswith('.xlsx'):
+        # Excel 以只读模式逐行流式读取，按 chunk_size 切块，内存占用与工作簿大小无关
+        if progress_callback:
+            progress_callback(0, 0, '正在读取Excel文件...')
+        return iter_xlsx_chunks(file_path, chunk_size)
+    else:
+        raise ValueError('不支持的文件格式')
+
+
+def insert_mappings(mappings, table=None):
+    """以 Core executemany 批量插入(方言自身的多行 INSERT 路径)，跳过 ORM 单元处理开销。
+
+    table: 目标表，默认 sample_data(影子表导入时传入影子表)
+    """
+    table = SampleData.__table__ if table is None else table
+    db.session.execute(table.insert(), mappings)
+
+
+def _report_commit(commit_callback, committed):
+    """上报本次导入已提交(对线上数据生效)的累计行数"""
+    if commit_callback:
+        commit_callback(committed)
+
+
+def _report_progress(progress_callback, total_count, total_rows):
+    if progress_callback:
+        # CSV文件total_rows为0时显示未知总数
+        if total_rows > 0:
+            progress_callback(total_count, total_rows, f'已导入 {total_count} / {total_rows} 条数据')
+        else:
+            progress_callback(total_count, total_count, f'已导入 {total_count} 条数据...')
+    else:
+        # 打印进度(每5000条输出一次)
+        print(f'已导入 {total_count} 条数据...')
+
+
+class ImportCancelled(Exception):
+    """导入任务被取消"""
+
+
+def import_csv_to_db(file_path, chunk_size=5000, progress_callback=None, cancel_event=None, total_hint=0,
+                     commit_callback=None):
     """
     导入CSV文件到数据库(优化版,支持百万级数据)
 
     优化策略:
     1. 分块读取CSV,避免一次性加载全部数据到内存
-    2. 使用bulk_insert_mappings批量插入,比逐行add快10-50倍
+    2. 使用Core批量插入(insert_mappings),比逐行add快10-50倍
     3. 增大每批次提交数量到5000条
-    4. 支持进度回调
+    4. 按列向量化转换(normalize_chunk),日期按不重复值解析并跨块缓存
+    5. 支持进度回调
 
     参数:
         file_path: 文件路径
         chunk_size: 每块大小(默认5000)
         progress_callback: 进度回调函数 callback(current, total, message)
+        cancel_event: 可选 threading.Event，置位后在下一个数据块前停止导入
+        total_hint: 预估总行数(CSV 分块读取时总数未知，用于进度百分比和 ETA)
+        commit_callback: 每次提交后以本次已提交到线上数据的累计行数调用 callback(rows)；
+            进度回调的计数可能包含随后被回滚的行，失败/取消时以此判断是否有数据生效
     """
+    total_count = 0
     try:
-        total_count = 0
-
-        # 辅助函数：安全转换值
-        def safe_value(val):
-            """安全转换值，处理nan和None"""
-            if val is None:
-                return None
-            if pd.isna(val):
-                return None
-            # 如果是数字类型，转换为字符串
-            if isinstance(val, (int, float)):
-                return str(val)
-            return str(val) if val else None
-
-        # 辅助函数：解析日期
-        def parse_date(date_str):
-            if not date_str or pd.isna(date_str):
-                return None
-            try:
-                # 尝试将各种格式的日期字符串解析为date对象
-                return date_parse(str(date_str)).date()
-            except (ValueError, TypeError):
-                # 如果解析失败，返回None
-                return None
-
-        # 分块读取CSV文件
-        if file_path.endswith('.csv'):
-            if progress_callback:
-                progress_callback(0, 0, '正在读取文件...')
-
-            # 直接分块读取,不预先统计行数(避免读取两遍)
-            reader = pd.read_csv(file_path, encoding='utf-8-sig', chunksize=chunk_size)
-            total_rows = 0  # 使用动态总数
-        elif file_path.endswith('.xlsx'):
-            # Excel文件不支持chunksize,需要一次性读取
-            if progress_callback:
-                progress_callback(0, 0, '正在读取Excel文件...')
-            df = pd.read_excel(file_path)
-            total_rows = len(df)
-            if progress_callback:
-                progress_callback(0, total_rows, f'准备导入 {total_rows} 条数据...')
-            reader = [df]
-        else:
-            raise ValueError('不支持的文件格式')
+        date_cache = {}
+
+        reader, total_rows = iter_file_chunks(file_path, chunk_size, progress_callback)
+        total_rows = total_rows or total_hint
 
         # 处理每个数据块
-        for chunk_idx, df_chunk in enumerate(reader):
-            # 替换NaN为None
-            df_chunk = df_chunk.where(pd.notnull(df_chunk), None)
+        for df_chunk in reader:
+            if cancel_event is not None and cancel_event.is_set():
+                raise ImportCancelled()
 
             # 准备批量插入的数据
-            mappings = []
-            for _, row in df_chunk.iterrows():
-                mapping = {
-                    'eRetailer': safe_value(row.get('eRetailer')),
-                    'online_store': safe_value(row.get('online_store')),
-                    'category': safe_value(row.get('category')),
-                    'brand': safe_value(row.get('brand')),
-                    'is_competitor': safe_value(row.get('is_competitor')),
-                    'product_description': safe_value(row.get('product_description')),
-                    'url': safe_value(row.get('url')),
-                    'sku_url': safe_value(row.get('sku_url')),
-                    'sku': safe_value(row.get('sku')),
-                    'sku_id': safe_value(row.get('sku_id')),
-                    'retailer_product_code': safe_value(row.get('retailer_product_code')),
-                    'latest_review_date': parse_date(row.get('latest_review_date')),
-                    'image_url': safe_value(row.get('image_url')),
-                    'total': safe_value(row.get('total')),
-                    'total_comments': safe_value(row.get('total_comments')),
-                    'last_month_total': safe_value(row.get('last_month_total')),
-                    'last_total_comments': safe_value(row.get('last_total_comments')),
-                    'note': safe_value(row.get('note')),
-                    'prod_attributes1': safe_value(row.get('prod_attributes1')),
-                    'prod_attributes2': safe_value(row.get('prod_attributes2')),
-                    'prod_attributes3': safe_value(row.get('prod_attributes3')),
-                    'prod_attributes4': safe_value(row.get('prod_attributes4')),
-                    'prod_attributes5': safe_value(row.get('prod_attributes5')),
-                    'status': safe_value(row.get('status')) or 'Unlabeled'  # 优先使用文件中的status,否则默认为Unlabeled
-                }
-                mappings.append(mapping)
+            mappings = normalize_chunk(df_chunk, date_cache)
 
             # 批量插入当前块
             if mappings:
-                db.session.bulk_insert_mappings(SampleData, mappings)
+                insert_mappings(mappings)
                 db.session.commit()
                 total_count += len(mappings)
-
-                # 进度回调
-                if progress_callback:
-                    # CSV文件total_rows为0时显示未知总数
-                    if total_rows > 0:
-                        progress_callback(total_count, total_rows, f'已导入 {total_count} / {total_rows} 条数据')
-                    else:
-                        progress_callback(total_count, total_count, f'已导入 {total_count} 条数据...')
-                else:
-                    # 打印进度(每5000条输出一次)
-                    print(f'已导入 {total_count} 条数据...')
+                _report_commit(commit_callback, total_count)
+                _report_progress(progress_callback, total_count, total_rows)
 
         return True, f'成功导入 {total_count} 条数据'
 
+    except ImportCancelled:
+        db.session.rollback()
+        return False, f'导入已取消，取消前已导入 {total_count} 条数据'
     except Exception as e:
         db.session.rollback()
         return False, f'导入失败: {str(e)}'
 
-def import_csv_to_db_ultra_fast(file_path):
+
+# 解析进程内跨字节区间复用的日期缓存(每个进程各一份)
+_worker_date_cache = {}
+
+PARALLEL_RANGE_BYTES = 8 * 1024 * 1024
+_BOUNDARY_SCAN_BYTES = 64 * 1024
+
+
+def read_csv_header(file_path):
+    """CSV 表头列名(与 pd.read_csv 的重复列名处理一致)"""
+    return list(pd.read_csv(file_path, encoding='utf-8-sig', nrows=0).columns)
+
+
+def iter_csv_ranges(file_path, range_bytes=PARALLEL_RANGE_BYTES):
+    """把 CSV 数据部分(表头之后)切成约 range_bytes 的字节区间 (start, end)，边界落在记录开头。
+
+    候选边界为区间末尾之后的第一个换行符；从区间起点到换行符的双引号数为偶数时，
+    该换行符不在引号字段内(转义的 "" 成对出现，不影响奇偶)，否则继续找下一个换行符。
+    扫描只做 bytes.count/find，不解析字段。
+    """
+    with open(file_path, 'rb') as f:
+        f.readline()  # 表头
+        start = f.tell()
+        while True:
+            block = f.read(range_bytes)
+            if not block:
+                return
+            quotes = block.count(b'"')
+            end = None
+            while end is None:
+                tail = f.read(_BOUNDARY_SCAN_BYTES)
+                if not tail:
+                    end = f.tell()
+                    break
+                newline = tail.find(b'\n')
+                while newline >= 0:
+                    if (quotes + tail.count(b'"', 0, newline)) % 2 == 0:
+                        end = f.tell() - len(tail) + newline + 1
+                        break
+                    newline = tail.find(b'\n', newline + 1)
+                quotes += tail.count(b'"')
+            yield start, end
+            f.seek(end)
+            start = end
+
+
+def _parse_range_in_worker(file_path, start, end, columns):
+    """进程池入口(必须是模块级函数才能被 spawn 子进程导入)：子进程自行读取并解析一个字节区间，
+    返回与 IMPORT_COLUMNS 对应的列数组，不在进程间传递 DataFrame 或字典列表"""
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    df_range = pd.read_csv(io.BytesIO(data), header=None, names=columns, encoding='utf-8')
+    return normalize_columns(df_range, _worker_date_cache)
+
+
+def iter_parallel_batches(file_path, chunk_size, executor, workers, range_bytes=PARALLEL_RANGE_BYTES,
+                          cancel_event=None):
+    """按文件顺序产出插入批次(字典列表，每批至多 chunk_size 行)
+
+    子进程并行解析各字节区间，当前进程只负责切分区间和把列数组组装为插入批次；
+    在途区间数量上限为 workers * 2，内存占用与文件大小无关。
+    """
+    columns = read_csv_header(file_path)
+    ranges = iter_csv_ranges(file_path, range_bytes)
+    in_flight = deque()
+    exhausted = False
+    while in_flight or not exhausted:
+        # 补满解析窗口
+        while not exhausted and len(in_flight) < workers * 2:
+            span = next(ranges, None)
+            if span is None:
+                exhausted = True
+            else:
+                in_flight.append(executor.submit(_parse_range_in_worker, file_path, *span, columns))
+        if not in_flight:
+            break
+
+        # 按提交顺序取结果，保持与文件一致的行顺序
+        arrays = in_flight.popleft().result()
+        length = len(arrays[0])
+        for offset in range(0, length, chunk_size):
+            if cancel_event is not None and cancel_event.is_set():
+                raise ImportCancelled()
+            batch = [array[offset:offset + chunk_size] for array in arrays]
+            yield list(map(dict, map(partial(zip, IMPORT_COLUMNS), zip(*batch))))
+
+
+def import_csv_to_db_parallel(file_path, chunk_size=5000, progress_callback=None, cancel_event=None,
+                              total_hint=0, workers=None, range_bytes=PARALLEL_RANGE_BYTES, commit_callback=None):
     """
-    极速导入方案(使用LOAD DATA INFILE,仅支持MySQL)
-    适用于超大文件(100万+),速度可提升10-100倍
+    多进程并行导入(适合百万级 CSV 大文件)
+
+    流水线:
+    1. 主线程按字节把 CSV 切成若干区间(边界对齐到记录开头，见 iter_csv_ranges)
+    2. 进程池中每个子进程自行读取、解析并按列转换一个区间，返回列数组
+    3. 主线程作为唯一写入者，按区间顺序把列数组切成 chunk_size 行的批次插入并提交
+
+    子进程之间只传递区间位置和列数组，读取与解析(pandas C 引擎)都在子进程内完成。
+    Excel 文件无法按字节切分，回退为 import_csv_to_db。
 
-    注意:需要MySQL配置允许local_infile
+    参数同 import_csv_to_db，另有:
+        workers: 解析进程数，默认取配置 IMPORT_PARSE_WORKERS，未配置时为 CPU 核数
+        range_bytes: 每个子进程一次解析的字节数
     """
+    if not file_path.endswith('.csv'):
+        return import_csv_to_db(file_path, chunk_size, progress_callback, cancel_event, total_hint,
+                                commit_callback=commit_callback)
+    if not workers:
+        from flask import current_app
+        workers = current_app.config.get('IMPORT_PARSE_WORKERS') or os.cpu_count() or 1
+
+    total_count = 0
+    # spawn 而非 fork：Web 进程中有线程和数据库连接，fork 后子进程状态不可靠
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
     try:
-        import csv
-
-        # 读取CSV并转换为临时文件
-        temp_file = file_path + '.prepared.csv'
-
-        # 辅助函数
-        def safe_value(val):
-            if val is None or val == '' or (isinstance(val, float) and pd.isna(val)):
-                return '\\N'  # MySQL的NULL表示
-            return str(val)
-
-        # 预处理CSV
-        if file_path.endswith('.csv'):
-            df = pd.read_csv(file_path, encoding='utf-8-sig')
-        elif file_path.endswith('.xlsx'):
-            df = pd.read_excel(file_path)
-        else:
-            raise ValueError('不支持的文件格式')
-
-        # 替换NaN为None
-        df = df.where(pd.notnull(df), None)
-
-        # 写入临时CSV(按数据库列顺序)
-        columns = [
-            'eRetailer', 'online_store', 'category', 'brand', 'is_competitor',
-            'product_description', 'url', 'sku_url', 'sku', 'sku_id',
-            'retailer_product_code', 'latest_review_date', 'image_url',
-            'total', 'total_comments', 'last_month_total', 'last_total_comments',
-            'note',
-            'prod_attributes1', 'prod_attributes2', 'prod_attributes3',
-            'prod_attributes4', 'prod_attributes5', 'status'
-        ]
-
-        with open(temp_file, 'w', encoding='utf-8', newline='') as f:
-            writer = csv.writer(f)
-            for _, row in df.iterrows():
-                writer.writerow([safe_value(row.get(col)) for col in columns])
-
-        # 使用LOAD DATA INFILE导入
-        temp_file_escaped = temp_file.replace('\\', '/')
-        sql = f"""
-        LOAD DATA LOCAL INFILE '{temp_file_escaped}'
-        INTO TABLE sample_data
-        FIELDS TERMINATED BY ',' ENCLOSED BY '"'
-        LINES TERMINATED BY '\\n'
-        ({', '.join(columns)})
-        """
-
-        db.session.execute(text(sql))
-        db.session.commit()
-
-        # 清理临时文件
-        if os.path.exists(temp_file):
-            os.remove(temp_file)
+        if progress_callback:
+            progress_callback(0, 0, '正在读取文件...')
+        for mappings in iter_parallel_batches(file_path, chunk_size, executor, workers, range_bytes, cancel_event):
+            if mappings:
+                insert_mappings(mappings)
+                db.session.commit()
+                total_count += len(mappings)
+                _report_commit(commit_callback, total_count)
+                _report_progress(progress_callback, total_count, total_hint)
 
-        row_count = len(df)
-        return True, f'成功导入 {row_count} 条数据'
+        return True, f'成功导入 {total_count} 条数据'
 
+    except ImportCancelled:
+        db.session.rollback()
+        return False, f'导入已取消，取消前已导入 {total_count} 条数据'
     except Exception as e:
         db.session.rollback()
-        if os.path.exists(temp_file):
-            os.remove(temp_file)
-        return False, f'极速导入失败: {str(e)}'
-
-def export_samples_to_csv(samples, output_path):
-    """导出样本数据到CSV"""
+        return False, f'导入失败: {str(e)}'
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+# LOAD DATA 文本格式：制表符分隔、反斜杠转义、\N 表示 NULL
+LOAD_DATA_SQL = (
+    "LOAD DATA LOCAL INFILE '{path}' INTO TABLE `{table}` CHARACTER SET utf8mb4 "
+    "FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' ({columns})"
+)
+TSV_ESCAPES = (('\\', '\\\\'), ('\t', '\\t'), ('\n', '\\n'), ('\r', '\\r'))
+
+
+def encode_load_data_rows(arrays):
+    """把 normalize_columns 的结果按列编码为 LOAD DATA 文本(UTF-8 字节)。"""
+    encoded = []
+    for values in arrays:
+        series = pd.Series(values, dtype=object)
+        missing = series.isna()
+        text_values = series.astype(str)
+        for raw, escaped in TSV_ESCAPES:
+            text_values = text_values.str.replace(raw, escaped, regex=False)
+        encoded.append(text_values.where(~missing, '\\N'))
+    lines = encoded[0].str.cat(encoded[1:], sep='\t')
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def build_load_data_sql(path, table_name):
+    """生成 LOAD DATA 语句。文件名与表名均由程序生成，仍做白名单校验以防注入。"""
+    path = path.replace('\\', '/')
+    if "'" in path or not table_name.replace('_', '').isalnum():
+        raise ValueError('非法的导入文件路径或表名')
+    columns = ', '.join(f'`{col}`' for col in IMPORT_COLUMNS)
+    return text(LOAD_DATA_SQL.format(path=path, table=table_name, columns=columns))
+
+
+def _iter_normalized_columns(reader, cancel_event):
+    date_cache = {}
+    for df_chunk in reader:
+        if cancel_event is not None and cancel_event.is_set():
+            raise ImportCancelled()
+        if len(df_chunk):
+            yield normalize_columns(df_chunk, date_cache)
+
+
+def _load_data_via_fifo(chunks, table_name, on_rows):
+    """经命名管道把数据块流式送入一条 LOAD DATA 语句。
+
+    写管道的生产者线程与执行 LOAD DATA 的当前线程并行；管道缓冲区写满时生产者阻塞，
+    因此内存中最多只有一个已编码的数据块。生产者出错(含取消)时关闭管道并在此重新抛出，
+    由调用方回滚整条 LOAD DATA。
+    """
+    tmpdir = tempfile.mkdtemp(prefix='import_stream_')
+    fifo_path = os.path.join(tmpdir, 'rows.tsv')
+    os.mkfifo(fifo_path, 0o600)
+    producer_error = []
+    aborted = Event()
+
+    def produce():
+        try:
+            with open(fifo_path, 'wb') as pipe:
+                for arrays in chunks:
+                    if aborted.is_set():
+                        break
+                    pipe.write(encode_load_data_rows(arrays))
+                    on_rows(len(arrays[0]))
+        except BaseException as e:
+            producer_error.append(e)
+
+    producer = Thread(target=produce, name='load-data-producer', daemon=True)
+    producer.start()
+    try:
+        try:
+            db.session.execute(build_load_data_sql(fifo_path, table_name))
+        except Exception:
+            # 语句失败时生产者可能阻塞在 open() 或 write() 上：打开读端并持续排空，直到生产者退出
+            aborted.set()
+            fd = os.open(fifo_path, os.O_RDONLY | os.O_NONBLOCK)
+            try:
+                while producer.is_alive():
+                    try:
+                        drained = os.read(fd, 1024 * 1024)
+                    except BlockingIOError:
+                        drained = b''
+                    if not drained:
+                        producer.join(0.05)
+            finally:
+                os.close(fd)
+            raise
+        finally:
+            producer.join()
+        if producer_error:
+            raise producer_error[0]
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def _load_data_via_spool(chunks, table_name, on_rows):
+    """无命名管道的平台(Windows)：每个数据块写入同一个临时文件后执行一次 LOAD DATA。"""
+    tmpdir = tempfile.mkdtemp(prefix='import_stream_')
+    spool_path = os.path.join(tmpdir, 'rows.tsv')
     try:
-        # 转换为字典列表
-        data = [sample.to_dict() for sample in samples]
+        for arrays in chunks:
+            with open(spool_path, 'wb') as spool:
+                spool.write(encode_load_data_rows(arrays))
+            db.session.execute(build_load_data_sql(spool_path, table_name))
+            on_rows(len(arrays[0]))
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def _insert_multirow(chunks, table, on_rows, batch_size):
+    """非 MySQL 方言：按批构造多行 INSERT ... VALUES (...), (...)"""
+    for arrays in chunks:
+        rows = list(map(dict, map(partial(zip, IMPORT_COLUMNS), zip(*arrays))))
+        for start in range(0, len(rows), batch_size):
+            db.session.execute(table.insert().values(rows[start:start + batch_size]))
+        on_rows(len(rows))
+
+
+def import_csv_to_db_streaming(file_path, chunk_size=5000, progress_callback=None, cancel_event=None,
+                               total_hint=0, table=None, insert_batch_size=500, commit_callback=None):
+    """
+    流式批量导入(MySQL 使用 LOAD DATA LOCAL INFILE)
+
+    - 分块读取并按列转换，编码后经命名管道流式送入 LOAD DATA，
+      不生成完整的中间文件，峰值内存与文件大小无关(约一个数据块)
+    - 整个文件在一个事务中导入，失败或取消时全部回滚
+    - 非 MySQL 方言回退为多行 INSERT 批量写入
+    - MySQL 需服务端 local_infile=1，且客户端配置 MYSQL_LOCAL_INFILE=1
 
-        # 创建DataFrame
-        df = pd.DataFrame(data)
+    参数同 import_csv_to_db，另有:
+        table: 目标表(默认 sample_data)
+        insert_batch_size: 回退路径每条多行 INSERT 的行数
+    """
+    table = SampleData.__table__ if table is None else table
+    state = {'count': 0, 'total': 0}
 
-        # 删除id列
-        if 'id' in df.columns:
-            df = df.drop('id', axis=1)
+    def on_rows(n):
+        state['count'] += n
+        _report_progress(progress_callback, state['count'], state['total'])
 
-        # 导出CSV
-        df.to_csv(output_path, index=False, encoding='utf-8-sig')
-        return True, '导出成功'
+    try:
+        reader, total_rows = iter_file_chunks(file_path, chunk_size, progress_callback)
+        state['total'] = total_rows or total_hint
+        chunks = _iter_normalized_columns(reader, cancel_event)
+
+        if db.session.get_bind().dialect.name == 'mysql':
+            if hasattr(os, 'mkfifo'):
+                _load_data_via_fifo(chunks, table.name, on_rows)
+            else:
+                _load_data_via_spool(chunks, table.name, on_rows)
+        else:
+            _insert_multirow(chunks, table, on_rows, insert_batch_size)
 
+        db.session.commit()
+        _report_commit(commit_callback, state['count'])
+        return True, f'成功导入 {state["count"]} 条数据'
+
+    except ImportCancelled:
+        db.session.rollback()
+        return False, '导入已取消，本次导入已全部回滚'
     except Exception as e:
-        return False, f'导出失败: {str(e)}'
+        db.session.rollback()
+        return False, f'流式导入失败(已全部回滚): {str(e)}'
+
+# 导出列顺序: 与 SampleData.to_dict() 去掉 id 后一致，也与导入列一致(导出文件可直接重新导入)
+EXPORT_COLUMNS = IMPORT_COLUMNS
+EXPORT_BATCH_SIZE = 5000
+CSV_BOM = '\ufeff'
+
+
+def resolve_export_columns(requested):
+    """按 EXPORT_COLUMNS 白名单及其顺序解析要导出的列；未选择时导出全部列"""
+    requested = set(requested or ())
+    columns = [col for col in EXPORT_COLUMNS if col in requested]
+    return columns or list(EXPORT_COLUMNS)
+
+
+def select_export_rows(criteria, columns):
+    """导出查询：按 id 顺序选取指定列"""
+    table = SampleData.__table__
+    return select(*(table.c[col] for col in columns)).where(*criteria).order_by(table.c.id)
+
+
+def iter_samples_csv(*criteria, columns=None, batch_size=EXPORT_BATCH_SIZE):
+    """流式生成样本数据 CSV 的字节块(UTF-8 BOM + 表头 + 数据行)
+
+    criteria: 作用于 SampleData 的过滤条件(如 SampleData.status.in_([...]))，为空时导出全部
+    columns: 导出列(resolve_export_columns 的结果)，默认全部列
+    表头在查询前立即产出；数据经服务端游标(stream_results)按 batch_size 分批读取，
+    每批编码后立即产出，内存占用与总行数无关。
+    """
+    columns = columns or EXPORT_COLUMNS
+    stmt = select_export_rows(criteria, columns)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(columns)
+    yield (CSV_BOM + buffer.getvalue()).encode('utf-8')
+
+    result = db.session.execute(stmt.execution_options(stream_results=True, yield_per=batch_size))
+    for rows in result.partitions():
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+
+
+def gzip_chunks(chunks, level=6):
+    """把字节块流式压缩为 gzip 格式；首块(表头)立即同步刷新，保证首字节尽快发出"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    first = True
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if first:
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+            first = False
+        if data:
+            yield data
+    yield compressor.flush()
 
 def get_unique_categories():
     """获取所有不重复的category"""
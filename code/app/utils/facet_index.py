@@ -0,0 +1,348 @@
+"""联动筛选候选项的进程内分面索引
+
+联动筛选的候选项每次要对 sample_data 执行 12 条带权限与其它筛选条件的 SELECT DISTINCT。
+分面索引把这些字段按行编码成 NumPy 整数数组(每个取值一个编码，0 表示空值：NULL/空串/纯空白)：
+- 某字段的已选值 -> 查表得到逐行布尔位图；权限范围 -> category/brand 位图
+- "字段 X 在其它已选条件与权限下的候选项" = 位图按位与 + 对 X 的编码做一次 bincount，
+  同时得到每个候选项的行数
+
+保持最新：
+- 打标/回滚通过 invalidate_scopes 提升 (category, brand) 代数；查询前读取自上次同步以来变化的范围，
+  只重新加载这些范围的行(共享缓存后端下其它 worker 的写入同样可见)；查询在锁外执行，只在编码与替换时持锁
+- 导入/清空数据触发 clear_cache(全量失效)，此时在后台线程重建索引，重建完成前回退为 SQL 查询
+- 默认的进程内缓存后端只能看到本 worker 的失效，其它 worker 的打标/导入不会提升本进程的代数：
+  此时索引最多使用 FACET_INDEX_MAX_AGE 秒(与候选项缓存 TTL 相同)，到期后在后台重建，期间回退为 SQL；
+  CACHE_BACKEND=file 时代数对所有 worker 可见，不按时间重建
+
+取值按列的排序规则折叠后编码(见 app/utils/collation.py)：MySQL *_ci 列上 'Apple'/'apple'/'Apple ' 为同一编码，
+与 SQL 的 GROUP BY/IN 一致，权限与已选值同样按折叠后的值查表；排序规则无法识别时不建索引。
+
+每个进程一份索引，内存约为 行数 × 字段数 × 4 字节；行数超过 FACET_INDEX_MAX_ROWS 时不建索引。
+"""
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from flask import current_app
+from sqlalchemy import and_, func, or_, select
+
+from app.models import SampleData, db
+from app.utils import cache
+from app.utils.cache import NULL_SCOPE
+from app.utils.collation import column_folds, identity
+
+BUILD_BATCH_SIZE = 50000
+DEFAULT_MAX_ROWS = 5000000
+DEFAULT_MAX_AGE = 120
+EMPTY_CODE = 0
+# 权限过滤使用的内部列(与筛选字段分开编码，筛选字段中可能也有 brand)
+SCOPE_CATEGORY = '_category'
+SCOPE_BRAND = '_brand'
+
+
+class _Dictionary:
+    """字段取值 <-> 编码；编码 0 固定表示空值
+
+    fold: 列排序规则的折叠函数，折叠后相同的取值共用一个编码，values 保存首次出现的原始取值
+    """
+
+    def __init__(self, fold=identity):
+        self.fold = fold
+        self.values = [None]
+        self.codes = {}
+
+    def encode(self, column):
+        """把一批原始值编码为 int32 数组(pd.factorize 先在 C 层去重，只对唯一值查字典)"""
+        local_codes, uniques = pd.factorize(pd.Series(column, dtype=object), use_na_sentinel=True)
+        mapping = np.empty(len(uniques) + 1, dtype=np.int32)
+        mapping[-1] = EMPTY_CODE  # factorize 的 -1(NULL) 经 mapping[-1] 映射为空值
+        for i, value in enumerate(uniques):
+            mapping[i] = self.code_for(value, create=True)
+        return mapping[local_codes]
+
+    def code_for(self, value, create=False):
+        if value is None:
+            return EMPTY_CODE
+        value = str(value)
+        if not value.strip():
+            return EMPTY_CODE
+        key = self.fold(value)
+        code = self.codes.get(key)
+        if code is None and create:
+            code = self.codes[key] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def lookup_table(self, values, empty_marker=None):
+        """选中值 -> 按编码索引的布尔查找表(不存在的值忽略)"""
+        table = np.zeros(len(self.values), dtype=bool)
+        for value in values:
+            if empty_marker is not None and value == empty_marker:
+                table[EMPTY_CODE] = True
+                continue
+            code = self.code_for(value)
+            if code:
+                table[code] = True
+        return table
+
+
+class FacetIndex:
+    """样本数据若干字段的分面索引(每个 worker 进程一份)"""
+
+    def __init__(self, fields, empty_marker=None):
+        """
+        fields: {筛选键: SampleData 列}，如 CASCADE_FIELD_MAP
+        empty_marker: 筛选值中表示"空值"的标记(EMPTY_FILTER_VALUE)
+        """
+        self.fields = dict(fields)
+        self.empty_marker = empty_marker
+        self._columns = {**self.fields, SCOPE_CATEGORY: SampleData.category, SCOPE_BRAND: SampleData.brand}
+        self._lock = threading.RLock()
+        self._building = False
+        self._reset()
+
+    def _reset(self):
+        self.ready = False
+        self.generation = None
+        self.built_at = None
+        self._ids = np.empty(0, dtype=np.int64)
+        self._alive = np.empty(0, dtype=bool)
+        self._codes = {key: np.empty(0, dtype=np.int32) for key in self._columns}
+        self._dicts = {key: _Dictionary() for key in self._columns}
+        self._totals = {}
+
+    # ---------- 构建与同步 ----------
+
+    def _select(self, *criteria):
+        return select(SampleData.id, *self._columns.values()).where(*criteria).order_by(SampleData.id)
+
+    def _encode_rows(self, rows, dicts=None):
+        """一批查询结果 -> (ids, {key: codes})"""
+        dicts = self._dicts if dicts is None else dicts
+        if not rows:
+            return np.empty(0, dtype=np.int64), {key: np.empty(0, dtype=np.int32) for key in self._columns}
+        columns = list(zip(*rows))
+        ids = np.asarray(columns[0], dtype=np.int64)
+        return ids, {key: dicts[key].encode(columns[pos + 1]) for pos, key in enumerate(self._columns)}
+
+    def build(self, max_rows=DEFAULT_MAX_ROWS):
+        """全量构建(需要应用上下文)。行数超过 max_rows 或列排序规则无法识别时放弃并返回 False"""
+        started = time.monotonic()
+        generation = cache.cache_store.current_generation()
+        if generation is None:
+            return False
+        total = db.session.execute(select(func.count(SampleData.id))).scalar()
+        if total > max_rows:
+            with self._lock:
+                self._reset()
+            return False
+
+        folds = column_folds(db.session, SampleData.__tablename__,
+                             {column.name for column in self._columns.values()})
+        if folds is None:
+            with self._lock:
+                self._reset()
+            return False
+
+        dicts = {key: _Dictionary(folds[column.name]) for key, column in self._columns.items()}
+        id_parts, code_parts = [], {key: [] for key in self._columns}
+        result = db.session.execute(self._select().execution_options(stream_results=True,
+                                                                     yield_per=BUILD_BATCH_SIZE))
+        for rows in result.partitions():
+            ids, codes = self._encode_rows(rows, dicts)
+            id_parts.append(ids)
+            for key in self._columns:
+                code_parts[key].append(codes[key])
+
+        with self._lock:
+            self._dicts = dicts
+            self._ids = np.concatenate(id_parts) if id_parts else np.empty(0, dtype=np.int64)
+            self._codes = {key: np.concatenate(parts) if parts else np.empty(0, dtype=np.int32)
+                           for key, parts in code_parts.items()}
+            self._alive = np.ones(len(self._ids), dtype=bool)
+            self._totals = {}
+            self.generation = generation
+            self.built_at = started
+            self.ready = True
+        return True
+
+    def _start_background_build(self):
+        """在后台线程中重建，期间 ensure_fresh 返回 False(调用方回退为 SQL 查询)"""
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+            self.ready = False
+        app = current_app._get_current_object()
+        max_rows = app.config.get('FACET_INDEX_MAX_ROWS', DEFAULT_MAX_ROWS)
+
+        def run():
+            started = time.time()
+            with app.app_context():
+                try:
+                    if self.build(max_rows):
+                        print(f'分面索引构建完成: {len(self._ids)} 行，耗时 {time.time() - started:.1f}s')
+                except Exception as e:
+                    print(f'分面索引构建失败: {e}')
+                finally:
+                    db.session.remove()
+                    with self._lock:
+                        self._building = False
+
+        threading.Thread(target=run, name='facet-index-build', daemon=True).start()
+
+    @staticmethod
+    def _scope_condition(category, brand):
+        def equals(column, value):
+            return column.is_(None) if value == NULL_SCOPE else column == value
+
+        return and_(equals(SampleData.category, category), equals(SampleData.brand, brand))
+
+    def _load_scopes(self, pairs):
+        """查询指定 (category, brand) 范围当前的行(不持锁)，每 100 个范围一批"""
+        conditions = [self._scope_condition(category, brand) for category, brand in pairs]
+        return [db.session.execute(self._select(or_(*conditions[start:start + 100]))).all()
+                for start in range(0, len(conditions), 100)]
+
+    def _apply_scopes(self, pairs, batches):
+        """用重新查询的行更新指定范围：更新已有行、追加新行、标记已删除行；调用方持锁"""
+        self._totals = {}
+        fresh_ids = []
+        for rows in batches:
+            ids, codes = self._encode_rows(rows)
+            fresh_ids.append(ids)
+            if len(self._ids):
+                positions = np.minimum(np.searchsorted(self._ids, ids), len(self._ids) - 1)
+                known = self._ids[positions] == ids
+            else:
+                positions, known = np.zeros(len(ids), dtype=np.int64), np.zeros(len(ids), dtype=bool)
+            for key in self._columns:
+                self._codes[key][positions[known]] = codes[key][known]
+            self._alive[positions[known]] = True
+            if not known.all():
+                new_ids = ids[~known]
+                if len(self._ids) and new_ids.min() <= self._ids[-1]:
+                    return False  # 新行 id 不在末尾，保持 id 有序需要重建
+                self._ids = np.concatenate([self._ids, new_ids])
+                self._alive = np.concatenate([self._alive, np.ones(len(new_ids), dtype=bool)])
+                for key in self._columns:
+                    self._codes[key] = np.concatenate([self._codes[key], codes[key][~known]])
+
+        # 范围内已不存在的行
+        in_scope = np.zeros(len(self._ids), dtype=bool)
+        for category, brand in pairs:
+            cat_code = self._code_for_scope(SCOPE_CATEGORY, category)
+            brand_code = self._code_for_scope(SCOPE_BRAND, brand)
+            if cat_code is not None and brand_code is not None:
+                in_scope |= (self._codes[SCOPE_CATEGORY] == cat_code) & (self._codes[SCOPE_BRAND] == brand_code)
+        fresh = np.concatenate(fresh_ids) if fresh_ids else np.empty(0, dtype=np.int64)
+        self._alive[in_scope & ~np.isin(self._ids, fresh)] = False
+        return True
+
+    def _code_for_scope(self, key, value):
+        return self._dicts[key].code_for(None if value == NULL_SCOPE else value)
+
+    def _expired(self):
+        """缓存后端的失效不跨 worker 时，索引超过 FACET_INDEX_MAX_AGE 秒视为过期(0 表示不限)"""
+        if cache.invalidation_is_shared():
+            return False
+        max_age = current_app.config.get('FACET_INDEX_MAX_AGE', DEFAULT_MAX_AGE)
+        return bool(max_age) and time.monotonic() - self.built_at > max_age
+
+    def ensure_fresh(self):
+        """同步到最新的缓存代数；索引可用返回 True，需要(或正在)重建时返回 False"""
+        if not current_app.config.get('FACET_INDEX_ENABLED', True):
+            return False
+        with self._lock:
+            if self._building:
+                return False
+            if not self.ready:
+                self._start_background_build()
+                return False
+            if self._expired():
+                self._start_background_build()  # 可能错过了其它 worker 的写入
+                return False
+            since = self.generation
+            generation, pairs = cache.cache_store.changed_scopes(since)
+            if generation is None:
+                return False
+            if pairs is None:
+                self._start_background_build()  # 全量失效(导入/清空)
+                return False
+            if not pairs:
+                self.generation = generation
+                return True
+
+        # 重新查询期间其它请求继续使用旧索引，不在锁内等待数据库
+        batches = self._load_scopes(pairs)
+        with self._lock:
+            # 期间已被其它请求同步或开始重建时丢弃本次结果；之后的变化由下一次同步按代数补上
+            if not (self.ready and self.generation == since):
+                return self.ready
+            if not self._apply_scopes(pairs, batches):
+                self._start_background_build()
+                return False
+            self.generation = generation
+            return True
+
+    # ---------- 查询 ----------
+
+    def _mask(self, key, values, empty_marker=None):
+        """逐行布尔位图：该字段取值属于 values"""
+        return self._dicts[key].lookup_table(values, empty_marker)[self._codes[key]]
+
+    def _permission_mask(self, categories, brands):
+        mask = self._alive.copy()
+        if categories is not None:
+            mask &= self._mask(SCOPE_CATEGORY, categories)
+        if brands is not None:
+            mask &= self._mask(SCOPE_BRAND, brands)
+        return mask
+
+    def facet_counts(self, selected, categories=None, brands=None):
+        """各筛选字段在权限 + 除自身外其它已选条件下的 {取值: 行数}(空值计入 empty_marker)
+
+        selected: {筛选键: 已选值列表}；categories/brands: 用户权限(None 表示全部)
+        """
+        with self._lock:
+            base = self._permission_mask(categories, brands)
+            masks = {key: self._mask(key, values, self.empty_marker) for key, values in selected.items()
+                     if key in self.fields and values}
+            # 未被选择的字段共享同一个行集合(权限 + 全部已选条件)，只需计算一次
+            shared = self._rows(np.logical_and.reduce([base, *masks.values()]))
+            result = {}
+            for key in self.fields:
+                if key in masks:
+                    rows = self._rows(np.logical_and.reduce([base, *(m for k, m in masks.items() if k != key)]))
+                else:
+                    rows = shared
+                dictionary = self._dicts[key]
+                if rows is None:
+                    counts = self._total_counts(key)
+                else:
+                    counts = np.bincount(self._codes[key][rows], minlength=len(dictionary.values))
+                values = {dictionary.values[code]: int(counts[code])
+                          for code in np.flatnonzero(counts) if code != EMPTY_CODE}
+                if self.empty_marker is not None and counts[EMPTY_CODE]:
+                    values[self.empty_marker] = int(counts[EMPTY_CODE])
+                result[key] = values
+            return result
+
+    def _total_counts(self, key):
+        """整列计数(无任何过滤时)，在索引数据变化前复用"""
+        counts = self._totals.get(key)
+        if counts is None:
+            counts = self._totals[key] = np.bincount(self._codes[key], minlength=len(self._dicts[key].values))
+        return counts
+
+    @staticmethod
+    def _rows(mask):
+        """位图 -> 行号数组；全部为真时返回 None(直接使用整列，省去一次拷贝)"""
+        return None if mask.all() else np.flatnonzero(mask)
+
+    def stats(self):
+        with self._lock:
+            return {'ready': self.ready, 'building': self._building, 'rows': int(self._alive.sum()),
+                    'generation': self.generation,
+                    'bytes': int(self._ids.nbytes + self._alive.nbytes + sum(c.nbytes for c in self._codes.values()))}
@@ -0,0 +1,112 @@
+"""样本筛选条件的解析与编译(列表、计数、导出、批量打标共用)
+
+原先列表页逐项解析 request.args 并逐个 filter() 拼出查询，批量打标(saved_filters)与整页保存
+(重定向参数)又各自手写一遍需要透传的参数名，每次请求都从头构建整棵 SQLAlchemy 表达式树。
+
+FilterSpec 由请求参数解析一次：
+- args: 规范化后的参数({参数名: 值列表}，去掉空值/默认值、去重排序)，digest 为其哈希；
+  参数顺序、重复值、大小写不同的相同搜索词等写法得到同一个 digest，缓存 key 与编译结果共享
+- criteria(): 编译后的 WHERE 条件元组(不含权限与状态)，按 (digest, 数据库) 在进程内 LRU 中复用，
+  相同筛选不再重新构建表达式；条件中的取值均为绑定参数，SQLAlchemy 的语句编译缓存随之命中
+- url_args(): 透传到列表页链接/隐藏表单的参数，批量打标与整页保存的重定向不再手写参数名
+"""
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+from werkzeug.datastructures import MultiDict
+
+from app.models import db
+from app.utils.cache import make_key_digest
+
+DEFAULT_MAX_COMPILED = 256
+
+
+class FilterSpec:
+    """一组已解析、规范化的筛选条件(只读)"""
+
+    def __init__(self, compiler, args, parsed):
+        self._compiler = compiler
+        self.args = args
+        self.parsed = parsed
+        self.digest = make_key_digest((args,), {})
+
+    def __getitem__(self, key):
+        return self.parsed[key]
+
+    def __eq__(self, other):
+        return isinstance(other, FilterSpec) and other.digest == self.digest
+
+    def __hash__(self):
+        return hash(self.digest)
+
+    def criteria(self):
+        """不含状态的筛选条件(WHERE 子句元组)"""
+        return self._compiler.compile(self, 'filters')
+
+    def status_criteria(self):
+        """状态筛选条件"""
+        return self._compiler.compile(self, 'status')
+
+    def apply(self, query, status=True):
+        """把筛选条件(status=False 时不含状态)应用到查询"""
+        criteria = self.criteria() + (self.status_criteria() if status else ())
+        return query.filter(*criteria) if criteria else query
+
+    def without(self, *names):
+        """去掉指定参数后的筛选条件(如计数不含 status)"""
+        return self._compiler.from_args(MultiDict([(key, value) for key, values in self.args.items()
+                                                   if key not in names for value in values]))
+
+    def url_args(self, **extra):
+        """列表页 url_for 参数：规范化后的筛选参数 + extra 中的非空值(页码、排序、令牌)"""
+        params = {key: list(values) for key, values in self.args.items()}
+        params.update({key: value for key, value in extra.items() if value not in (None, '', [])})
+        return params
+
+
+class FilterSpecCompiler:
+    """按固定的参数、解析与构建函数生成 FilterSpec，并缓存编译后的条件"""
+
+    def __init__(self, parse, canonical, build, build_status, max_entries=DEFAULT_MAX_COMPILED):
+        """
+        parse: request.args -> 解析结果 dict
+        canonical: 解析结果 -> 规范化参数 {参数名: 值列表}
+        build / build_status: 解析结果 -> WHERE 条件列表(筛选 / 状态)
+        """
+        self._parse = parse
+        self._canonical = canonical
+        self._builders = {'filters': build, 'status': build_status}
+        self.max_entries = max_entries
+        self._compiled = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0}
+
+    def from_args(self, args):
+        parsed = self._parse(args)
+        return FilterSpec(self, self._canonical(parsed), parsed)
+
+    def compile(self, spec, part):
+        # 全文索引是否可用取决于数据库与配置，编译结果按数据库区分
+        key = (spec.digest, part, str(db.engine.url), current_app.config.get('SEARCH_FULLTEXT_ENABLED', True))
+        with self._lock:
+            criteria = self._compiled.get(key)
+            if criteria is not None:
+                self._compiled.move_to_end(key)
+                self._stats['hits'] += 1
+                return criteria
+            self._stats['misses'] += 1
+        criteria = tuple(self._builders[part](spec.parsed))
+        with self._lock:
+            self._compiled[key] = criteria
+            while len(self._compiled) > self.max_entries:
+                self._compiled.popitem(last=False)
+        return criteria
+
+    def clear(self):
+        with self._lock:
+            self._compiled.clear()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._compiled))
@@ -0,0 +1,83 @@
+"""关键词/排除词搜索的全文索引后端(MySQL FULLTEXT + ngram 分词)
+
+原搜索对每个 词 × 字段 执行 lower(coalesce(字段,'')) LIKE '%词%'，每次都要全表扫描 TEXT 列。
+在 product_description / sku / category 上建立 ngram 分词的 FULLTEXT 索引后(迁移 e5f6a7b8c9d0)：
+- 搜索词按空白拆成片段，每个长度 >= ngram_token_size 的片段作为短语 +"片段" 在索引中取候选行
+  (片段是文档中某个连续非空白串的子串，其 ngram 必然连续出现在索引中，不会漏掉行)
+- 候选行再用原 LIKE 条件复核，结果与原来的子串、大小写不敏感语义完全一致；中文同样适用
+- 没有可用片段的搜索词(过短或含双引号)、非 MySQL 方言、未建索引的字段仍直接使用 LIKE
+
+索引须关闭停用词建立(ngram 分词会丢弃包含停用词的 token)，迁移与影子表导入重建索引时都会设置。
+索引由 InnoDB 在导入/编辑时自动维护。SEARCH_FULLTEXT_ENABLED=0 可关闭。
+"""
+import threading
+
+from flask import current_app
+from sqlalchemy import inspect, text
+
+# 字段 -> 全文索引名(迁移与影子表导入使用相同的名称)
+FULLTEXT_INDEXES = {
+    'product_description': 'ft_sample_data_product_description',
+    'sku': 'ft_sample_data_sku',
+    'category': 'ft_sample_data_category',
+}
+
+
+def against_phrases(term, token_size):
+    """搜索词 -> BOOLEAN MODE 的 AGAINST 参数；没有可用于索引的片段时返回 None"""
+    if '"' in term:
+        return None
+    pieces = [piece for piece in term.split() if len(piece) >= token_size]
+    if not pieces:
+        return None
+    return ' '.join(f'+"{piece}"' for piece in dict.fromkeys(pieces))
+
+
+class FulltextSearch:
+    """探测 ngram 全文索引并生成 MATCH ... AGAINST 候选条件(每个进程探测一次)"""
+
+    def __init__(self, table_name):
+        self.table_name = table_name
+        self._lock = threading.Lock()
+        self._probed = {}
+
+    def _probe(self, engine):
+        """返回 (有 ngram 全文索引的字段集合, ngram_token_size)"""
+        key = str(engine.url)
+        with self._lock:
+            if key not in self._probed:
+                self._probed[key] = self._inspect(engine)
+            return self._probed[key]
+
+    def _inspect(self, engine):
+        if engine.dialect.name != 'mysql':
+            return frozenset(), None
+        try:
+            with engine.connect() as conn:
+                indexes = inspect(conn).get_indexes(self.table_name)
+                token_size = int(conn.execute(text('SELECT @@ngram_token_size')).scalar())
+        except Exception as e:
+            print(f'全文索引探测失败，搜索使用 LIKE: {e}')
+            return frozenset(), None
+        fields = set()
+        for index in indexes:
+            options = index.get('dialect_options', {})
+            if (index['name'] == FULLTEXT_INDEXES.get(index['column_names'][0])
+                    and options.get('mysql_prefix') == 'FULLTEXT'
+                    and str(options.get('mysql_with_parser', '')).lower() == 'ngram'):
+                fields.add(index['column_names'][0])
+        return frozenset(fields), token_size
+
+    def match_condition(self, field, term, engine):
+        """field 上可用全文索引查找 term 时返回 MATCH ... AGAINST 条件，否则返回 None"""
+        if not current_app.config.get('SEARCH_FULLTEXT_ENABLED', True):
+            return None
+        fields, token_size = self._probe(engine)
+        if field.key not in fields:
+            return None
+        phrases = against_phrases(term, token_size)
+        return None if phrases is None else field.match(phrases)
+
+    def reset(self):
+        with self._lock:
+            self._probed.clear()
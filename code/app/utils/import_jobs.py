@@ -0,0 +1,146 @@
+"""后台导入任务
+
+上传请求只负责保存文件并提交任务，导入在后台线程中执行：
+- 进度(已导入条数、速度、ETA)通过 progress_tracker 上报，前端轮询 /admin/upload/progress/<task_id>
+- 任务在线程池中排队执行(默认单线程，避免多个大文件同时导入争抢数据库)
+- 支持取消：排队中的任务直接取消；执行中的任务在下一个数据块前停止
+
+注意：任务状态保存在进程内存中，多 worker 部署时进度查询需落在同一 worker(或使用单 worker 处理 /admin)。
+"""
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock
+
+from app.models import db
+from app.utils.audit import log_action
+from app.utils.cache import clear_cache
+from app.utils.checkpoint_import import import_csv_with_checkpoint
+from app.utils.csv_handler import (
+    estimate_csv_rows, import_csv_to_db, import_csv_to_db_parallel, import_csv_to_db_streaming,
+)
+from app.utils.merge_import import merge_import_csv_to_db
+from app.utils.progress_tracker import progress_tracker
+from app.utils.staging_import import import_csv_via_staging
+
+# 导入模式: 上传表单 mode 值 -> 导入函数(签名同 import_csv_to_db)
+IMPORT_MODES = {
+    'standard': import_csv_with_checkpoint,
+    'parallel': import_csv_to_db_parallel,
+    'bulk_load': import_csv_to_db_streaming,
+    'merge': merge_import_csv_to_db,
+    'replace': import_csv_via_staging,
+}
+
+
+class ImportJobRunner:
+    """导入任务执行器(进程内单例)"""
+
+    def __init__(self):
+        self._executor = None
+        self._cancel_events = {}  # {task_id: Event}
+        self._lock = Lock()
+
+    def _get_executor(self, app):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=app.config.get('IMPORT_JOB_WORKERS', 1),
+                    thread_name_prefix='import-job',
+                )
+            return self._executor
+
+    def reserve(self, filename, actor):
+        """预先分配 task_id 并登记为排队中(续传时先用它占用检查点，再 submit)"""
+        task_id = uuid.uuid4().hex
+        with self._lock:
+            self._cancel_events[task_id] = Event()
+        progress_tracker.create_task(task_id, status='queued', message='排队等待导入...',
+                                     meta={'filename': filename, 'username': actor.get('username')})
+        return task_id
+
+    def release(self, task_id):
+        """撤销预留后不再提交的任务"""
+        with self._lock:
+            self._cancel_events.pop(task_id, None)
+        progress_tracker.remove_task(task_id)
+
+    def submit(self, app, file_path, filename, actor, import_func=import_csv_to_db, task_id=None, **import_kwargs):
+        """提交导入任务，立即返回 task_id。
+
+        app: Flask 应用对象(后台线程需要在应用上下文中访问数据库)
+        actor: audit.capture_actor() 的结果，用于后台写审计日志
+        import_func: 导入函数，签名同 import_csv_to_db
+        task_id: reserve() 预留的 task_id；为空时新分配
+        """
+        task_id = task_id or self.reserve(filename, actor)
+        with self._lock:
+            cancel_event = self._cancel_events[task_id]
+        self._get_executor(app).submit(self._run, app, task_id, file_path, filename, actor,
+                                       cancel_event, import_func, import_kwargs)
+        return task_id
+
+    def cancel(self, task_id):
+        """请求取消任务，任务不存在或已结束时返回 False"""
+        with self._lock:
+            cancel_event = self._cancel_events.get(task_id)
+        if cancel_event is None:
+            return False
+        cancel_event.set()
+        task = progress_tracker.get_progress(task_id)
+        if task and task['status'] == 'queued':
+            progress_tracker.cancel_task(task_id)
+        return True
+
+    def list_jobs(self, limit=20):
+        """最近的导入任务(含已结束的)，按提交时间倒序"""
+        progress_tracker.cleanup_old_tasks()
+        return progress_tracker.list_tasks(limit)
+
+    def _run(self, app, task_id, file_path, filename, actor, cancel_event, import_func, import_kwargs):
+        imported = {'count': 0}
+        committed = {'count': 0}
+
+        def on_progress(current, total, message):
+            imported['count'] = current
+            progress_tracker.update_progress(task_id, current, total, message)
+
+        def on_commit(rows):
+            committed['count'] = rows
+
+        with app.app_context():
+            try:
+                if cancel_event.is_set():
+                    progress_tracker.cancel_task(task_id)
+                    return
+
+                progress_tracker.start_task(task_id, '正在读取文件...')
+                total_hint = estimate_csv_rows(file_path) if file_path.endswith('.csv') else 0
+                success, message = import_func(file_path, progress_callback=on_progress,
+                                               cancel_event=cancel_event, total_hint=total_hint,
+                                               commit_callback=on_commit, **import_kwargs)
+
+                # 按实际提交的行数判断：分块提交模式失败/取消前的数据块已入库，需要刷新缓存并留痕；
+                # 整体回滚(流式、影子表切换前失败)时线上数据未变，不清缓存也不记上传
+                if committed['count'] > 0:
+                    clear_cache()
+                    log_action('upload', 'data', detail=f'上传导入文件 {filename}: {message}', actor=actor)
+                    db.session.commit()
+
+                if success:
+                    progress_tracker.update_progress(task_id, imported['count'], imported['count'])
+                    progress_tracker.complete_task(task_id, message)
+                elif cancel_event.is_set():
+                    progress_tracker.cancel_task(task_id, message)
+                else:
+                    progress_tracker.fail_task(task_id, message)
+            except Exception as e:
+                db.session.rollback()
+                progress_tracker.fail_task(task_id, f'导入失败: {str(e)}')
+            finally:
+                db.session.remove()
+                with self._lock:
+                    self._cancel_events.pop(task_id, None)
+
+
+# 全局单例
+import_job_runner = ImportJobRunner()
@@ -0,0 +1,175 @@
+"""样本列表的键集(seek)分页
+
+LIMIT/OFFSET 分页翻到第 N 页时数据库要先扫描并丢弃前 (N-1) × 每页条数 行，且其它人保存打标后
+OFFSET 对应的行会整体移动(跳过或重复)。键集分页按 (排序列, id) 定位：
+- 下一页 = 排序键大于本页最后一行的前 per_page 行；上一页 = 按相反顺序取小于本页第一行的行再反转
+- 配合 (category, 排序列, id) 复合索引，任意深度的翻页代价与第一页相同
+
+翻页令牌(cursor)是对 {排序, 方向, 排序值, id, 页码} 的 URL 安全 base64 编码；无法解析或与当前
+排序不一致的令牌按第一页处理。页码只用于显示，不参与定位。
+
+NULL 排序约定与 MySQL/SQLite 相同：升序时 NULL 在最前，降序时在最后。
+"""
+import base64
+import binascii
+import json
+import math
+from datetime import date
+
+from sqlalchemy import Date, and_, or_
+
+# 令牌方向: after 本行之后 / before 本行之前 / at 从本行开始(含本行，保存后回到当前页) / last 最后一页
+DIRECTIONS = ('after', 'before', 'at', 'last')
+
+
+def encode_cursor(sort, direction, value, row_id, page):
+    if isinstance(value, date):
+        value = value.isoformat()
+    payload = json.dumps([sort, direction, value, row_id, page], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, sort):
+    """解析令牌；无效或排序不一致时返回 None"""
+    if not token:
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode('utf-8'))
+        token_sort, direction, value, row_id, page = payload
+    except (ValueError, TypeError, binascii.Error, UnicodeDecodeError):
+        return None
+    if token_sort != sort or direction not in DIRECTIONS or not isinstance(page, int):
+        return None
+    if direction != 'last' and not isinstance(row_id, int):
+        return None
+    return direction, value, row_id, max(page, 1)
+
+
+class KeysetPagination:
+    """与 Flask-SQLAlchemy Pagination 相近的属性，供模板使用"""
+
+    def __init__(self, items, page, per_page, total, has_prev, has_next, sort, sort_key):
+        self.items = items
+        self.per_page = per_page
+        self.total = total
+        self.page = max(page, 1)
+        # total 可能是估算值：页数至少覆盖已确认存在的页
+        known_pages = self.page + 1 if has_next else (self.page if items else 0)
+        self.pages = max(math.ceil(total / per_page) if total else 0, known_pages)
+        self.has_prev = has_prev
+        self.has_next = has_next
+        self.sort = sort
+        self._sort_key = sort_key
+
+    def _cursor(self, direction, row, page):
+        return encode_cursor(self.sort, direction, self._sort_key(row), row.id, page)
+
+    @property
+    def next_cursor(self):
+        return self._cursor('after', self.items[-1], self.page + 1) if self.has_next and self.items else ''
+
+    @property
+    def prev_cursor(self):
+        return self._cursor('before', self.items[0], self.page - 1) if self.has_prev and self.items else ''
+
+    @property
+    def cursor(self):
+        """当前页的令牌(从本页第一行开始)：保存后按此回到当前页，已移出筛选的行由后续行补上"""
+        return self._cursor('at', self.items[0], self.page) if self.items else ''
+
+    @property
+    def last_cursor(self):
+        return encode_cursor(self.sort, 'last', None, None, self.pages) if self.has_next else ''
+
+
+class KeysetPaginator:
+    """按 (排序列, id) 对查询做键集分页"""
+
+    def __init__(self, id_column, sort_columns):
+        """
+        id_column: 主键列(作为排序的最后一列保证顺序唯一)
+        sort_columns: {排序参数: 列}；参数前加 '-' 表示降序，如 '-latest_review_date'
+        """
+        self.id_column = id_column
+        self.sort_columns = dict(sort_columns)
+
+    def resolve_sort(self, sort):
+        """排序参数 -> (规范化参数, 列, 是否降序)；未知参数使用 id 升序"""
+        sort = sort or ''
+        descending = sort.startswith('-')
+        column = self.sort_columns.get(sort.lstrip('-'))
+        if column is None:
+            return 'id', self.id_column, False
+        return sort, column, descending
+
+    def _order(self, column, descending):
+        columns = [column] if column is self.id_column else [column, self.id_column]
+        return [c.desc() if descending else c.asc() for c in columns]
+
+    def _seek(self, column, descending, value, row_id, inclusive=False):
+        """排在 (value, row_id) 之后的行(按 column, id 的 descending 顺序)"""
+        id_column = self.id_column
+        if descending:
+            id_after = id_column <= row_id if inclusive else id_column < row_id
+        else:
+            id_after = id_column >= row_id if inclusive else id_column > row_id
+        if column is id_column:
+            return id_after
+        if value is None:
+            same = and_(column.is_(None), id_after)
+            # 升序时 NULL 在最前：其后是全部非 NULL 行；降序时 NULL 在最后
+            return same if descending else or_(same, column.isnot(None))
+        beyond = column < value if descending else column > value
+        conditions = [beyond, and_(column == value, id_after)]
+        if not descending:
+            return or_(*conditions)
+        return or_(*conditions, column.is_(None))
+
+    def paginate(self, query, sort, cursor, per_page, total, page=1):
+        """
+        query: 已应用筛选的查询；cursor: 翻页令牌(无令牌时按 page 使用 OFFSET，仅用于跳页)
+        total: 筛选结果总数(由调用方提供，避免再执行一次 COUNT)
+        """
+        sort, column, descending = self.resolve_sort(sort)
+
+        def sort_key(row):
+            return getattr(row, column.key)
+
+        def build(items, page_number, has_prev, has_next):
+            return KeysetPagination(items, page_number, per_page, total, has_prev, has_next, sort, sort_key)
+
+        decoded = decode_cursor(cursor, sort)
+        if decoded is not None and decoded[1] is not None and isinstance(column.type, Date):
+            try:
+                decoded = (decoded[0], date.fromisoformat(decoded[1]), *decoded[2:])
+            except (TypeError, ValueError):
+                decoded = None
+        if decoded is None:
+            page = max(page or 1, 1)
+            rows = query.order_by(*self._order(column, descending)) \
+                .offset((page - 1) * per_page).limit(per_page + 1).all()
+            return build(rows[:per_page], page, page > 1, len(rows) > per_page)
+
+        direction, value, row_id, page = decoded
+        if direction == 'last':
+            rows = query.order_by(*self._order(column, not descending)).limit(per_page).all()
+            rows.reverse()
+            pages = math.ceil(total / per_page) if total else 1
+            return build(rows, pages, total > per_page, False)
+        if direction == 'before':
+            rows = query.filter(self._seek(column, not descending, value, row_id)) \
+                .order_by(*self._order(column, not descending)).limit(per_page + 1).all()
+            if len(rows) < per_page:
+                # 前面的行已不足一页(被打标移出筛选)：回到第一页
+                return self.paginate(query, sort, None, per_page, total)
+            has_prev = len(rows) > per_page
+            rows = rows[:per_page]
+            rows.reverse()
+            return build(rows, page if has_prev else 1, has_prev, True)
+
+        rows = query.filter(self._seek(column, descending, value, row_id, inclusive=direction == 'at')) \
+            .order_by(*self._order(column, descending)).limit(per_page + 1).all()
+        if not rows and total:
+            # 本页及之后的行都已移出筛选(如最后一页全部打标完成)：显示最后一页
+            return self.paginate(query, sort, encode_cursor(sort, 'last', None, None, 1), per_page, total)
+        return build(rows[:per_page], page, page > 1 or direction == 'after', len(rows) > per_page)
@@ -0,0 +1,285 @@
+"""打标候选标签的进程内属性组合图
+
+compute_label_options 原本每次请求都要对 sample_data 按权限、品牌与其它属性执行 5 条 SELECT DISTINCT。
+而已出现的标签组合只在打标写入/导入时才变化，且不同组合的数量远小于行数。
+
+LabelTaxonomy 按 (category, brand) 保存该范围内出现过的 attr1→attr2→…→attr5 路径(去重后的 5 元组)：
+- 候选标签 = 权限与已选品牌范围内的路径中，除自身外其它已选属性都匹配的路径在该属性上的非空取值
+- 一次遍历即可得出 5 个字段的候选项，不访问数据库
+
+保持最新(与分面索引相同的机制)：
+- 打标/回滚通过 invalidate_scopes 提升 (category, brand) 代数；查询前读取自上次同步以来变化的范围，
+  只对这些范围重新执行一次 GROUP BY 并整体替换其路径(查询在锁外执行，只在替换时持锁)
+- 导入/清空数据触发 clear_cache(全量失效)，此时在后台线程重建，重建完成前回退为 SQL 查询
+- 默认的进程内缓存后端看不到其它 worker 的失效：此时组合图最多使用 LABEL_TAXONOMY_MAX_AGE 秒，
+  到期后在后台重建(与分面索引相同)；CACHE_BACKEND=file 时不按时间重建
+
+取值按列的排序规则折叠后保存与比较(与分面索引相同，见 app/utils/collation.py)：范围键、路径、权限与已选值
+都使用折叠后的值，候选项输出每个取值首次出现的原始写法；排序规则无法识别时不建图。
+
+不同组合数超过 LABEL_TAXONOMY_MAX_PATHS 时不建图(属性为自由文本的数据集)。
+"""
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import and_, or_, select
+
+from app.models import SampleData, db
+from app.utils import cache
+from app.utils.cache import NULL_SCOPE
+from app.utils.collation import column_folds, identity
+
+ATTRIBUTE_KEYS = ('attr1', 'attr2', 'attr3', 'attr4', 'attr5')
+ATTRIBUTE_COLUMNS = (SampleData.prod_attributes1, SampleData.prod_attributes2, SampleData.prod_attributes3,
+                     SampleData.prod_attributes4, SampleData.prod_attributes5)
+BUILD_BATCH_SIZE = 50000
+DEFAULT_MAX_PATHS = 1000000
+DEFAULT_MAX_AGE = 120
+MAX_OPTIONS = 1000
+FOLD_COLUMNS = (SampleData.category, SampleData.brand, *ATTRIBUTE_COLUMNS)
+
+
+def _scope_key(value, fold):
+    return NULL_SCOPE if value is None else fold(value)
+
+
+def _fold(value, fold):
+    return None if value is None else fold(value)
+
+
+def _is_empty(value):
+    return value is None or not value.strip()
+
+
+class _TooManyPaths(Exception):
+    pass
+
+
+class LabelTaxonomy:
+    """(category, brand) -> 该范围内出现过的 attr1-5 组合(每个 worker 进程一份)"""
+
+    def __init__(self, empty_marker=None):
+        """empty_marker: 已选值中表示"空值"的标记(EMPTY_FILTER_VALUE)"""
+        self.empty_marker = empty_marker
+        self._lock = threading.RLock()
+        self._building = False
+        self._reset()
+
+    def _reset(self):
+        self.ready = False
+        self.generation = None
+        self.built_at = None
+        self._paths = {}
+        # category、brand、attr1-5 的折叠函数；_labels[i]: attr(i+1) 折叠值 -> 首次出现的原始取值
+        self._folds = (identity,) * len(FOLD_COLUMNS)
+        self._labels = tuple({} for _ in ATTRIBUTE_KEYS)
+
+    # ---------- 构建与同步 ----------
+
+    @staticmethod
+    def _select(*criteria):
+        return (select(SampleData.category, SampleData.brand, *ATTRIBUTE_COLUMNS)
+                .where(*criteria).group_by(SampleData.category, SampleData.brand, *ATTRIBUTE_COLUMNS))
+
+    @staticmethod
+    def _collect(rows, paths, folds, labels, max_paths=None):
+        """GROUP BY 结果 -> {(category, brand): [attr 5 元组]}(均为折叠值)，原始写法记入 labels"""
+        category_fold, brand_fold, *attr_folds = folds
+        total = sum(len(scope_paths) for scope_paths in paths.values())
+        for category, brand, *attrs in rows:
+            path = tuple(None if value is None else fold(value) for fold, value in zip(attr_folds, attrs))
+            for pos, (key, value) in enumerate(zip(path, attrs)):
+                if value is not None:
+                    labels[pos].setdefault(key, value)
+            paths.setdefault((_scope_key(category, category_fold), _scope_key(brand, brand_fold)), []).append(path)
+            total += 1
+            if max_paths is not None and total > max_paths:
+                raise _TooManyPaths()
+        return paths
+
+    def build(self, max_paths=DEFAULT_MAX_PATHS):
+        """全量构建(需要应用上下文)。组合数超过 max_paths 或列排序规则无法识别时放弃并返回 False"""
+        started = time.monotonic()
+        generation = cache.cache_store.current_generation()
+        if generation is None:
+            return False
+        folds = column_folds(db.session, SampleData.__tablename__, {column.name for column in FOLD_COLUMNS})
+        if folds is None:
+            with self._lock:
+                self._reset()
+            return False
+        folds = tuple(folds[column.name] for column in FOLD_COLUMNS)
+        paths, labels = {}, tuple({} for _ in ATTRIBUTE_KEYS)
+        result = db.session.execute(self._select().execution_options(stream_results=True,
+                                                                     yield_per=BUILD_BATCH_SIZE))
+        try:
+            for rows in result.partitions():
+                self._collect(rows, paths, folds, labels, max_paths)
+        except _TooManyPaths:
+            result.close()
+            with self._lock:
+                self._reset()
+            return False
+
+        with self._lock:
+            self._paths = {scope: tuple(scope_paths) for scope, scope_paths in paths.items()}
+            self._folds = folds
+            self._labels = labels
+            self.generation = generation
+            self.built_at = started
+            self.ready = True
+        return True
+
+    def _start_background_build(self):
+        """在后台线程中重建，期间 ensure_fresh 返回 False(调用方回退为 SQL 查询)"""
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+            self.ready = False
+        app = current_app._get_current_object()
+        max_paths = app.config.get('LABEL_TAXONOMY_MAX_PATHS', DEFAULT_MAX_PATHS)
+
+        def run():
+            started = time.time()
+            with app.app_context():
+                try:
+                    if self.build(max_paths):
+                        print(f'标签组合图构建完成: {self.stats()["paths"]} 个组合，耗时 {time.time() - started:.1f}s')
+                except Exception as e:
+                    print(f'标签组合图构建失败: {e}')
+                finally:
+                    db.session.remove()
+                    with self._lock:
+                        self._building = False
+
+        threading.Thread(target=run, name='label-taxonomy-build', daemon=True).start()
+
+    @staticmethod
+    def _scope_condition(category, brand):
+        def equals(column, value):
+            return column.is_(None) if value == NULL_SCOPE else column == value
+
+        return and_(equals(SampleData.category, category), equals(SampleData.brand, brand))
+
+    def _load_scopes(self, pairs):
+        """查询指定 (category, brand) 范围当前的组合(不持锁)，返回 ({折叠后的范围: 组合}, 新出现的原始写法)"""
+        pairs = list(pairs)
+        folds = self._folds
+        paths, labels = {}, tuple({} for _ in ATTRIBUTE_KEYS)
+        for start in range(0, len(pairs), 100):
+            conditions = [self._scope_condition(category, brand) for category, brand in pairs[start:start + 100]]
+            self._collect(db.session.execute(self._select(or_(*conditions))).all(), paths, folds, labels)
+        # 范围条件按排序规则匹配，同一范围的不同写法折叠为同一个键
+        scopes = {}
+        for category, brand in pairs:
+            scope = (category if category == NULL_SCOPE else folds[0](category),
+                     brand if brand == NULL_SCOPE else folds[1](brand))
+            scopes[scope] = tuple(paths.get(scope, ()))
+        return scopes, labels
+
+    def _replace_scopes(self, scopes, labels):
+        """整体替换范围的组合(范围内已无数据时移除)；调用方持锁"""
+        for known, new in zip(self._labels, labels):
+            for key, value in new.items():
+                known.setdefault(key, value)
+        for pair, scope_paths in scopes.items():
+            if scope_paths:
+                self._paths[pair] = scope_paths
+            else:
+                self._paths.pop(pair, None)
+
+    def _expired(self):
+        """缓存后端的失效不跨 worker 时，超过 LABEL_TAXONOMY_MAX_AGE 秒视为过期(0 表示不限)"""
+        if cache.invalidation_is_shared():
+            return False
+        max_age = current_app.config.get('LABEL_TAXONOMY_MAX_AGE', DEFAULT_MAX_AGE)
+        return bool(max_age) and time.monotonic() - self.built_at > max_age
+
+    def ensure_fresh(self):
+        """同步到最新的缓存代数；可用返回 True，需要(或正在)重建时返回 False"""
+        if not current_app.config.get('LABEL_TAXONOMY_ENABLED', True):
+            return False
+        with self._lock:
+            if self._building:
+                return False
+            if not self.ready:
+                self._start_background_build()
+                return False
+            if self._expired():
+                self._start_background_build()  # 可能错过了其它 worker 的写入
+                return False
+            since = self.generation
+            generation, pairs = cache.cache_store.changed_scopes(since)
+            if generation is None:
+                return False
+            if pairs is None:
+                self._start_background_build()  # 全量失效(导入/清空)
+                return False
+            if not pairs:
+                self.generation = generation
+                return True
+
+        # 重新查询期间其它请求继续使用旧组合，不在锁内等待数据库
+        scopes, labels = self._load_scopes(pairs)
+        with self._lock:
+            # 期间已被其它请求同步或开始重建时丢弃本次结果；之后的变化由下一次同步按代数补上
+            if self.ready and self.generation == since:
+                self._replace_scopes(scopes, labels)
+                self.generation = generation
+            return self.ready
+
+    # ---------- 查询 ----------
+
+    def _value_matcher(self, values, fold):
+        """已选值列表 -> 判断单个(折叠后的)取值是否被选中的函数(未选择时返回 None)"""
+        if not values:
+            return None
+        normal = {fold(value) for value in values if value != self.empty_marker}
+        if self.empty_marker is not None and self.empty_marker in values:
+            return lambda value: value in normal or _is_empty(value)
+        return normal.__contains__
+
+    def label_options(self, brand_values, attr_values, categories=None, brands=None):
+        """权限 + 已选品牌 + 除自身外其它已选属性下 attr1-5 的候选项(与 SQL 路径结果相同)
+
+        attr_values: {attr1-5: 已选值列表}；categories/brands: 用户权限(None 表示全部)
+        """
+        options = [set() for _ in ATTRIBUTE_KEYS]
+
+        with self._lock:
+            category_fold, brand_fold, *attr_folds = self._folds
+            allowed_categories = None if categories is None else {_fold(value, category_fold) for value in categories}
+            allowed_brands = None if brands is None else {_fold(value, brand_fold) for value in brands}
+            brand_matcher = self._value_matcher(brand_values, brand_fold)
+            matchers = [self._value_matcher(attr_values.get(key), fold)
+                        for key, fold in zip(ATTRIBUTE_KEYS, attr_folds)]
+            active = [(pos, matcher) for pos, matcher in enumerate(matchers) if matcher is not None]
+
+            for (category, brand), paths in self._paths.items():
+                category, brand = (None if v == NULL_SCOPE else v for v in (category, brand))
+                if allowed_categories is not None and category not in allowed_categories:
+                    continue
+                if allowed_brands is not None and brand not in allowed_brands:
+                    continue
+                if brand_matcher is not None and not brand_matcher(brand):
+                    continue
+                for path in paths:
+                    failed = [pos for pos, matcher in active if not matcher(path[pos])]
+                    if not failed:
+                        targets = range(len(ATTRIBUTE_KEYS))
+                    elif len(failed) == 1:
+                        targets = failed  # 只有自身不匹配：仍计入自身的候选项(联动排除自身)
+                    else:
+                        continue
+                    for pos in targets:
+                        if path[pos] not in (None, ''):
+                            options[pos].add(path[pos])
+            options = [[labels[value] for value in values] for labels, values in zip(self._labels, options)]
+        return {key: sorted(values)[:MAX_OPTIONS] for key, values in zip(ATTRIBUTE_KEYS, options)}
+
+    def stats(self):
+        with self._lock:
+            return {'ready': self.ready, 'building': self._building, 'scopes': len(self._paths),
+                    'paths': sum(len(paths) for paths in self._paths.values()), 'generation': self.generation}
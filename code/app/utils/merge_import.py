@@ -0,0 +1,174 @@
+"""增量合并导入：按业务身份四列(product_description/sku/url/sku_url)合并月度文件
+
+与"清空后重传"相比，合并导入保留已有打标结果：
+- 文件中的新业务键 → 插入
+- 已存在的业务键 → 更新指标列(total/total_comments/last_*)，打标属性不变，
+  状态 Labeled 转为 Historical(表示为上月打标结果)
+- 可选：删除本次文件中不存在的业务键
+
+匹配方式为哈希连接：导入开始时流式读取现有表的 (id, 业务键)，归一化(同 audit.normalize_key)
+后计算 64 位哈希并排序，作为构建侧；文件每个数据块向量化计算哈希后用 searchsorted 批量探测。
+每块只产生一次 executemany 更新和一次批量插入，不做逐行查询。
+100 万行现有数据的索引约占 20MB 内存。
+"""
+from functools import partial
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, case, select
+
+from app.models import SampleData, db
+from app.utils.csv_handler import (
+    IMPORT_COLUMNS, ImportCancelled, _report_commit, _report_progress, insert_mappings, iter_file_chunks, normalize_columns,
+)
+
+BUSINESS_KEY_COLUMNS = ('product_description', 'sku', 'url', 'sku_url')
+MERGE_METRIC_COLUMNS = ('total', 'total_comments', 'last_month_total', 'last_total_comments')
+KEY_SEPARATOR = '\x1f'
+DELETE_BATCH_SIZE = 1000
+
+
+def business_key_hashes(key_columns):
+    """对业务身份四列整列归一化(None 视为空串、去首尾空白)后计算 64 位哈希。
+
+    key_columns: 与 BUSINESS_KEY_COLUMNS 顺序一致的四个数组/序列。
+    """
+    normalized = [
+        pd.Series(values, dtype=object).fillna('').astype(str).str.strip().reset_index(drop=True)
+        for values in key_columns
+    ]
+    joined = normalized[0].str.cat(normalized[1:], sep=KEY_SEPARATOR)
+    return pd.util.hash_array(joined.to_numpy(dtype=object), categorize=False)
+
+
+class BusinessKeyIndex:
+    """现有数据的业务键索引(按哈希排序的 id 数组)，支持重复业务键"""
+
+    def __init__(self, hashes, ids, labeled):
+        order = np.argsort(hashes, kind='stable')
+        self.hashes = hashes[order]
+        self.ids = ids[order]
+        self.labeled = labeled[order]
+        self.seen = np.zeros(len(self.ids), dtype=bool)
+
+    @classmethod
+    def load(cls, batch_size=50000):
+        """流式读取 sample_data 构建索引，内存中只保留哈希、id 和是否 Labeled"""
+        stmt = select(SampleData.id, SampleData.status,
+                      *(getattr(SampleData, col) for col in BUSINESS_KEY_COLUMNS))
+        hashes, ids, labeled = [], [], []
+        result = db.session.execute(stmt.execution_options(yield_per=batch_size))
+        for partition in result.partitions():
+            frame = pd.DataFrame.from_records(partition, columns=['id', 'status', *BUSINESS_KEY_COLUMNS])
+            hashes.append(business_key_hashes([frame[col] for col in BUSINESS_KEY_COLUMNS]))
+            ids.append(frame['id'].to_numpy(dtype=np.int64))
+            labeled.append((frame['status'] == 'Labeled').to_numpy(dtype=bool))
+        if not ids:
+            return cls(np.array([], dtype=np.uint64), np.array([], dtype=np.int64), np.array([], dtype=bool))
+        return cls(np.concatenate(hashes), np.concatenate(ids), np.concatenate(labeled))
+
+    def probe(self, hashes):
+        """批量探测：返回 (新行的行号, 命中行的行号, 对应的现有索引位置)。
+
+        一个文件行命中多条重复的现有数据时，行号会重复出现，与每条现有数据一一对应。
+        """
+        left = np.searchsorted(self.hashes, hashes, side='left')
+        right = np.searchsorted(self.hashes, hashes, side='right')
+        counts = right - left
+        new_rows = np.flatnonzero(counts == 0)
+        matched = np.flatnonzero(counts > 0)
+        counts = counts[matched]
+        row_idx = np.repeat(matched, counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        positions = np.repeat(left[matched], counts) + offsets
+        return new_rows, row_idx, positions
+
+    def unseen_ids(self):
+        return self.ids[~self.seen]
+
+
+def _merge_update_statement():
+    table = SampleData.__table__
+    values = {col: bindparam(col) for col in MERGE_METRIC_COLUMNS}
+    # 保留原有打标属性，已打标数据转为历史打标
+    values['status'] = case((table.c.status == 'Labeled', 'Historical'), else_=table.c.status)
+    return table.update().where(table.c.id == bindparam('_id')).values(**values)
+
+
+def merge_import_csv_to_db(file_path, chunk_size=5000, progress_callback=None, cancel_event=None,
+                           total_hint=0, delete_missing=False, commit_callback=None):
+    """
+    增量合并导入(按业务身份四列)
+
+    参数同 import_csv_to_db，另有:
+        delete_missing: 是否删除本次文件中不存在的业务键对应的数据(含其打标结果)
+
+    每个数据块单独提交，避免长事务长时间锁住正在打标的数据行。
+    """
+    counts = {'rows': 0, 'inserted': 0, 'updated': 0, 'historical': 0, 'deleted': 0}
+    committed = 0  # 已提交的新增/更新/删除行数
+    key_positions = [IMPORT_COLUMNS.index(col) for col in BUSINESS_KEY_COLUMNS]
+    metric_positions = {col: IMPORT_COLUMNS.index(col) for col in MERGE_METRIC_COLUMNS}
+    try:
+        if progress_callback:
+            progress_callback(0, 0, '正在建立业务键索引...')
+        index = BusinessKeyIndex.load()
+        update_stmt = _merge_update_statement()
+
+        reader, total_rows = iter_file_chunks(file_path, chunk_size, progress_callback)
+        total_rows = total_rows or total_hint
+        date_cache = {}
+
+        for df_chunk in reader:
+            if cancel_event is not None and cancel_event.is_set():
+                raise ImportCancelled()
+            if not len(df_chunk):
+                continue
+
+            arrays = normalize_columns(df_chunk, date_cache)
+            hashes = business_key_hashes([arrays[pos] for pos in key_positions])
+            new_rows, row_idx, positions = index.probe(hashes)
+
+            if len(new_rows):
+                new_arrays = [array[new_rows] for array in arrays]
+                insert_mappings(list(map(dict, map(partial(zip, IMPORT_COLUMNS), zip(*new_arrays)))))
+            if len(row_idx):
+                ids = index.ids[positions]
+                metric_values = {col: arrays[pos][row_idx] for col, pos in metric_positions.items()}
+                db.session.execute(update_stmt, [
+                    {'_id': int(sample_id), **dict(zip(MERGE_METRIC_COLUMNS, values))}
+                    for sample_id, *values in zip(ids, *metric_values.values())
+                ])
+                # 同一条现有数据只统计一次(文件中重复的业务键会多次命中)
+                first_hit = ~index.seen[positions]
+                counts['historical'] += int(np.count_nonzero(index.labeled[positions] & first_hit))
+                counts['updated'] += int(np.count_nonzero(first_hit))
+                index.seen[positions] = True
+            db.session.commit()
+            committed += len(new_rows) + len(row_idx)
+            _report_commit(commit_callback, committed)
+
+            counts['inserted'] += len(new_rows)
+            counts['rows'] += len(df_chunk)
+            _report_progress(progress_callback, counts['rows'], total_rows)
+
+        if delete_missing:
+            missing_ids = index.unseen_ids()
+            for start in range(0, len(missing_ids), DELETE_BATCH_SIZE):
+                batch = [int(i) for i in missing_ids[start:start + DELETE_BATCH_SIZE]]
+                SampleData.query.filter(SampleData.id.in_(batch)).delete(synchronize_session=False)
+                db.session.commit()
+                committed += len(batch)
+                _report_commit(commit_callback, committed)
+            counts['deleted'] = len(missing_ids)
+
+        return True, (f'合并导入完成: 文件 {counts["rows"]} 条, 新增 {counts["inserted"]} 条, '
+                      f'更新 {counts["updated"]} 条(其中 {counts["historical"]} 条转为Historical), '
+                      f'删除 {counts["deleted"]} 条')
+
+    except ImportCancelled:
+        db.session.rollback()
+        return False, f'合并导入已取消，取消前已处理 {counts["rows"]} 条数据'
+    except Exception as e:
+        db.session.rollback()
+        return False, f'合并导入失败: {str(e)}'
@@ -0,0 +1,95 @@
+"""物化的用户权限范围(category_arr / brand_arr)
+
+原先每条样本、候选项与统计查询都把当前用户的 JSON 权限数组展开为 category IN (...) AND brand IN (...)，
+权限包含几十上百个品牌时，每条 SQL 都要重新传输、解析这份列表，且不同语句里的列表各自生成执行计划。
+
+创建/编辑用户时把每组权限取值写入 permission_scope_value(scope_key, value)，key 记录在 user 行上：
+- scope_key = 哈希(维度, 排序去重后的取值)，内容相同的权限共享同一组行，取值变化即得到新的 key
+- 查询条件变为 column IN (SELECT value FROM permission_scope_value WHERE scope_key = ?)，
+  按主键索引取值后与 sample_data 半连接，各语句只带一个定长参数
+- 查询时用当前取值重新计算 key 并与 user 行上记录的 key 比较，不一致(如直接修改了 user 表)时
+  回退为原 IN 列表，结果不会出错，也不需要额外查询
+- 编辑用户后删除已无用户引用的 key
+- value 列沿用库默认排序规则，与 sample_data 列的比较语义一致；MySQL 默认排序规则下
+  'Apple'/'apple'/'Apple ' 相等，写入时由数据库按排序规则判重，等价取值只保留一行
+"""
+import hashlib
+import json
+
+from sqlalchemy import insert, select
+from sqlalchemy.dialects import mysql
+
+from app.models import PermissionScopeValue, User, db
+
+# 维度 -> (权限数组属性, 记录 key 的属性)
+DIMENSIONS = {
+    'category': ('category_arr', 'category_scope_key'),
+    'brand': ('brand_arr', 'brand_scope_key'),
+}
+
+
+def normalize_values(values):
+    """权限数组 -> 排序去重后的字符串列表"""
+    return sorted({str(value) for value in values})
+
+
+def scope_key(dimension, values):
+    """(维度, 权限取值) -> 32 位十六进制 key；None(全部权限)返回 None"""
+    if values is None:
+        return None
+    payload = json.dumps([dimension, normalize_values(values)], ensure_ascii=False, separators=(',', ':'))
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def scope_value_insert(dialect_name):
+    """写入物化行的 INSERT 语句；MySQL 下与已有行按排序规则重复时跳过(ON DUPLICATE KEY 空更新)"""
+    table = PermissionScopeValue.__table__
+    if dialect_name == 'mysql':
+        return mysql.insert(table).on_duplicate_key_update(value=table.c.value)
+    return insert(table)
+
+
+def _insert_scope_values(key, values):
+    dialect_name = db.session.get_bind().dialect.name
+    if dialect_name != 'mysql':
+        # 其他库(SQLite 默认 BINARY 排序规则)按字节比较，与 Python 相等一致
+        existing = set(db.session.scalars(
+            select(PermissionScopeValue.value).where(PermissionScopeValue.scope_key == key)))
+        values = [value for value in values if value not in existing]
+    if values:
+        db.session.execute(scope_value_insert(dialect_name), [{'scope_key': key, 'value': value} for value in values])
+
+
+def materialize_user_scope(user):
+    """写入用户当前权限的物化行并记录 key(加入调用方会话，随用户修改一起提交)"""
+    for dimension, (values_attr, key_attr) in DIMENSIONS.items():
+        values = getattr(user, values_attr)
+        key = scope_key(dimension, values)
+        if key is not None:
+            _insert_scope_values(key, normalize_values(values))
+        setattr(user, key_attr, key)
+
+
+def prune_unused_scopes():
+    """删除已没有任何用户引用的 key，返回删除的 key 数"""
+    referenced = set()
+    for category_key, brand_key in db.session.execute(select(User.category_scope_key, User.brand_scope_key)):
+        referenced.update((category_key, brand_key))
+    stored = set(db.session.scalars(select(PermissionScopeValue.scope_key).distinct()))
+    unused = stored - referenced
+    if unused:
+        db.session.execute(PermissionScopeValue.__table__.delete()
+                           .where(PermissionScopeValue.scope_key.in_(unused)))
+    return len(unused)
+
+
+def scope_condition(column, dimension, user):
+    """column 限定在用户 dimension 权限内的条件；全部权限时返回 None"""
+    values_attr, key_attr = DIMENSIONS[dimension]
+    values = getattr(user, values_attr)
+    key = scope_key(dimension, values)
+    if key is None:
+        return None
+    if getattr(user, key_attr, None) != key:
+        return column.in_(values)
+    return column.in_(select(PermissionScopeValue.value).where(PermissionScopeValue.scope_key == key))
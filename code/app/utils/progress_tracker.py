@@ -8,20 +8,32 @@ class ProgressTracker:
     使用内存存储导入任务的进度信息
     """
     def __init__(self):
-        self.tasks = {}  # {task_id: {status, progress, total, message, start_time}}
+        self.tasks = {}  # {task_id: {status, progress, total, message, start_time, meta}}
         self.lock = Lock()
 
-    def create_task(self, task_id, total=0):
-        """创建新任务"""
+    def create_task(self, task_id, total=0, status='processing', message='准备导入...', meta=None):
+        """创建新任务
+
+        meta: 任务附加信息(如文件名、提交人)，原样随进度返回，供任务列表展示。
+        """
         with self.lock:
             self.tasks[task_id] = {
-                'status': 'processing',  # processing, completed, failed
+                'status': status,  # queued, processing, completed, failed, cancelled
                 'progress': 0,
                 'total': total,
-                'message': '准备导入...',
-                'start_time': time.time()
+                'message': message,
+                'start_time': time.time(),
+                'meta': dict(meta or {}),
             }
 
+    def start_task(self, task_id, message='准备导入...'):
+        """排队任务开始执行：重置计时起点，避免排队时间计入速度和 ETA"""
+        with self.lock:
+            if task_id in self.tasks:
+                self.tasks[task_id]['status'] = 'processing'
+                self.tasks[task_id]['message'] = message
+                self.tasks[task_id]['start_time'] = time.time()
+
     def update_progress(self, task_id, progress, total=None, message=None):
         """更新任务进度"""
         with self.lock:
@@ -38,6 +50,7 @@ class ProgressTracker:
             if task_id in self.tasks:
                 self.tasks[task_id]['status'] = 'completed'
                 self.tasks[task_id]['message'] = message
+                self.tasks[task_id]['end_time'] = time.time()
                 self.tasks[task_id]['progress'] = self.tasks[task_id]['total']
 
     def fail_task(self, task_id, error_message):
@@ -46,25 +59,35 @@ class ProgressTracker:
             if task_id in self.tasks:
                 self.tasks[task_id]['status'] = 'failed'
                 self.tasks[task_id]['message'] = error_message
+                self.tasks[task_id]['end_time'] = time.time()
+
+    def cancel_task(self, task_id, message='导入已取消'):
+        """标记任务已取消"""
+        with self.lock:
+            if task_id in self.tasks:
+                self.tasks[task_id]['status'] = 'cancelled'
+                self.tasks[task_id]['message'] = message
+                self.tasks[task_id]['end_time'] = time.time()
 
     def get_progress(self, task_id):
         """获取任务进度"""
         with self.lock:
             if task_id in self.tasks:
                 task = self.tasks[task_id].copy()
+                task['meta'] = dict(task['meta'])
                 # 计算进度百分比
                 if task['total'] > 0:
-                    task['percentage'] = round(task['progress'] / task['total'] * 100, 2)
+                    task['percentage'] = min(round(task['progress'] / task['total'] * 100, 2), 100)
                 else:
                     task['percentage'] = 0
 
-                # 计算耗时和预计剩余时间
-                elapsed = time.time() - task['start_time']
+                # 计算耗时和预计剩余时间(任务结束后耗时固定)
+                elapsed = (task.get('end_time') or time.time()) - task['start_time']
                 task['elapsed'] = round(elapsed, 1)
 
                 if task['progress'] > 0 and task['total'] > 0:
-                    speed = task['progress'] / elapsed  # 条/秒
-                    remaining_count = task['total'] - task['progress']
+                    speed = task['progress'] / elapsed if elapsed > 0 else 0  # 条/秒
+                    remaining_count = max(task['total'] - task['progress'], 0)  # 总数为估算值时可能被超过
                     eta = remaining_count / speed if speed > 0 else 0
                     task['eta'] = round(eta, 1)
                     task['speed'] = round(speed, 1)
@@ -75,13 +98,31 @@ class ProgressTracker:
                 return task
             return None
 
+    def remove_task(self, task_id):
+        """删除任务(预留后未提交的任务)"""
+        with self.lock:
+            self.tasks.pop(task_id, None)
+
+    def list_tasks(self, limit=20):
+        """按创建时间倒序返回最近的任务进度列表"""
+        with self.lock:
+            task_ids = sorted(self.tasks, key=lambda tid: self.tasks[tid]['start_time'], reverse=True)
+        tasks = []
+        for task_id in task_ids[:limit]:
+            task = self.get_progress(task_id)
+            if task:
+                task['task_id'] = task_id
+                tasks.append(task)
+        return tasks
+
     def cleanup_old_tasks(self, max_age=3600):
         """清理超过指定时间的任务(默认1小时)"""
         with self.lock:
             current_time = time.time()
             expired_tasks = [
                 task_id for task_id, task in self.tasks.items()
-                if current_time - task['start_time'] > max_age
+                if task['status'] not in ('queued', 'processing')
+                and current_time - task['start_time'] > max_age
             ]
             for task_id in expired_tasks:
                 del self.tasks[task_id]
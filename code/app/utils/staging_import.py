@@ -0,0 +1,148 @@
+"""影子表导入：整表替换时先导入影子表，建好索引后原子切换
+
+月度整表重传时若直接写入 sample_data，打标人员会看到半截数据、联动候选项缓存到不完整结果，
+导入失败还会留下已提交的前几块。影子表导入的流程：
+1. 创建结构相同但不带二级索引的影子表 sample_data_staging
+2. 分块导入影子表(读者完全不可见，每块提交不影响线上查询)
+3. 在影子表上一次性建立与线上表相同的二级索引(比边插入边维护索引快)
+4. 原子切换：MySQL 使用 RENAME TABLE 一条语句交换；其它方言在事务内依次 RENAME
+5. 删除旧表并清空缓存
+
+任一步骤失败都会删除影子表，线上表保持不变。
+"""
+from sqlalchemy import Column, Index, MetaData, Table, inspect, text
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from app.models import SampleData, db
+from app.utils.cache import clear_cache
+from app.utils.csv_handler import (
+    ImportCancelled, _report_commit, _report_progress, insert_mappings, iter_file_chunks, normalize_chunk,
+)
+
+STAGING_SUFFIX = '_staging'
+RETIRED_SUFFIX = '_retired'
+# 非 MySQL 方言的索引名在库内全局唯一，影子表索引先用临时名，切换后改回原名
+STAGING_INDEX_SUFFIX = '_stg'
+
+
+def _quote(name):
+    return db.session.get_bind().dialect.identifier_preparer.quote(name)
+
+
+def _drop_table_if_exists(name):
+    db.session.execute(text(f'DROP TABLE IF EXISTS {_quote(name)}'))
+
+
+def _live_indexes(table_name):
+    """反射线上表的二级索引(含 add_indexes.sql 等手工添加的索引)，跳过表达式索引"""
+    indexes = inspect(db.session.connection()).get_indexes(table_name)
+    return [ix for ix in indexes if ix.get('column_names') and None not in ix['column_names']]
+
+
+def _build_index(table, spec, name):
+    return Index(name, *(table.c[col] for col in spec['column_names']),
+                 unique=spec.get('unique', False), **spec.get('dialect_options', {}))
+
+
+def _create_staging_table(live, staging_name):
+    """创建与线上表列定义相同、但不带二级索引的影子表"""
+    bind = db.session.get_bind()
+    if bind.dialect.name == 'mysql':
+        # LIKE 保留字符集、引擎等表选项；随后去掉二级索引，待数据导入后统一重建
+        db.session.execute(text(f'CREATE TABLE {_quote(staging_name)} LIKE {_quote(live.name)}'))
+        for spec in _live_indexes(staging_name):
+            db.session.execute(text(f'ALTER TABLE {_quote(staging_name)} DROP INDEX {_quote(spec["name"])}'))
+    staging = Table(staging_name, MetaData(), *(
+        Column(col.name, col.type, primary_key=col.primary_key, nullable=col.nullable,
+               autoincrement=col.autoincrement)
+        for col in live.columns
+    ))
+    if bind.dialect.name != 'mysql':
+        db.session.execute(CreateTable(staging))
+    return staging
+
+
+def _swap_tables(live_name, staging_name, index_specs):
+    """把影子表原子切换为线上表并删除旧表"""
+    retired_name = live_name + RETIRED_SUFFIX
+    _drop_table_if_exists(retired_name)
+    if db.session.get_bind().dialect.name == 'mysql':
+        # 单条 RENAME TABLE 同时交换两张表，读者要么看到旧表、要么看到新表
+        db.session.execute(text(
+            f'RENAME TABLE {_quote(live_name)} TO {_quote(retired_name)}, '
+            f'{_quote(staging_name)} TO {_quote(live_name)}'
+        ))
+        _drop_table_if_exists(retired_name)
+    else:
+        db.session.execute(text(f'ALTER TABLE {_quote(live_name)} RENAME TO {_quote(retired_name)}'))
+        db.session.execute(text(f'ALTER TABLE {_quote(staging_name)} RENAME TO {_quote(live_name)}'))
+        _drop_table_if_exists(retired_name)
+        live = SampleData.__table__
+        for spec in index_specs:
+            db.session.execute(text(f'DROP INDEX {_quote(spec["name"] + STAGING_INDEX_SUFFIX)}'))
+            db.session.execute(CreateIndex(_build_index(live, spec, spec['name'])))
+    db.session.commit()
+
+
+def import_csv_via_staging(file_path, chunk_size=5000, progress_callback=None, cancel_event=None, total_hint=0,
+                           commit_callback=None):
+    """
+    影子表整表替换导入：用文件内容整体替换 sample_data，导入期间线上表不受影响
+
+    参数同 import_csv_to_db。注意该模式会替换全部现有数据(等同清空后重传，但原子完成)。
+    """
+    live = SampleData.__table__
+    staging_name = live.name + STAGING_SUFFIX
+    total_count = 0
+    try:
+        index_specs = _live_indexes(live.name)
+        _drop_table_if_exists(staging_name)  # 清理上次失败遗留的影子表
+        staging = _create_staging_table(live, staging_name)
+        db.session.commit()
+
+        reader, total_rows = iter_file_chunks(file_path, chunk_size, progress_callback)
+        total_rows = total_rows or total_hint
+        date_cache = {}
+        for df_chunk in reader:
+            if cancel_event is not None and cancel_event.is_set():
+                raise ImportCancelled()
+            mappings = normalize_chunk(df_chunk, date_cache)
+            if mappings:
+                insert_mappings(mappings, table=staging)
+                db.session.commit()
+                total_count += len(mappings)
+                _report_progress(progress_callback, total_count, total_rows)
+
+        if progress_callback:
+            progress_callback(total_count, total_count, '正在影子表上建立索引...')
+        is_mysql = db.session.get_bind().dialect.name == 'mysql'
+        if is_mysql and any(spec.get('dialect_options', {}).get('mysql_prefix') == 'FULLTEXT' for spec in index_specs):
+            # ngram 全文索引须关闭停用词重建，与迁移一致(见 fulltext_search.py)
+            db.session.execute(text('SET SESSION innodb_ft_enable_stopword = OFF'))
+        for spec in index_specs:
+            name = spec['name'] if is_mysql else spec['name'] + STAGING_INDEX_SUFFIX
+            db.session.execute(CreateIndex(_build_index(staging, spec, name)))
+        db.session.commit()
+
+        if cancel_event is not None and cancel_event.is_set():
+            raise ImportCancelled()
+        replaced_count = db.session.execute(text(f'SELECT COUNT(*) FROM {_quote(live.name)}')).scalar()
+        if progress_callback:
+            progress_callback(total_count, total_count, '正在切换数据表...')
+        _swap_tables(live.name, staging_name, index_specs)
+        clear_cache()
+        # 影子表的写入在切换前对线上数据不可见，切换后新旧数据一并生效
+        _report_commit(commit_callback, total_count + replaced_count)
+
+        return True, f'影子表导入完成: 已用 {total_count} 条新数据整体替换原有 {replaced_count} 条数据'
+
+    except Exception as e:
+        db.session.rollback()
+        try:
+            _drop_table_if_exists(staging_name)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+        if isinstance(e, ImportCancelled):
+            return False, '导入已取消，线上数据未改动'
+        return False, f'影子表导入失败(线上数据未改动): {str(e)}'
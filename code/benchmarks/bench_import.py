@@ -0,0 +1,168 @@
+"""导入解析吞吐量基准：逐行 iterrows 旧路径 vs 列级向量化 normalize_chunk。
+
+用法(在 code/ 目录下):
+    python benchmarks/bench_import.py --rows 200000 --chunk-size 5000 --workers 8 --range-mb 4
+
+仅测量"数据块 -> 插入字典列表"的解析阶段，不连接数据库；
+加 --workers 可额外把数据写成 CSV 文件，对比单进程分块读取+转换(import_csv_to_db 的解析阶段)
+与子进程按字节区间读取+转换、主进程组装插入批次(import_csv_to_db_parallel 的解析阶段)；
+并行加速取决于可用 CPU 核数，输出中会打印核数；
+加 --sqlite 可额外测量写入内存 SQLite 的端到端耗时。
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+from dateutil.parser import parse as date_parse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.csv_handler import (  # noqa: E402
+    IMPORT_COLUMNS, insert_mappings, iter_file_chunks, iter_parallel_batches, normalize_chunk,
+)
+
+
+def legacy_chunk_to_mappings(df_chunk):
+    """旧版 import_csv_to_db 的逐行转换逻辑（保留作基准对照）。"""
+    def safe_value(val):
+        if val is None:
+            return None
+        if pd.isna(val):
+            return None
+        if isinstance(val, (int, float)):
+            return str(val)
+        return str(val) if val else None
+
+    def parse_date(date_str):
+        if not date_str or pd.isna(date_str):
+            return None
+        try:
+            return date_parse(str(date_str)).date()
+        except (ValueError, TypeError):
+            return None
+
+    df_chunk = df_chunk.where(pd.notnull(df_chunk), None)
+    mappings = []
+    for _, row in df_chunk.iterrows():
+        mapping = {col: safe_value(row.get(col)) for col in IMPORT_COLUMNS}
+        mapping['latest_review_date'] = parse_date(row.get('latest_review_date'))
+        mapping['status'] = mapping['status'] or 'Unlabeled'
+        mappings.append(mapping)
+    return mappings
+
+
+def make_frame(rows, seed=0):
+    """生成与月度文件结构相近的合成数据。"""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2023-01-01', periods=700).strftime('%Y-%m-%d').to_numpy()
+    data = {}
+    for col in IMPORT_COLUMNS:
+        if col == 'latest_review_date':
+            values = dates[rng.integers(0, len(dates), rows)].astype(object)
+        elif col in ('total', 'total_comments', 'last_month_total', 'last_total_comments'):
+            values = rng.integers(0, 100000, rows).astype(float)
+            values[rng.random(rows) < 0.1] = np.nan
+        else:
+            values = np.array([f'{col}_{i}' for i in rng.integers(0, 500, rows)], dtype=object)
+            values[rng.random(rows) < 0.2] = None
+        data[col] = values
+    return pd.DataFrame(data)
+
+
+def run(label, func, chunks):
+    start = time.perf_counter()
+    count = 0
+    for chunk in chunks:
+        count += len(func(chunk))
+    elapsed = time.perf_counter() - start
+    print(f'{label:<12} {count:>10} rows  {elapsed:8.2f}s  {count / elapsed:>12,.0f} rows/s')
+    return elapsed
+
+
+def run_file_parse(frame, args):
+    """从 CSV 文件读取 -> 插入批次：单进程分块 vs 进程池按字节区间"""
+    print(f'cpu cores    {os.cpu_count()}  (workers={args.workers})')
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'bench.csv')
+        frame.to_csv(path, index=False)
+
+        def single():
+            date_cache = {}
+            reader, _ = iter_file_chunks(path, args.chunk_size)
+            return sum(len(normalize_chunk(chunk, date_cache)) for chunk in reader)
+
+        def parallel(pool):
+            return sum(len(rows) for rows in iter_parallel_batches(path, args.chunk_size, pool, args.workers,
+                                                                   args.range_mb * 1024 * 1024))
+
+        start = time.perf_counter()
+        count = single()
+        single_elapsed = time.perf_counter() - start
+        print(f'{"file-single":<12} {count:>10} rows  {single_elapsed:8.2f}s  {count / single_elapsed:>12,.0f} rows/s')
+
+        with ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            list(pool.map(abs, range(args.workers)))  # 预热子进程
+            start, cpu_start = time.perf_counter(), time.process_time()
+            count = parallel(pool)
+            elapsed, main_cpu = time.perf_counter() - start, time.process_time() - cpu_start
+        print(f'{"file-ranges":<12} {count:>10} rows  {elapsed:8.2f}s  {count / elapsed:>12,.0f} rows/s')
+        print(f'speedup      {single_elapsed / elapsed:.1f}x')
+        # 主进程只做区间切分、接收列数组和组装批次，其 CPU 时间是核数足够时的耗时下限
+        print(f'main cpu     {main_cpu:.2f}s  (核数足够时加速上限约 {single_elapsed / main_cpu:.1f}x)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=0, help='并行解析进程数(0表示不测)')
+    parser.add_argument('--range-mb', type=int, default=8, help='并行解析时每个字节区间的大小(MB)')
+    parser.add_argument('--sqlite', action='store_true', help='同时测量写入内存 SQLite 的耗时')
+    args = parser.parse_args()
+
+    frame = make_frame(args.rows)
+    chunks = [frame.iloc[i:i + args.chunk_size] for i in range(0, len(frame), args.chunk_size)]
+
+    # 结果一致性校验
+    sample = chunks[0]
+    assert legacy_chunk_to_mappings(sample) == normalize_chunk(sample), '向量化结果与旧路径不一致'
+
+    legacy = run('legacy', legacy_chunk_to_mappings, chunks)
+    date_cache = {}
+    columnar = run('columnar', lambda chunk: normalize_chunk(chunk, date_cache), chunks)
+    print(f'speedup      {legacy / columnar:.1f}x')
+
+    if args.workers:
+        run_file_parse(frame, args)
+
+    if args.sqlite:
+        from flask import Flask
+        from app.models import SampleData, db
+
+        app = Flask(__name__)
+        app.config.update(SQLALCHEMY_DATABASE_URI='sqlite:///:memory:', SQLALCHEMY_TRACK_MODIFICATIONS=False)
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            legacy_insert = partial(db.session.bulk_insert_mappings, SampleData)
+            for label, func, inserter in (('legacy+db', legacy_chunk_to_mappings, legacy_insert),
+                                          ('columnar+db', normalize_chunk, insert_mappings)):
+                def insert(chunk, func=func, inserter=inserter):
+                    mappings = func(chunk)
+                    inserter(mappings)
+                    db.session.commit()
+                    return mappings
+                run(label, insert, chunks)
+                db.session.query(SampleData).delete()
+                db.session.commit()
+
+
+if __name__ == '__main__':
+    main()
@@ -13,6 +13,8 @@ class Config:
     MYSQL_USER = os.environ.get('MYSQL_USER') or 'root'
     MYSQL_PASSWORD = os.environ.get('MYSQL_PASSWORD') or ''
     MYSQL_DB = os.environ.get('MYSQL_DB') or 'labeling_platform'
+    # 流式批量导入(LOAD DATA LOCAL INFILE)需要客户端开启 local_infile，服务端同样需配置 local_infile=1
+    MYSQL_LOCAL_INFILE = str(os.environ.get('MYSQL_LOCAL_INFILE', '0')).lower() in ('1', 'true', 'yes')
 
     # SQLALCHEMY_DATABASE_URI = f'mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}?charset=utf8mb4'
     SQLALCHEMY_DATABASE_URI = f'mysql+pymysql://{MYSQL_USER}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}?charset=utf8mb4'
@@ -26,16 +28,42 @@ class Config:
     MAX_CONTENT_LENGTH = 500 * 1024 * 1024  # 500MB (支持大文件上传)
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
     ALLOWED_EXTENSIONS = {'csv', 'xlsx'}
+    IMPORT_JOB_WORKERS = int(os.environ.get('IMPORT_JOB_WORKERS') or 1)  # 后台导入任务并发数
+    IMPORT_PARSE_WORKERS = int(os.environ.get('IMPORT_PARSE_WORKERS') or 0)  # 并行导入解析进程数,0表示CPU核数
 
     # 分页配置
     ITEMS_PER_PAGE = 50
 
+    # 查询结果缓存(每个 worker 进程一份)：条目数上限与估算内存上限，超出按 LRU 淘汰
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES') or 2048)
+    CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_BYTES') or 64 * 1024 * 1024)
+    # 缓存后端: memory(进程内,默认) / file(同一主机所有 worker 共享的 SQLite 文件,失效对所有 worker 生效)
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND') or 'memory'
+    CACHE_FILE_PATH = os.environ.get('CACHE_FILE_PATH') or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'cache', 'query_cache.db')
+    # 联动筛选分面索引(每个 worker 进程一份，内存约 行数 x 14 x 4 字节)；行数超过上限时回退为 SQL 查询
+    FACET_INDEX_ENABLED = str(os.environ.get('FACET_INDEX_ENABLED', '1')).lower() in ('1', 'true', 'yes')
+    FACET_INDEX_MAX_ROWS = int(os.environ.get('FACET_INDEX_MAX_ROWS') or 5000000)
+    # 进程内缓存后端(memory)看不到其它 worker 的写入：索引最多使用的秒数，到期后台重建(0 表示不限)
+    FACET_INDEX_MAX_AGE = int(os.environ.get('FACET_INDEX_MAX_AGE') or 120)
+    # 候选标签属性组合图(每个 worker 进程一份)；不同 attr1-5 组合数超过上限时回退为 SQL 查询
+    LABEL_TAXONOMY_ENABLED = str(os.environ.get('LABEL_TAXONOMY_ENABLED', '1')).lower() in ('1', 'true', 'yes')
+    LABEL_TAXONOMY_MAX_PATHS = int(os.environ.get('LABEL_TAXONOMY_MAX_PATHS') or 1000000)
+    # 进程内缓存后端(memory)下组合图最多使用的秒数，到期后台重建(0 表示不限)
+    LABEL_TAXONOMY_MAX_AGE = int(os.environ.get('LABEL_TAXONOMY_MAX_AGE') or 120)
+    # 关键词/排除词搜索使用 ngram 全文索引(仅 MySQL 且已执行对应迁移时生效，否则为 LIKE)
+    SEARCH_FULLTEXT_ENABLED = str(os.environ.get('SEARCH_FULLTEXT_ENABLED', '1')).lower() in ('1', 'true', 'yes')
+    # 列表页筛选进度/总数：权限范围行数超过阈值时按 id 抽样约 APPROX_COUNT_SAMPLE_ROWS 行估算(0 表示始终精确计数)
+    APPROX_COUNT_THRESHOLD = int(os.environ.get('APPROX_COUNT_THRESHOLD') or 1000000)
+    APPROX_COUNT_SAMPLE_ROWS = int(os.environ.get('APPROX_COUNT_SAMPLE_ROWS') or 100000)
+
     # 数据库性能优化配置
     SQLALCHEMY_ENGINE_OPTIONS = {
         'pool_size': 10,  # 连接池大小
         'pool_recycle': 3600,  # 连接回收时间(秒)
         'pool_pre_ping': True,  # 连接前检查
         'max_overflow': 20,  # 超出pool_size后最多创建的连接
+        'connect_args': {'local_infile': MYSQL_LOCAL_INFILE},
     }
 
 class DevelopmentConfig(Config):
@@ -0,0 +1,59 @@
+"""add import_checkpoint table
+
+标准导入按数据块记录检查点，失败或中断后可从最后一个已提交的数据块续传；
+转换失败的行隔离到拒绝文件。
+
+Revision ID: c3d4e5f6a7b8
+Revises: b2c3d4e5f6a7
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3d4e5f6a7b8'
+down_revision = 'b2c3d4e5f6a7'
+branch_labels = None
+depends_on = None
+
+
+def _has_table(table_name):
+    inspector = sa.inspect(op.get_bind())
+    return table_name in inspector.get_table_names()
+
+
+def upgrade():
+    if _has_table('import_checkpoint'):
+        return
+
+    op.create_table(
+        'import_checkpoint',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('task_id', sa.String(length=32), nullable=True),
+        sa.Column('filename', sa.String(length=255), nullable=True),
+        sa.Column('file_path', sa.String(length=500), nullable=True),
+        sa.Column('file_size', sa.BigInteger(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('rows_done', sa.Integer(), nullable=True),
+        sa.Column('imported', sa.Integer(), nullable=True),
+        sa.Column('rejected', sa.Integer(), nullable=True),
+        sa.Column('reject_path', sa.String(length=500), nullable=True),
+        sa.Column('reject_bytes', sa.BigInteger(), nullable=True),
+        sa.Column('message', sa.Text(), nullable=True),
+        sa.Column('username', sa.String(length=50), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    with op.batch_alter_table('import_checkpoint', schema=None) as batch_op:
+        batch_op.create_index('ix_import_checkpoint_task_id', ['task_id'])
+        batch_op.create_index('ix_import_checkpoint_status', ['status'])
+
+
+def downgrade():
+    with op.batch_alter_table('import_checkpoint', schema=None) as batch_op:
+        batch_op.drop_index('ix_import_checkpoint_status')
+        batch_op.drop_index('ix_import_checkpoint_task_id')
+    op.drop_table('import_checkpoint')
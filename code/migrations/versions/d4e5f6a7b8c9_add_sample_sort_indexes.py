@@ -0,0 +1,45 @@
+"""add composite indexes for sample list sorting
+
+样本列表改为键集分页：按 (category, 排序列, id) 建复合索引，
+任意深度的上一页/下一页都只需在索引上定位后读取一页。
+
+Revision ID: d4e5f6a7b8c9
+Revises: c3d4e5f6a7b8
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4e5f6a7b8c9'
+down_revision = 'c3d4e5f6a7b8'
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    'ix_sample_data_category_review_date': ['category', 'latest_review_date', 'id'],
+    'ix_sample_data_category_brand_id': ['category', 'brand', 'id'],
+}
+
+
+def _index_names(table_name):
+    inspector = sa.inspect(op.get_bind())
+    return {index['name'] for index in inspector.get_indexes(table_name)}
+
+
+def upgrade():
+    existing = _index_names('sample_data')
+    with op.batch_alter_table('sample_data', schema=None) as batch_op:
+        for name, columns in INDEXES.items():
+            if name not in existing:
+                batch_op.create_index(name, columns)
+
+
+def downgrade():
+    existing = _index_names('sample_data')
+    with op.batch_alter_table('sample_data', schema=None) as batch_op:
+        for name in INDEXES:
+            if name in existing:
+                batch_op.drop_index(name)
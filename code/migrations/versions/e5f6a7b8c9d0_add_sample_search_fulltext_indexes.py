@@ -0,0 +1,50 @@
+"""add ngram fulltext indexes for keyword search
+
+关键词/排除词搜索在 product_description、sku、category 上按 ngram 全文索引取候选行，
+再用原 LIKE 条件复核(见 app/utils/fulltext_search.py)。仅 MySQL 建立；
+ngram 分词会丢弃包含停用词的 token，因此建索引前关闭停用词。
+
+Revision ID: e5f6a7b8c9d0
+Revises: d4e5f6a7b8c9
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5f6a7b8c9d0'
+down_revision = 'd4e5f6a7b8c9'
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    'ft_sample_data_product_description': 'product_description',
+    'ft_sample_data_sku': 'sku',
+    'ft_sample_data_category': 'category',
+}
+
+
+def _index_names(table_name):
+    inspector = sa.inspect(op.get_bind())
+    return {index['name'] for index in inspector.get_indexes(table_name)}
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'mysql':
+        return
+    existing = _index_names('sample_data')
+    op.execute('SET SESSION innodb_ft_enable_stopword = OFF')
+    for name, column in INDEXES.items():
+        if name not in existing:
+            op.execute(f'CREATE FULLTEXT INDEX `{name}` ON `sample_data` (`{column}`) WITH PARSER ngram')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'mysql':
+        return
+    existing = _index_names('sample_data')
+    for name in INDEXES:
+        if name in existing:
+            op.drop_index(name, table_name='sample_data')
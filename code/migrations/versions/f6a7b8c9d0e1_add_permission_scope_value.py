@@ -0,0 +1,96 @@
+"""add permission_scope_value table and user scope keys
+
+用户的 category_arr/brand_arr 权限物化为 (scope_key, value) 行，key 记录在 user 行上，
+样本/候选项/统计查询按 scope_key 半连接过滤，代替在每条 SQL 中内联 IN 列表；并为已有用户回填。
+
+Revision ID: f6a7b8c9d0e1
+Revises: e5f6a7b8c9d0
+Create Date: 2026-10-17
+
+"""
+import hashlib
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f6a7b8c9d0e1'
+down_revision = 'e5f6a7b8c9d0'
+branch_labels = None
+depends_on = None
+
+
+def _has_table(table_name):
+    inspector = sa.inspect(op.get_bind())
+    return table_name in inspector.get_table_names()
+
+
+def _values(raw):
+    """JSON 列的原始值 -> 权限取值列表(None 表示全部权限)"""
+    if isinstance(raw, str):
+        raw = json.loads(raw)
+    return raw
+
+
+def _scope_key(dimension, values):
+    # 与 app/utils/permission_scope.scope_key 相同
+    values = sorted({str(value) for value in values})
+    payload = json.dumps([dimension, values], ensure_ascii=False, separators=(',', ':'))
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest(), values
+
+
+def _column_names(table_name):
+    inspector = sa.inspect(op.get_bind())
+    return {column['name'] for column in inspector.get_columns(table_name)}
+
+
+def upgrade():
+    if not _has_table('permission_scope_value'):
+        op.create_table(
+            'permission_scope_value',
+            sa.Column('scope_key', sa.String(length=32), nullable=False),
+            sa.Column('value', sa.String(length=255), nullable=False),
+            sa.PrimaryKeyConstraint('scope_key', 'value'),
+        )
+    columns = _column_names('user')
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        for name in ('category_scope_key', 'brand_scope_key'):
+            if name not in columns:
+                batch_op.add_column(sa.Column(name, sa.String(length=32), nullable=True))
+
+    bind = op.get_bind()
+    rows = {}
+    for user_id, category_arr, brand_arr in bind.execute(sa.text('SELECT id, category_arr, brand_arr FROM user')):
+        keys = {}
+        for dimension, raw in (('category', category_arr), ('brand', brand_arr)):
+            values = _values(raw)
+            if values is None:
+                keys[dimension] = None
+                continue
+            keys[dimension], values = _scope_key(dimension, values)
+            rows.update({(keys[dimension], value): None for value in values})
+        bind.execute(sa.text('UPDATE user SET category_scope_key = :category, brand_scope_key = :brand '
+                             'WHERE id = :id'), {'id': user_id, **keys})
+    if not rows:
+        return
+    if bind.dialect.name == 'mysql':
+        # 默认排序规则下 'Apple'/'apple'/'Apple ' 主键冲突，按排序规则判重、等价取值只保留一行
+        # (与 app/utils/permission_scope.scope_value_insert 相同)
+        bind.execute(sa.text('INSERT INTO permission_scope_value (scope_key, value) VALUES (:scope_key, :value) '
+                             'ON DUPLICATE KEY UPDATE value = value'),
+                     [{'scope_key': key, 'value': value} for key, value in rows])
+        return
+    existing = set(bind.execute(sa.text('SELECT scope_key, value FROM permission_scope_value')))
+    missing = [{'scope_key': key, 'value': value} for key, value in rows if (key, value) not in existing]
+    if missing:
+        table = sa.table('permission_scope_value', sa.column('scope_key'), sa.column('value'))
+        op.bulk_insert(table, missing)
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('brand_scope_key')
+        batch_op.drop_column('category_scope_key')
+    op.drop_table('permission_scope_value')
@@ -0,0 +1,344 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from app.utils import cache
+from app.utils.cache import LRUCache, cached, clear_cache, invalidate_scopes, make_key_digest
+from app.utils.cache_backends import FileCache
+
+
+def fake_user(categories=None, brands=None):
+    return SimpleNamespace(is_authenticated=True, category_arr=categories, brand_arr=brands)
+
+
+class LRUCacheTests(unittest.TestCase):
+    def test_evicts_least_recently_used_beyond_entry_limit(self):
+        store = LRUCache(max_entries=2)
+        store.set('a', 1, 60)
+        store.set('b', 2, 60)
+        store.get('a')
+        store.set('c', 3, 60)
+
+        self.assertEqual(store.get('b'), (False, None))
+        self.assertEqual(store.get('a'), (True, 1))
+        self.assertEqual(store.stats()['evictions'], 1)
+
+    def test_byte_budget_and_oversized_values(self):
+        store = LRUCache(max_entries=100, max_bytes=2000)
+        store.set('big', 'x' * 5000, 60)
+        self.assertEqual(store.get('big'), (False, None))
+
+        for i in range(10):
+            store.set(i, 'y' * 300, 60)
+        self.assertLessEqual(store.stats()['bytes'], 2000)
+        self.assertEqual(store.get(9), (True, 'y' * 300))
+        self.assertEqual(store.get(0), (False, None))
+
+    def test_expired_entries_are_removed_on_read(self):
+        store = LRUCache()
+        store.set('k', [1, 2], 0.01)
+        time.sleep(0.02)
+        self.assertEqual(store.get('k'), (False, None))
+        self.assertEqual(store.stats()['entries'], 0)
+
+    def test_concurrent_access(self):
+        store = LRUCache(max_entries=50)
+
+        def worker(offset):
+            for i in range(500):
+                store.set((offset, i % 80), i, 60)
+                store.get((offset, (i * 7) % 80))
+                if i % 100 == 0:
+                    store.delete_where(lambda key: key[0] == offset)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLessEqual(store.stats()['entries'], 50)
+
+
+class CachedDecoratorTests(unittest.TestCase):
+    def setUp(self):
+        cache.cache_store.clear()
+
+    def test_key_ignores_dict_and_set_order(self):
+        self.assertEqual(make_key_digest(({'brand': ['A', 'B'], 'note': []},), {'x': 1, 'y': 2}),
+                         make_key_digest(({'note': [], 'brand': ['A', 'B']},), {'y': 2, 'x': 1}))
+        self.assertEqual(make_key_digest(({'A', 'B'},), {}), make_key_digest(({'B', 'A'},), {}))
+        self.assertNotEqual(make_key_digest(({'brand': ['A']},), {}), make_key_digest(({'brand': ['B']},), {}))
+
+    def test_key_keeps_positional_and_sequence_order(self):
+        self.assertNotEqual(make_key_digest(('a', 'b'), {}), make_key_digest(('b', 'a'), {}))
+        self.assertNotEqual(make_key_digest((1, 2), {}), make_key_digest((2, 1), {}))
+        self.assertNotEqual(make_key_digest(((1, 2),), {}), make_key_digest(((2, 1),), {}))
+        self.assertNotEqual(make_key_digest(({'brand': ['A', 'B']},), {}),
+                            make_key_digest(({'brand': ['B', 'A']},), {}))
+
+        calls = []
+
+        @cached(timeout=60)
+        def difference(a, b):
+            calls.append((a, b))
+            return a - b
+
+        self.assertEqual(difference(5, 3), 2)
+        self.assertEqual(difference(3, 5), -2)
+        self.assertEqual(calls, [(5, 3), (3, 5)])
+
+    def test_user_specific_entries_are_scoped_by_permissions(self):
+        calls = []
+
+        @cached(timeout=60, user_specific=True)
+        def options(selected):
+            calls.append(selected)
+            return len(calls)
+
+        with mock.patch.object(cache, 'current_user', fake_user(brands=['B1', 'B2'])):
+            self.assertEqual(options({'brand': ['A', 'B']}), 1)
+            self.assertEqual(options({'brand': ['A', 'B']}), 1)
+        with mock.patch.object(cache, 'current_user', fake_user(brands=['B2', 'B1'])):
+            self.assertEqual(options({'brand': ['A', 'B']}), 1)
+        # 无权限(空列表)与全部权限(None)不共享缓存
+        with mock.patch.object(cache, 'current_user', fake_user(brands=[])):
+            self.assertEqual(options({'brand': ['A', 'B']}), 2)
+        with mock.patch.object(cache, 'current_user', fake_user(brands=None)):
+            self.assertEqual(options({'brand': ['A', 'B']}), 3)
+            clear_cache(user_specific=True)
+            self.assertEqual(options({'brand': ['A', 'B']}), 4)
+        with mock.patch.object(cache, 'current_user', fake_user(brands=['B1', 'B2'])):
+            self.assertEqual(options({'brand': ['A', 'B']}), 1)
+
+
+class ScopeInvalidationTests(unittest.TestCase):
+    def setUp(self):
+        cache.cache_store.clear()
+        self.calls = []
+
+        @cached(timeout=60, user_specific=True)
+        def stats():
+            self.calls.append(1)
+            return len(self.calls)
+
+        self.stats = stats
+
+    def call_as(self, categories=None, brands=None):
+        with mock.patch.object(cache, 'current_user', fake_user(categories, brands)):
+            return self.stats()
+
+    def test_write_invalidates_only_overlapping_scopes(self):
+        hair = self.call_as(['Hair'], ['B1'])
+        skin = self.call_as(['Skin'], ['B1'])
+        everything = self.call_as()
+
+        invalidate_scopes([('Hair', 'B1')])
+        self.assertGreater(self.call_as(['Hair'], ['B1']), hair)
+        self.assertEqual(self.call_as(['Skin'], ['B1']), skin)
+        self.assertGreater(self.call_as(), everything)
+
+        # 只限品牌的用户：同品牌其它品类的修改同样失效
+        brand_only = self.call_as(None, ['B2'])
+        invalidate_scopes([('Skin', 'B1')])
+        self.assertEqual(self.call_as(None, ['B2']), brand_only)
+        invalidate_scopes([('Skin', 'B2')])
+        self.assertGreater(self.call_as(None, ['B2']), brand_only)
+
+    def test_null_scopes_and_in_flight_results(self):
+        everything = self.call_as()
+        invalidate_scopes([(None, None)])
+        self.assertGreater(self.call_as(), everything)
+
+        # 计算期间发生的失效：本次结果返回但下次读取时已过期
+        @cached(timeout=60)
+        def racing():
+            invalidate_scopes([('Hair', 'B1')])
+            return 'computed'
+
+        self.assertEqual(racing(), 'computed')
+        hits = cache.cache_store.stats()['hits']
+        racing()
+        self.assertEqual(cache.cache_store.stats()['hits'], hits + 1)  # 命中但因代数过期而重新计算
+
+    def test_scope_args_narrow_the_dependency(self):
+        calls = []
+
+        @cached(timeout=60, user_specific=True, scope_args=lambda brands: (None, brands))
+        def label_options(brands):
+            calls.append(brands)
+            return len(calls)
+
+        with mock.patch.object(cache, 'current_user', fake_user(['Hair'], None)):
+            first = label_options(['B1'])
+            invalidate_scopes([('Hair', 'B2')])
+            self.assertEqual(label_options(['B1']), first)
+            invalidate_scopes([('Hair', 'B1')])
+            self.assertGreater(label_options(['B1']), first)
+
+    def test_file_backend_generations_are_shared(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'cache.db')
+            with mock.patch.object(cache, 'cache_store', FileCache(path)):
+                hair = self.call_as(['Hair'], ['B1'])
+                skin = self.call_as(['Skin'], ['B1'])
+            with mock.patch.object(cache, 'cache_store', FileCache(path)):
+                invalidate_scopes([('Hair', 'B1')])
+            with mock.patch.object(cache, 'cache_store', FileCache(path)):
+                self.assertGreater(self.call_as(['Hair'], ['B1']), hair)
+                self.assertEqual(self.call_as(['Skin'], ['B1']), skin)
+                cache.cache_store.clear()
+                self.assertGreater(self.call_as(['Skin'], ['B1']), skin)
+
+
+class SynchronousExecutor:
+    def submit(self, task):
+        task()
+
+
+class SingleFlightTests(unittest.TestCase):
+    def setUp(self):
+        cache.cache_store.clear()
+
+    def test_concurrent_misses_compute_once(self):
+        calls = []
+        started = threading.Event()
+        release = threading.Event()
+
+        @cached(timeout=60)
+        def slow(value):
+            calls.append(value)
+            started.set()
+            release.wait(5)
+            return value * 2
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(slow(21))) for _ in range(6)]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [42] * 6)
+        self.assertEqual(calls, [21])
+
+    def test_followers_recompute_after_invalidation(self):
+        calls = []
+        started = threading.Event()
+        release = threading.Event()
+
+        @cached(timeout=60)
+        def slow():
+            calls.append(1)
+            if len(calls) == 1:
+                started.set()
+                release.wait(5)
+            return len(calls)
+
+        leader = threading.Thread(target=slow)
+        leader.start()
+        started.wait(5)
+        invalidate_scopes([('Hair', 'B1')])
+        # 失效发生在首个计算开始之后：不能复用其结果
+        self.assertEqual(slow(), 2)
+        release.set()
+        leader.join()
+
+    def test_stale_value_served_while_refreshing(self):
+        calls = []
+
+        @cached(timeout=0.01, stale_ttl=60)
+        def options():
+            calls.append(1)
+            return len(calls)
+
+        with mock.patch.object(cache, '_refresh_executor', SynchronousExecutor()):
+            self.assertEqual(options(), 1)
+            time.sleep(0.02)
+            self.assertEqual(options(), 1)  # 返回旧值，同时刷新
+            self.assertEqual(len(calls), 2)
+            self.assertEqual(options(), 2)
+
+            # 被失效的条目不返回旧值
+            invalidate_scopes([('Hair', 'B1')])
+            self.assertEqual(options(), len(calls))
+
+
+class FileCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'cache.db')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_entries_and_invalidation_are_shared_between_workers(self):
+        worker_a, worker_b = FileCache(self.path), FileCache(self.path)
+        worker_a.set(('f', 'scope1', 'x'), {'attr1': ['A', 'B']}, 60)
+        worker_a.set(('f', 'scope2', 'x'), [1], 60)
+
+        self.assertEqual(worker_b.get(('f', 'scope1', 'x')), (True, {'attr1': ['A', 'B']}))
+        self.assertEqual(worker_b.delete_where(lambda key: key[1] == 'scope1'), 1)
+        self.assertEqual(worker_a.get(('f', 'scope1', 'x')), (False, None))
+        worker_b.clear()
+        self.assertEqual(worker_a.get(('f', 'scope2', 'x')), (False, None))
+
+    def test_bounded_and_expiring(self):
+        store = FileCache(self.path, max_entries=3)
+        for i in range(5):
+            store.set(('f', '', str(i)), i, 60)
+        self.assertEqual(store.stats()['entries'], 3)
+        self.assertEqual(store.get(('f', '', '4')), (True, 4))
+
+        store.set(('f', '', 'short'), 'v', 0.01)
+        time.sleep(0.02)
+        self.assertEqual(store.get(('f', '', 'short')), (False, None))
+
+    def test_running_totals_track_all_writes(self):
+        store = FileCache(self.path, max_entries=3, max_bytes=10_000)
+        for i in range(5):
+            store.set(('f', '', str(i)), 'x' * (10 * i), 60)
+        store.set(('f', '', '4'), 'replaced', 60)
+        FileCache(self.path).delete_where(lambda key: key[2] == '3')
+
+        conn = store._connect()
+        actual = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entry').fetchone()
+        self.assertEqual(store._totals(conn), actual)
+        self.assertEqual(actual[0], 2)
+        store.clear()
+        self.assertEqual(store._totals(conn), (0, 0))
+
+    def test_expired_entries_are_dropped_before_live_ones(self):
+        store = FileCache(self.path, max_entries=2)
+        store.set(('f', '', 'live'), 1, 60)
+        store.set(('f', '', 'short'), 2, 0.01)
+        time.sleep(0.02)
+        store.set(('f', '', 'new'), 3, 60)
+
+        self.assertEqual(store.get(('f', '', 'live')), (True, 1))
+        self.assertEqual(store.stats()['evictions'], 0)
+        self.assertEqual(store.stats()['expired'], 1)
+
+    def test_decorator_uses_configured_backend(self):
+        calls = []
+
+        @cached(timeout=60)
+        def expensive(value):
+            calls.append(value)
+            return value * 2
+
+        with mock.patch.object(cache, 'cache_store', FileCache(self.path)):
+            self.assertEqual(expensive(2), 4)
+        with mock.patch.object(cache, 'cache_store', FileCache(self.path)):
+            self.assertEqual(expensive(2), 4)
+        self.assertEqual(calls, [2])
+
+
+if __name__ == '__main__':
+    unittest.main()
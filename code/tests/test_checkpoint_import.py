@@ -0,0 +1,151 @@
+import os
+import tempfile
+import unittest
+from threading import Event
+from unittest import mock
+
+import pandas as pd
+from flask import Flask
+from sqlalchemy.exc import OperationalError
+
+from app.models import ImportCheckpoint, SampleData, db
+from app.utils import checkpoint_import
+from app.utils.checkpoint_import import claim_for_resume, import_csv_with_checkpoint, is_resumable
+from app.utils.progress_tracker import progress_tracker
+
+
+class CheckpointImportTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.app = Flask(__name__)
+        cls.app.config.update(
+            SQLALCHEMY_DATABASE_URI='sqlite:///' + os.path.join(cls.tmpdir.name, 'checkpoint.db'),
+            SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        )
+        db.init_app(cls.app)
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        db.create_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        cls.app_context.pop()
+        cls.tmpdir.cleanup()
+
+    def setUp(self):
+        db.session.query(SampleData).delete()
+        db.session.query(ImportCheckpoint).delete()
+        db.session.commit()
+
+    def write_csv(self, rows, name='data.csv'):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('sku,brand,latest_review_date\n')
+            for sku, brand, review_date in rows:
+                f.write(f'{sku},{brand},{review_date}\n')
+        for leftover in (path + checkpoint_import.REJECT_SUFFIX,):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        return path
+
+    def test_unconvertible_rows_go_to_reject_file(self):
+        path = self.write_csv([
+            ('S1', 'B1', '2024-01-02'),
+            ('S2', 'B2', 'not a date'),
+            ('S3', 'B' * 300, ''),
+            ('S4', 'B4', ''),
+        ])
+        ok, message = import_csv_with_checkpoint(path, chunk_size=3)
+
+        self.assertTrue(ok, message)
+        self.assertEqual(sorted(row.sku for row in SampleData.query.all()), ['S1', 'S4'])
+        checkpoint = ImportCheckpoint.query.one()
+        self.assertEqual((checkpoint.status, checkpoint.rows_done, checkpoint.imported, checkpoint.rejected),
+                         ('completed', 4, 2, 2))
+
+        rejects = pd.read_csv(checkpoint.reject_path, encoding='utf-8-sig')
+        self.assertEqual(rejects['sku'].tolist(), ['S2', 'S3'])
+        self.assertEqual(rejects['_row_number'].tolist(), [3, 4])
+        self.assertIn('latest_review_date', rejects['_reject_reason'][0])
+        self.assertIn('brand', rejects['_reject_reason'][1])
+
+    def test_failed_import_resumes_from_last_committed_chunk(self):
+        path = self.write_csv([(f'S{i}', 'B', '') for i in range(7)] + [('S7', 'B', 'bad')])
+        real_insert = checkpoint_import.insert_mappings
+        calls = {'n': 0}
+
+        def flaky_insert(mappings, table=None):
+            calls['n'] += 1
+            if calls['n'] == 2:
+                raise RuntimeError('connection lost')
+            real_insert(mappings, table)
+
+        with mock.patch.object(checkpoint_import, 'insert_mappings', flaky_insert):
+            ok, message = import_csv_with_checkpoint(path, chunk_size=3)
+        self.assertFalse(ok)
+        checkpoint = ImportCheckpoint.query.one()
+        self.assertEqual((checkpoint.status, checkpoint.rows_done), ('failed', 3))
+        self.assertTrue(is_resumable(checkpoint))
+
+        ok, message = import_csv_with_checkpoint(path, chunk_size=3, checkpoint_id=checkpoint.id)
+        self.assertTrue(ok, message)
+        self.assertEqual(sorted(row.sku for row in SampleData.query.all()), [f'S{i}' for i in range(7)])
+        checkpoint = db.session.get(ImportCheckpoint, checkpoint.id)
+        self.assertEqual((checkpoint.rows_done, checkpoint.imported, checkpoint.rejected), (8, 7, 1))
+        self.assertEqual(len(pd.read_csv(checkpoint.reject_path, encoding='utf-8-sig')), 1)
+
+    def test_duplicate_resume_is_claimed_once(self):
+        path = self.write_csv([('S0', 'B', '')])
+        with mock.patch.object(checkpoint_import, 'insert_mappings', side_effect=RuntimeError('connection lost')):
+            import_csv_with_checkpoint(path)
+        # 重复提交的另一个请求在第一个请求占用前已读到 failed 状态
+        stale = ImportCheckpoint.query.one()
+        db.session.expunge(stale)
+        checkpoint = ImportCheckpoint.query.one()
+        for task_id in ('first', 'second'):
+            progress_tracker.create_task(task_id, status='queued')
+        self.addCleanup(progress_tracker.remove_task, 'first')
+        self.addCleanup(progress_tracker.remove_task, 'second')
+
+        self.assertTrue(claim_for_resume(checkpoint, 'first'))
+        self.assertTrue(is_resumable(stale))
+        self.assertFalse(claim_for_resume(stale, 'second'))
+        self.assertFalse(claim_for_resume(checkpoint, 'second'))
+        self.assertEqual((checkpoint.status, checkpoint.task_id), ('queued', 'first'))
+        self.assertFalse(is_resumable(checkpoint))
+
+    def test_database_errors_are_isolated_to_offending_rows(self):
+        path = self.write_csv([(f'S{i}', 'B', '') for i in range(4)])
+        real_insert = checkpoint_import.insert_mappings
+
+        def strict_insert(mappings, table=None):
+            if any(row['sku'] == 'S2' for row in mappings):
+                raise OperationalError('INSERT', {}, Exception('Incorrect string value'))
+            real_insert(mappings, table)
+
+        with mock.patch.object(checkpoint_import, 'insert_mappings', strict_insert):
+            ok, message = import_csv_with_checkpoint(path, chunk_size=10)
+
+        self.assertTrue(ok, message)
+        self.assertEqual(sorted(row.sku for row in SampleData.query.all()), ['S0', 'S1', 'S3'])
+        checkpoint = ImportCheckpoint.query.one()
+        rejects = pd.read_csv(checkpoint.reject_path, encoding='utf-8-sig')
+        self.assertEqual(rejects['sku'].tolist(), ['S2'])
+        self.assertIn('Incorrect string value', rejects['_reject_reason'][0])
+
+    def test_cancel_keeps_checkpoint(self):
+        path = self.write_csv([(f'S{i}', 'B', '') for i in range(4)])
+        cancel_event = Event()
+        cancel_event.set()
+        ok, message = import_csv_with_checkpoint(path, chunk_size=2, cancel_event=cancel_event)
+
+        self.assertFalse(ok)
+        checkpoint = ImportCheckpoint.query.one()
+        self.assertEqual(checkpoint.status, 'cancelled')
+        self.assertTrue(is_resumable(checkpoint))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import datetime
+import gzip
+import io
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+from flask import Flask
+
+from app.models import SampleData, db
+from app.utils.columnar_export import PARQUET_AVAILABLE, iter_samples_parquet
+from app.utils.csv_handler import EXPORT_COLUMNS, gzip_chunks, iter_samples_csv, resolve_export_columns
+
+
+class StreamingExportTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.app = Flask(__name__)
+        cls.app.config.update(
+            SQLALCHEMY_DATABASE_URI='sqlite:///' + os.path.join(cls.tmpdir.name, 'export.db'),
+            SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        )
+        db.init_app(cls.app)
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        db.create_all()
+        db.session.add_all([
+            SampleData(sku=f'S{i}', brand='B, "quoted"' if i == 0 else 'B', note='line1\nline2' if i == 1 else None,
+                       latest_review_date=datetime.date(2024, 1, i + 1), status='Labeled' if i % 2 else 'Unlabeled')
+            for i in range(5)
+        ])
+        db.session.commit()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        cls.app_context.pop()
+        cls.tmpdir.cleanup()
+
+    def test_streams_bom_header_and_rows_in_batches(self):
+        chunks = list(iter_samples_csv(batch_size=2))
+
+        self.assertTrue(chunks[0].startswith('﻿'.encode('utf-8')))
+        self.assertEqual(len(chunks), 1 + 3)
+        frame = pd.read_csv(io.BytesIO(b''.join(chunks)), encoding='utf-8-sig', dtype=str)
+        self.assertEqual(list(frame.columns), EXPORT_COLUMNS)
+        self.assertEqual(frame['sku'].tolist(), ['S0', 'S1', 'S2', 'S3', 'S4'])
+        self.assertEqual(frame['brand'][0], 'B, "quoted"')
+        self.assertEqual(frame['note'][1], 'line1\nline2')
+        self.assertEqual(frame['latest_review_date'][0], '2024-01-01')
+
+    def test_criteria_and_gzip(self):
+        raw = b''.join(iter_samples_csv(SampleData.status == 'Labeled'))
+        compressed = b''.join(gzip_chunks(iter_samples_csv(SampleData.status == 'Labeled')))
+
+        self.assertEqual(gzip.decompress(compressed), raw)
+        frame = pd.read_csv(io.BytesIO(raw), encoding='utf-8-sig', dtype=str)
+        self.assertEqual(frame['sku'].tolist(), ['S1', 'S3'])
+
+    def test_column_projection_keeps_export_order(self):
+        columns = resolve_export_columns(['status', 'sku', 'not_a_column'])
+        self.assertEqual(columns, ['sku', 'status'])
+        self.assertEqual(resolve_export_columns([]), EXPORT_COLUMNS)
+
+        frame = pd.read_csv(io.BytesIO(b''.join(iter_samples_csv(columns=columns))), encoding='utf-8-sig')
+        self.assertEqual(list(frame.columns), ['sku', 'status'])
+
+    @unittest.skipUnless(PARQUET_AVAILABLE, 'pyarrow 未安装')
+    def test_parquet_export_writes_row_groups_and_keeps_date_type(self):
+        import pyarrow.parquet as pq
+
+        columns = resolve_export_columns(['sku', 'latest_review_date', 'status'])
+        chunks = list(iter_samples_parquet(SampleData.status == 'Unlabeled', columns=columns, batch_size=2))
+
+        parquet_file = pq.ParquetFile(io.BytesIO(b''.join(chunks)))
+        self.assertEqual(parquet_file.metadata.num_row_groups, 2)
+        frame = parquet_file.read().to_pandas()
+        self.assertEqual(list(frame.columns), columns)
+        self.assertEqual(frame['sku'].tolist(), ['S0', 'S2', 'S4'])
+        self.assertEqual(frame['latest_review_date'][0], datetime.date(2024, 1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
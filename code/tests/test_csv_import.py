@@ -0,0 +1,209 @@
+import datetime
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from flask import Flask
+
+from app.models import SampleData, db
+from app.utils import csv_handler
+from app.utils.csv_handler import (
+    IMPORT_COLUMNS, _parse_range_in_worker, column_as_date, column_as_str, encode_load_data_rows, import_csv_to_db,
+    import_csv_to_db_parallel, import_csv_to_db_streaming, iter_csv_ranges, iter_xlsx_chunks, normalize_chunk,
+    normalize_columns, read_csv_header,
+)
+
+
+class ColumnarImportTests(unittest.TestCase):
+    def test_strings_numbers_and_missing_values_match_row_semantics(self):
+        series = pd.Series(['A', None, '', np.nan, 12, 3.5], dtype=object)
+        self.assertEqual(list(column_as_str(series)), ['A', None, None, None, '12', '3.5'])
+
+    def test_float_columns_keep_str_representation(self):
+        series = pd.Series([1.0, np.nan, 25.0])
+        self.assertEqual(list(column_as_str(series)), ['1.0', None, '25.0'])
+
+    def test_dates_parse_iso_and_fallback_formats_with_shared_cache(self):
+        cache = {}
+        series = pd.Series(['2024-01-05', '2024/02/03', 'not a date', None, '2024-01-05'])
+        self.assertEqual(list(column_as_date(series, cache)), [
+            datetime.date(2024, 1, 5), datetime.date(2024, 2, 3), None, None, datetime.date(2024, 1, 5),
+        ])
+        self.assertEqual(len(cache), 3)
+
+    def test_chunk_fills_missing_columns_and_defaults_status(self):
+        frame = pd.DataFrame({'brand': ['B1', 'B2'], 'status': [None, 'Labeled'], 'unknown': [1, 2]})
+        rows = normalize_chunk(frame)
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(list(rows[0]), IMPORT_COLUMNS)
+        self.assertEqual(rows[0]['brand'], 'B1')
+        self.assertIsNone(rows[0]['category'])
+        self.assertEqual([row['status'] for row in rows], ['Unlabeled', 'Labeled'])
+
+
+    def test_load_data_encoding_escapes_control_characters_and_nulls(self):
+        frame = pd.DataFrame({'brand': ['a\tb\\c\nd'], 'latest_review_date': ['2024-03-01']})
+        line = encode_load_data_rows(normalize_columns(frame)).decode('utf-8')
+        fields = line.rstrip('\n').split('\t')
+        self.assertEqual(len(fields), len(IMPORT_COLUMNS))
+        self.assertEqual(fields[IMPORT_COLUMNS.index('brand')], 'a\\tb\\\\c\\nd')
+        self.assertEqual(fields[IMPORT_COLUMNS.index('latest_review_date')], '2024-03-01')
+        self.assertEqual(fields[IMPORT_COLUMNS.index('sku')], '\\N')
+        self.assertEqual(fields[-1], 'Unlabeled')
+
+
+@unittest.skipUnless(hasattr(os, 'mkfifo'), 'requires named pipes')
+class LoadDataFifoTests(unittest.TestCase):
+    def chunks(self):
+        for start in (0, 3):
+            yield normalize_columns(pd.DataFrame({'brand': [f'B{i}' for i in range(start, start + 3)]}))
+
+    def test_fifo_streams_every_chunk_to_the_statement(self):
+        received = []
+
+        def fake_execute(path):
+            with open(path, 'rb') as pipe:
+                received.append(pipe.read())
+
+        counted = []
+        with mock.patch.object(csv_handler, 'build_load_data_sql', lambda path, table: path), \
+                mock.patch.object(csv_handler.db, 'session') as session:
+            session.execute.side_effect = fake_execute
+            csv_handler._load_data_via_fifo(self.chunks(), 'sample_data', counted.append)
+
+        self.assertEqual(counted, [3, 3])
+        self.assertEqual(received[0].count(b'\n'), 6)
+
+    def test_failed_statement_does_not_leave_producer_blocked(self):
+        with mock.patch.object(csv_handler, 'build_load_data_sql', lambda path, table: path), \
+                mock.patch.object(csv_handler.db, 'session') as session:
+            session.execute.side_effect = RuntimeError('local_infile disabled')
+            with self.assertRaises(RuntimeError):
+                csv_handler._load_data_via_fifo(self.chunks(), 'sample_data', lambda n: None)
+
+
+class StreamingImportFallbackTests(unittest.TestCase):
+    def test_non_mysql_dialect_uses_multirow_insert_in_one_transaction(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            app = Flask(__name__)
+            app.config.update(SQLALCHEMY_DATABASE_URI='sqlite:///' + os.path.join(tmpdir, 'stream.db'))
+            db.init_app(app)
+            path = os.path.join(tmpdir, 'data.csv')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write('brand,latest_review_date\n' + ''.join(f'B{i},2024-01-02\n' for i in range(23)))
+            with app.app_context():
+                db.create_all()
+                ok, message = import_csv_to_db_streaming(path, chunk_size=10, insert_batch_size=4)
+                self.assertTrue(ok, message)
+                self.assertEqual([row.brand for row in SampleData.query.order_by(SampleData.id)],
+                                 [f'B{i}' for i in range(23)])
+                db.session.remove()
+
+
+class ParallelRangeImportTests(unittest.TestCase):
+    CSV = ('\ufeffbrand,note,total,latest_review_date\n'
+           'B0,"line one\nline two",1,2024-01-02\n'
+           'B1,"say ""hi""\n, twice",2,2024-01-03\n'
+           'B2,plain,3,\n'
+           '\n'
+           'B3,"a\n\nb",4,2024-01-05\n'
+           'B4,last,5,2024-01-06')  # 末行无换行符
+
+    def write_csv(self, tmpdir, content=CSV):
+        path = os.path.join(tmpdir, 'data.csv')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def test_ranges_never_split_quoted_fields(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = self.write_csv(tmpdir)
+            expected = normalize_columns(pd.read_csv(path, encoding='utf-8-sig'))
+            columns = read_csv_header(path)
+            for range_bytes in (1, 5, 17, 1 << 20):
+                with self.subTest(range_bytes=range_bytes):
+                    ranges = list(iter_csv_ranges(path, range_bytes))
+                    self.assertEqual([start for start, _ in ranges[1:]], [end for _, end in ranges[:-1]])
+                    self.assertEqual(ranges[-1][1], os.path.getsize(path))
+                    parts = [_parse_range_in_worker(path, start, end, columns) for start, end in ranges]
+                    merged = [np.concatenate([part[i] for part in parts]) for i in range(len(IMPORT_COLUMNS))]
+                    self.assertEqual([list(array) for array in merged], [list(array) for array in expected])
+
+    def test_parallel_import_matches_standard_import_in_file_order(self):
+        rows = ''.join(f'B{i},"n\n{i}",{i},2024-01-0{i % 9 + 1}\n' for i in range(40))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = self.write_csv(tmpdir, 'brand,note,total,latest_review_date\n' + rows)
+            app = Flask(__name__)
+            app.config.update(SQLALCHEMY_DATABASE_URI='sqlite:///' + os.path.join(tmpdir, 'parallel.db'))
+            db.init_app(app)
+            committed = []
+            with app.app_context():
+                db.create_all()
+                ok, message = import_csv_to_db(path, chunk_size=7)
+                self.assertTrue(ok, message)
+                expected = [row.to_dict() for row in SampleData.query.order_by(SampleData.id)]
+                SampleData.query.delete()
+                db.session.commit()
+
+                ok, message = import_csv_to_db_parallel(path, chunk_size=7, workers=2, range_bytes=64,
+                                                        commit_callback=committed.append)
+                self.assertTrue(ok, message)
+                actual = [row.to_dict() for row in SampleData.query.order_by(SampleData.id)]
+                db.session.remove()
+
+        strip_id = lambda rows: [{k: v for k, v in row.items() if k != 'id'} for row in rows]  # noqa: E731
+        self.assertEqual(strip_id(actual), strip_id(expected))
+        self.assertEqual(committed[-1], 40)
+        self.assertTrue(all(b - a <= 7 for a, b in zip([0] + committed, committed)))
+
+
+class StreamingXlsxTests(unittest.TestCase):
+    def write_xlsx(self, path, rows):
+        from openpyxl import Workbook
+
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(['brand', 'total', 'latest_review_date'])
+        for i in range(rows):
+            sheet.append([f'B{i}', i, datetime.datetime(2024, 1, 2)])
+            if i == 2:
+                sheet.append([None, None, None])
+        workbook.save(path)
+
+    def test_rows_are_emitted_in_fixed_size_chunks(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'data.xlsx')
+            self.write_xlsx(path, 12)
+            chunks, _ = iter_xlsx_chunks(path, chunk_size=5)
+            frames = list(chunks)
+
+        self.assertEqual([len(frame) for frame in frames], [5, 5, 2])
+        rows = normalize_chunk(frames[0])
+        self.assertEqual(rows[0]['brand'], 'B0')
+        self.assertEqual(rows[0]['total'], '0')
+        self.assertEqual(rows[0]['latest_review_date'], datetime.date(2024, 1, 2))
+
+    def test_import_reports_progress_per_chunk(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'data.xlsx')
+            self.write_xlsx(path, 12)
+            app = Flask(__name__)
+            app.config.update(SQLALCHEMY_DATABASE_URI='sqlite:///' + os.path.join(tmpdir, 'xlsx.db'))
+            db.init_app(app)
+            progress = []
+            with app.app_context():
+                db.create_all()
+                ok, message = import_csv_to_db(path, chunk_size=5,
+                                               progress_callback=lambda cur, total, msg: progress.append(cur))
+                self.assertTrue(ok, message)
+                self.assertEqual(SampleData.query.count(), 12)
+                db.session.remove()
+
+        self.assertEqual(progress, [0, 5, 10, 12])
+
+
+if __name__ == '__main__':
+    unittest.main()
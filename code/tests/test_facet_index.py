@@ -0,0 +1,291 @@
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from flask import Flask
+from sqlalchemy import event
+
+from app.models import SampleData, db
+from app.routes import labeling
+from app.routes.labeling import (
+    CASCADE_FIELD_MAP, EMPTY_FILTER_VALUE, compute_facet_counts, compute_label_options, options_from_counts,
+)
+from app.utils import cache
+from app.utils.cache import LRUCache, invalidate_scopes
+from app.utils.facet_index import FacetIndex
+
+
+ROWS = [
+    ('Hair Care', 'B1', 'Tmall', 'S1', 'Shampoo', 'Dry', '10'),
+    ('Hair Care', 'B1', 'JD', 'S2', 'Shampoo', None, '20'),
+    ('Hair Care', 'B2', 'Tmall', 'S1', 'Conditioner', '  ', '10'),
+    ('Hair Care', None, 'JD', 'S3', None, 'Oily', '30'),
+    ('Skin Care', 'B1', 'Tmall', 'S4', 'Serum', 'Dry', '40'),
+    ('Skin Care', 'B3', 'Taobao', None, 'Toner', 'Oily', '10'),
+]
+
+SELECTIONS = [
+    {},
+    {'eRetailer': ['Tmall']},
+    {'eRetailer': ['Tmall'], 'attr1': ['Shampoo', 'Serum']},
+    {'attr2': [EMPTY_FILTER_VALUE]},
+    {'brand': ['B1'], 'attr2': [EMPTY_FILTER_VALUE, 'Dry'], 'total_comments': ['10']},
+    {'online_store': ['missing']},
+]
+
+SCOPES = [(None, None), (['Hair Care'], None), (None, ['B1', 'B3']), (['Hair Care'], ['B1', 'B2']), ([], None)]
+
+
+class FacetIndexTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = Flask(__name__)
+        cls.app.config.update(
+            SQLALCHEMY_DATABASE_URI='sqlite:///:memory:',
+            SQLALCHEMY_TRACK_MODIFICATIONS=False,
+            LABEL_TAXONOMY_ENABLED=False,
+        )
+        db.init_app(cls.app)
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        db.create_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        db.drop_all()
+        cls.app_context.pop()
+
+    def setUp(self):
+        SampleData.query.delete()
+        for category, brand, retailer, store, attr1, attr2, comments in ROWS:
+            db.session.add(SampleData(category=category, brand=brand, eRetailer=retailer, online_store=store,
+                                      prod_attributes1=attr1, prod_attributes2=attr2, total_comments=comments))
+        db.session.commit()
+        self.store_patch = mock.patch.object(cache, 'cache_store', LRUCache())
+        self.store_patch.start()
+        self.index = FacetIndex(CASCADE_FIELD_MAP, empty_marker=EMPTY_FILTER_VALUE)
+        self.assertTrue(self.index.build())
+
+    def tearDown(self):
+        self.store_patch.stop()
+
+    def sql_counts(self, selected, categories, brands):
+        user = SimpleNamespace(is_authenticated=True, category_arr=categories, brand_arr=brands)
+        self.app.config['FACET_INDEX_ENABLED'] = False
+        try:
+            with mock.patch.object(labeling, 'current_user', user):
+                return compute_facet_counts.__wrapped__(selected)
+        finally:
+            self.app.config['FACET_INDEX_ENABLED'] = True
+
+    def index_counts(self, selected, categories, brands):
+        user = SimpleNamespace(is_authenticated=True, category_arr=categories, brand_arr=brands)
+        with mock.patch.object(labeling, 'cascade_facet_index', self.index), \
+                mock.patch.object(labeling, 'current_user', user):
+            return compute_facet_counts.__wrapped__(selected)
+
+    def test_matches_sql_counts(self):
+        for categories, brands in SCOPES:
+            for selected in SELECTIONS:
+                with self.subTest(categories=categories, brands=brands, selected=selected):
+                    self.assertEqual(self.index_counts(selected, categories, brands),
+                                     self.sql_counts(selected, categories, brands))
+
+    def count_statements(self, func, *args):
+        statements = []
+
+        def record(conn, cursor, statement, *_):
+            statements.append(statement)
+
+        engine = db.engine
+        event.listen(engine, 'before_cursor_execute', record)
+        try:
+            return func(*args), len(statements)
+        finally:
+            event.remove(engine, 'before_cursor_execute', record)
+
+    def test_sql_fallback_uses_one_statement(self):
+        counts, statements = self.count_statements(self.sql_counts, {'eRetailer': ['Tmall']}, None, None)
+        self.assertEqual(statements, 1)
+        self.assertEqual(counts['attr2'], {'Dry': 2, EMPTY_FILTER_VALUE: 1})
+
+        user = SimpleNamespace(is_authenticated=True, category_arr=['Hair Care'], brand_arr=None)
+        with mock.patch.object(labeling, 'current_user', user):
+            options, statements = self.count_statements(
+                compute_label_options.__wrapped__, ['B1'], {'attr1': ['Shampoo'], 'attr2': []})
+        self.assertEqual(statements, 1)
+        self.assertEqual(options, {'attr1': ['Shampoo'], 'attr2': ['Dry'], 'attr3': [], 'attr4': [], 'attr5': []})
+
+    def test_counts_per_option(self):
+        counts = self.index_counts({'eRetailer': ['Tmall']}, ['Hair Care'], None)
+        self.assertEqual(counts['attr1'], {'Shampoo': 1, 'Conditioner': 1})
+        self.assertEqual(counts['attr2'], {'Dry': 1, EMPTY_FILTER_VALUE: 1})
+        self.assertEqual(counts['eRetailer'], {'Tmall': 2, 'JD': 2})
+
+        options = options_from_counts(counts)
+        self.assertEqual(options['attr2'], [EMPTY_FILTER_VALUE, 'Dry'])
+        self.assertEqual(options['online_store'], ['S1'])
+
+    def test_label_writes_reload_only_touched_scopes(self):
+        sample = SampleData.query.filter_by(category='Hair Care', brand='B2').one()
+        sample.prod_attributes1 = 'Mask'
+        db.session.add(SampleData(category='Hair Care', brand='B2', eRetailer='Vip', prod_attributes1='Mask'))
+        SampleData.query.filter_by(brand='B3').delete()
+        db.session.commit()
+        invalidate_scopes([('Hair Care', 'B2'), ('Skin Care', 'B3')])
+
+        with mock.patch.object(self.index, '_start_background_build') as rebuild:
+            self.assertTrue(self.index.ensure_fresh())
+        rebuild.assert_not_called()
+        self.assertEqual(self.index_counts({}, None, None), self.sql_counts({}, None, None))
+        self.assertEqual(self.index.facet_counts({}, None, None)['attr1']['Mask'], 2)
+
+    def test_scope_reload_queries_without_holding_the_lock(self):
+        invalidate_scopes([('Hair Care', 'B2')])
+        load = self.index._load_scopes
+        lock_free = []
+
+        def try_lock():
+            acquired = self.index._lock.acquire(blocking=False)
+            if acquired:
+                self.index._lock.release()
+            lock_free.append(acquired)
+
+        def load_and_probe(pairs):
+            # 查询期间其它线程(其它请求)可以取得锁
+            probe = threading.Thread(target=try_lock)
+            probe.start()
+            probe.join()
+            return load(pairs)
+
+        with mock.patch.object(self.index, '_load_scopes', side_effect=load_and_probe):
+            self.assertTrue(self.index.ensure_fresh())
+        self.assertEqual(lock_free, [True])
+
+    def test_stale_reload_result_is_discarded(self):
+        invalidate_scopes([('Hair Care', 'B2')])
+        since = self.index.generation
+
+        def concurrent_sync(pairs):
+            # 查询期间另一个请求已同步到更新的代数
+            self.index.generation = since + 100
+            return [[]]
+
+        with mock.patch.object(self.index, '_load_scopes', side_effect=concurrent_sync):
+            self.assertTrue(self.index.ensure_fresh())
+        self.assertEqual(self.index.generation, since + 100)
+        self.assertEqual(self.index.facet_counts({}, None, None)['brand']['B2'], 1)
+
+    def test_full_invalidation_triggers_rebuild(self):
+        cache.cache_store.clear()
+        with mock.patch.object(self.index, '_start_background_build') as rebuild:
+            self.assertFalse(self.index.ensure_fresh())
+        rebuild.assert_called_once()
+
+    def test_process_local_backend_rebuilds_after_max_age(self):
+        # 进程内缓存看不到其它 worker 的写入：超过 FACET_INDEX_MAX_AGE 后重建
+        self.index.built_at -= 121
+        with mock.patch.object(self.index, '_start_background_build') as rebuild:
+            self.assertFalse(self.index.ensure_fresh())
+        rebuild.assert_called_once()
+
+        # 共享后端的代数包含所有 worker 的写入，不按时间重建
+        with mock.patch.object(cache.cache_store, 'shared', True, create=True), \
+                mock.patch.object(self.index, '_start_background_build') as rebuild:
+            self.assertTrue(self.index.ensure_fresh())
+        rebuild.assert_not_called()
+
+    def test_row_limit(self):
+        self.assertFalse(self.index.build(max_rows=3))
+        self.assertFalse(self.index.ready)
+
+
+# 列声明 SQLite 的 NOCASE(不区分大小写)/RTRIM(忽略尾部空格)排序规则，模拟 MySQL *_ci 列上的取值合并
+COLLATED_COLUMNS = {'category': 'NOCASE', 'brand': 'NOCASE', 'eRetailer': 'NOCASE', 'prod_attributes1': 'RTRIM'}
+COLLATED_ROWS = [
+    ('Hair Care', 'Apple', 'Tmall', 'Dry'),
+    ('hair care', 'apple', 'TMALL', 'Dry '),
+    ('Hair Care', 'APPLE', 'tmall', 'Oily'),
+    ('Skin Care', 'Apple', 'JD', 'Dry  '),
+    ('Skin Care', 'B2', 'jd', None),
+]
+
+
+def create_collated_tables():
+    columns = SampleData.__table__.c
+    patches = [mock.patch.object(columns[name].type, 'collation', collation)
+               for name, collation in COLLATED_COLUMNS.items()]
+    for patch in patches:
+        patch.start()
+    try:
+        db.create_all()
+    finally:
+        for patch in patches:
+            patch.stop()
+
+
+def fold_keys(counts):
+    """按测试排序规则折叠候选项(两条路径保留的原始写法可能不同)"""
+    return {key: {value.lower().rstrip(): n for value, n in values.items()} for key, values in counts.items()}
+
+
+class FacetIndexCollationTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = Flask(__name__)
+        cls.app.config.update(
+            SQLALCHEMY_DATABASE_URI='sqlite:///:memory:',
+            SQLALCHEMY_TRACK_MODIFICATIONS=False,
+            LABEL_TAXONOMY_ENABLED=False,
+        )
+        db.init_app(cls.app)
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        create_collated_tables()
+        for category, brand, retailer, attr1 in COLLATED_ROWS:
+            db.session.add(SampleData(category=category, brand=brand, eRetailer=retailer, prod_attributes1=attr1))
+        db.session.commit()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        db.drop_all()
+        cls.app_context.pop()
+
+    def setUp(self):
+        self.store_patch = mock.patch.object(cache, 'cache_store', LRUCache())
+        self.store_patch.start()
+        self.index = FacetIndex(CASCADE_FIELD_MAP, empty_marker=EMPTY_FILTER_VALUE)
+        self.assertTrue(self.index.build())
+
+    def tearDown(self):
+        self.store_patch.stop()
+
+    sql_counts = FacetIndexTests.sql_counts
+    index_counts = FacetIndexTests.index_counts
+
+    def test_variants_merge_like_sql(self):
+        counts = self.index_counts({}, None, None)
+        self.assertEqual(sorted(counts['brand'].values()), [1, 4])
+        self.assertEqual(sorted(counts['eRetailer'].values()), [2, 3])
+        self.assertEqual(counts['attr1'], {'Dry': 3, 'Oily': 1, EMPTY_FILTER_VALUE: 1})
+
+        scopes = [(None, None), (['HAIR CARE'], None), (None, ['apple']), (['hair care'], ['Apple ', 'b2'])]
+        selections = [{}, {'eRetailer': ['tmall']}, {'attr1': ['Dry   ']}, {'attr1': ['dry']},
+                      {'brand': ['APPLE'], 'eRetailer': ['Jd', 'TMALL']}]
+        for categories, brands in scopes:
+            for selected in selections:
+                with self.subTest(categories=categories, brands=brands, selected=selected):
+                    self.assertEqual(fold_keys(self.index_counts(selected, categories, brands)),
+                                     fold_keys(self.sql_counts(selected, categories, brands)))
+
+    def test_unknown_collation_disables_index(self):
+        with mock.patch('app.utils.facet_index.column_folds', return_value=None):
+            self.assertFalse(self.index.build())
+        self.assertFalse(self.index.ready)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+import os
+import tempfile
+import time
+import unittest
+from threading import Event
+from unittest import mock
+
+from flask import Flask
+
+from app.models import AuditLog, SampleData, db
+from app.utils import csv_handler, import_jobs
+from app.utils.csv_handler import import_csv_to_db_parallel, import_csv_to_db_streaming
+from app.utils.import_jobs import ImportJobRunner
+from app.utils.progress_tracker import progress_tracker
+
+ACTOR = {'user_id': 1, 'username': 'admin', 'ip': '127.0.0.1'}
+
+
+class ImportJobTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.app = Flask(__name__)
+        cls.app.config.update(
+            SQLALCHEMY_DATABASE_URI='sqlite:///' + os.path.join(cls.tmpdir.name, 'jobs.db'),
+            SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        )
+        db.init_app(cls.app)
+        with cls.app.app_context():
+            db.create_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def setUp(self):
+        with self.app.app_context():
+            db.session.query(SampleData).delete()
+            db.session.query(AuditLog).delete()
+            db.session.commit()
+        self.runner = ImportJobRunner()
+
+    def write_csv(self, rows):
+        path = os.path.join(self.tmpdir.name, f'upload_{time.time_ns()}.csv')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('category,brand,latest_review_date\n')
+            for i in range(rows):
+                f.write(f'Hair Care,B{i},2024-01-0{i % 9 + 1}\n')
+        return path
+
+    def wait(self, task_id, timeout=10):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            task = progress_tracker.get_progress(task_id)
+            if task['status'] not in ('queued', 'processing'):
+                return task
+            time.sleep(0.02)
+        self.fail('import job did not finish')
+
+    def test_job_imports_in_background_and_reports_progress(self):
+        path = self.write_csv(25)
+        task_id = self.runner.submit(self.app, path, 'upload.csv', ACTOR, chunk_size=10)
+        task = self.wait(task_id)
+
+        self.assertEqual(task['status'], 'completed')
+        self.assertEqual((task['progress'], task['total']), (25, 25))
+        self.assertEqual(task['meta']['filename'], 'upload.csv')
+        with self.app.app_context():
+            self.assertEqual(SampleData.query.count(), 25)
+        self.assertIn(task_id, [job['task_id'] for job in self.runner.list_jobs()])
+
+    def test_parallel_mode_keeps_file_order(self):
+        path = self.write_csv(57)
+        task_id = self.runner.submit(self.app, path, 'big.csv', ACTOR,
+                                     import_func=import_csv_to_db_parallel, chunk_size=10, workers=2,
+                                     range_bytes=200)
+        task = self.wait(task_id, timeout=60)
+
+        self.assertEqual(task['status'], 'completed', task['message'])
+        with self.app.app_context():
+            brands = [row.brand for row in SampleData.query.order_by(SampleData.id)]
+        self.assertEqual(brands, [f'B{i}' for i in range(57)])
+
+    def upload_logs(self):
+        with self.app.app_context():
+            return AuditLog.query.filter_by(action='upload').count()
+
+    def test_rolled_back_import_neither_clears_cache_nor_logs(self):
+        real_insert = csv_handler._insert_multirow
+
+        def insert_then_fail(chunks, table, on_rows, batch_size):
+            real_insert(chunks, table, on_rows, batch_size)
+            raise RuntimeError('disk full')
+
+        path = self.write_csv(25)
+        with mock.patch.object(csv_handler, '_insert_multirow', insert_then_fail), \
+                mock.patch.object(import_jobs, 'clear_cache') as clear_cache:
+            task_id = self.runner.submit(self.app, path, 'stream.csv', ACTOR,
+                                         import_func=import_csv_to_db_streaming, chunk_size=10)
+            task = self.wait(task_id)
+
+        self.assertEqual(task['status'], 'failed')
+        self.assertEqual(task['progress'], 25)  # 进度计数包含被回滚的行
+        with self.app.app_context():
+            self.assertEqual(SampleData.query.count(), 0)
+        self.assertEqual(self.upload_logs(), 0)
+        clear_cache.assert_not_called()
+
+    def test_partially_committed_failure_clears_cache_and_logs(self):
+        real_insert = csv_handler.insert_mappings
+        calls = []
+
+        def fail_on_third_chunk(mappings, table=None):
+            calls.append(len(mappings))
+            if len(calls) == 3:
+                raise RuntimeError('disk full')
+            real_insert(mappings, table)
+
+        path = self.write_csv(25)
+        with mock.patch.object(csv_handler, 'insert_mappings', fail_on_third_chunk), \
+                mock.patch.object(import_jobs, 'clear_cache') as clear_cache:
+            task_id = self.runner.submit(self.app, path, 'upload.csv', ACTOR,
+                                         import_func=csv_handler.import_csv_to_db, chunk_size=10)
+            task = self.wait(task_id)
+
+        self.assertEqual(task['status'], 'failed')
+        with self.app.app_context():
+            self.assertEqual(SampleData.query.count(), 20)
+        self.assertEqual(self.upload_logs(), 1)
+        clear_cache.assert_called_once()
+
+    def test_cancel_stops_before_next_chunk(self):
+        started = Event()
+        release = Event()
+
+        def slow_import(file_path, progress_callback=None, cancel_event=None, total_hint=0, commit_callback=None):
+            started.set()
+            release.wait(5)
+            if cancel_event.is_set():
+                return False, '导入已取消'
+            return True, 'ok'
+
+        path = self.write_csv(1)
+        task_id = self.runner.submit(self.app, path, 'slow.csv', ACTOR, import_func=slow_import)
+        self.assertTrue(started.wait(5))
+        self.assertTrue(self.runner.cancel(task_id))
+        release.set()
+
+        self.assertEqual(self.wait(task_id)['status'], 'cancelled')
+        self.assertFalse(self.runner.cancel(task_id))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+import unittest
+from datetime import date
+from types import SimpleNamespace
+from unittest import mock
+
+from flask import Flask
+from sqlalchemy import event
+from werkzeug.datastructures import MultiDict
+
+from app.models import SampleData, db
+from app.routes import labeling
+from app.routes.labeling import (
+    count_for_statuses, get_filtered_progress_stats, sample_filter_args, sample_paginator, summarize_status_query,
+)
+from app.utils import cache
+from app.utils.cache import LRUCache
+from app.utils.keyset import encode_cursor
+
+
+class KeysetPaginationTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = Flask(__name__)
+        cls.app.config.update(
+            SQLALCHEMY_DATABASE_URI='sqlite:///:memory:',
+            SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        )
+        db.init_app(cls.app)
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        db.create_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        db.drop_all()
+        cls.app_context.pop()
+
+    def setUp(self):
+        SampleData.query.delete()
+        for i in range(1, 24):
+            db.session.add(SampleData(
+                id=i, category='Hair Care',
+                brand=None if i % 7 == 0 else f'B{i % 3}',
+                total_comments=None if i % 5 == 0 else str(i % 4),
+                latest_review_date=None if i % 6 == 0 else date(2026, 1, 1 + i % 4),
+                status='Labeled' if i % 2 else 'Unlabeled',
+            ))
+        db.session.commit()
+
+    def expected_ids(self, sort, query=None):
+        query = query or SampleData.query
+        _, column, descending = sample_paginator.resolve_sort(sort)
+        return [row.id for row in query.order_by(*sample_paginator._order(column, descending)).all()]
+
+    def walk_forward(self, sort, per_page=5, query_factory=lambda: SampleData.query):
+        total = query_factory().count()
+        pagination = sample_paginator.paginate(query_factory(), sort, '', per_page, total)
+        pages = [pagination]
+        while pagination.has_next:
+            pagination = sample_paginator.paginate(query_factory(), sort, pagination.next_cursor, per_page, total)
+            pages.append(pagination)
+        return pages
+
+    def test_forward_and_backward_walks_match_offset_order(self):
+        for sort in ('', 'latest_review_date', '-latest_review_date', 'brand', '-brand'):
+            with self.subTest(sort=sort):
+                pages = self.walk_forward(sort)
+                self.assertEqual([row.id for page in pages for row in page.items], self.expected_ids(sort))
+                self.assertEqual([page.page for page in pages], [1, 2, 3, 4, 5])
+                self.assertFalse(pages[0].has_prev)
+
+                pagination = pages[-1]
+                backwards = [pagination.items]
+                while pagination.has_prev:
+                    pagination = sample_paginator.paginate(SampleData.query, sort, pagination.prev_cursor, 5, 23)
+                    backwards.insert(0, pagination.items)
+                self.assertEqual([[row.id for row in items] for items in backwards],
+                                 [[row.id for row in page.items] for page in pages])
+                self.assertEqual(pagination.page, 1)
+
+    def test_saving_keeps_position_when_rows_leave_the_filter(self):
+        def unlabeled():
+            return SampleData.query.filter(SampleData.status == 'Unlabeled')
+
+        pages = self.walk_forward('-latest_review_date', per_page=3, query_factory=unlabeled)
+        second = pages[1]
+        for row in second.items:
+            row.status = 'Labeled'
+        db.session.commit()
+
+        remaining = self.expected_ids('-latest_review_date', unlabeled())
+        again = sample_paginator.paginate(unlabeled(), '-latest_review_date', second.cursor, 3, len(remaining))
+        # 当前页的行被打标移出后，后续行补上当前页
+        self.assertEqual([row.id for row in again.items], remaining[3:6])
+        self.assertEqual(again.page, 2)
+
+    def test_text_columns_are_not_sortable(self):
+        # total_comments 为文本列，按字符串排序会得到错误的数值顺序：按 id 排序
+        self.assertEqual(sample_paginator.resolve_sort('-total_comments'), ('id', SampleData.id, False))
+
+    def test_last_page_and_invalid_cursor(self):
+        last = sample_paginator.paginate(SampleData.query, 'brand', encode_cursor('brand', 'last', None, None, 5),
+                                         5, 23)
+        self.assertEqual([row.id for row in last.items], self.expected_ids('brand')[-5:])
+        self.assertEqual(last.page, 5)
+        self.assertFalse(last.has_next)
+
+        for cursor in ('not-a-cursor', encode_cursor('total_comments', 'after', '1', 3, 2),
+                       encode_cursor('latest_review_date', 'after', 'bad-date', 3, 2)):
+            with self.subTest(cursor=cursor):
+                first = sample_paginator.paginate(SampleData.query, 'latest_review_date', cursor, 5, 23)
+                self.assertEqual([row.id for row in first.items], self.expected_ids('latest_review_date')[:5])
+
+    def test_total_comes_from_status_summary(self):
+        stats = {'total': 10, 'unlabeled': 4, 'labeled': 3, 'prelabeled': 1, 'historical': 1,
+                 'incomplete': 1, 'uncertain': 0}
+        self.assertEqual(count_for_statuses(stats, []), 10)
+        self.assertEqual(count_for_statuses(stats, ['Unlabeled', 'Historical']), 5)
+        self.assertIsNone(count_for_statuses(stats, ['Unknown']))
+
+    def filtered_stats(self, *args):
+        user = SimpleNamespace(is_authenticated=True, category_arr=['Hair Care'], brand_arr=None)
+        statements = []
+
+        def record(conn, cursor, statement, *_):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            with mock.patch.object(labeling, 'current_user', user), mock.patch.object(cache, 'current_user', user):
+                return get_filtered_progress_stats(sample_filter_args(MultiDict(args))), len(statements)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+
+    def test_filtered_stats_are_cached_and_reuse_overall_progress(self):
+        with mock.patch.object(cache, 'cache_store', LRUCache()):
+            overall, statements = self.filtered_stats(('keyword_mode', 'all'), ('page', '3'))
+            self.assertEqual(statements, 1)  # 无筛选：只有整体进度一次聚合
+            self.assertEqual(overall, dict(summarize_status_query(SampleData.query), approximate=False))
+
+            filtered, statements = self.filtered_stats(('brand', 'B1'), ('cursor', 'x'))
+            self.assertEqual(statements, 1)
+            self.assertEqual(filtered['total'], SampleData.query.filter_by(brand='B1').count())
+            self.assertFalse(filtered['approximate'])
+
+            # 翻页/排序不影响缓存 key
+            self.assertEqual(self.filtered_stats(('brand', 'B1'), ('sort', '-brand')), (filtered, 0))
+
+    def test_large_scopes_are_estimated_from_a_sample(self):
+        self.app.config.update(APPROX_COUNT_THRESHOLD=10, APPROX_COUNT_SAMPLE_ROWS=5)
+        try:
+            with mock.patch.object(cache, 'cache_store', LRUCache()):
+                stats, _ = self.filtered_stats(('brand', 'B1'))
+        finally:
+            self.app.config.update(APPROX_COUNT_THRESHOLD=0)
+        cutoff = labeling.COUNT_SAMPLE_MODULUS * 5 // 23
+        sampled = SampleData.query.filter(
+            SampleData.brand == 'B1',
+            SampleData.id * labeling.COUNT_SAMPLE_MULTIPLIER % labeling.COUNT_SAMPLE_MODULUS < cutoff).count()
+        self.assertTrue(stats['approximate'])
+        self.assertEqual(stats['total'], round(sampled * labeling.COUNT_SAMPLE_MODULUS / cutoff))
+
+
+if __name__ == '__main__':
+    unittest.main()
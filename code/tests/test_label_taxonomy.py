@@ -0,0 +1,258 @@
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from flask import Flask
+
+from app.models import SampleData, db
+from app.routes import labeling
+from app.routes.labeling import EMPTY_FILTER_VALUE, compute_label_options
+from app.utils import cache
+from app.utils.cache import LRUCache, invalidate_scopes
+from app.utils.label_taxonomy import LabelTaxonomy
+
+
+ROWS = [
+    ('Hair Care', 'B1', 'Shampoo', 'Dry', 'Large'),
+    ('Hair Care', 'B1', 'Shampoo', 'Oily', None),
+    ('Hair Care', 'B1', 'Conditioner', 'Dry', 'Small'),
+    ('Hair Care', 'B2', 'Shampoo', '  ', 'Large'),
+    ('Hair Care', None, 'Mask', 'Dry', None),
+    ('Skin Care', 'B1', 'Serum', None, 'Small'),
+    ('Skin Care', 'B3', 'Toner', 'Oily', ''),
+]
+
+SELECTIONS = [
+    ([], {}),
+    (['B1'], {}),
+    (['B1'], {'attr1': ['Shampoo']}),
+    (['B1', 'B2'], {'attr1': ['Shampoo'], 'attr2': ['Dry']}),
+    ([], {'attr2': [EMPTY_FILTER_VALUE]}),
+    ([EMPTY_FILTER_VALUE], {}),
+    ([EMPTY_FILTER_VALUE, 'B3'], {'attr3': [EMPTY_FILTER_VALUE, 'Small']}),
+    (['missing'], {'attr1': ['Shampoo']}),
+]
+
+SCOPES = [(None, None), (['Hair Care'], None), (None, ['B1', 'B3']), (['Skin Care'], ['B1']), ([], None)]
+
+
+class LabelTaxonomyTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = Flask(__name__)
+        cls.app.config.update(
+            SQLALCHEMY_DATABASE_URI='sqlite:///:memory:',
+            SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        )
+        db.init_app(cls.app)
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        db.create_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        db.drop_all()
+        cls.app_context.pop()
+
+    def setUp(self):
+        SampleData.query.delete()
+        for category, brand, attr1, attr2, attr3 in ROWS:
+            db.session.add(SampleData(category=category, brand=brand, prod_attributes1=attr1,
+                                      prod_attributes2=attr2, prod_attributes3=attr3))
+        db.session.commit()
+        self.store_patch = mock.patch.object(cache, 'cache_store', LRUCache())
+        self.store_patch.start()
+        self.taxonomy = LabelTaxonomy(empty_marker=EMPTY_FILTER_VALUE)
+        self.assertTrue(self.taxonomy.build())
+
+    def tearDown(self):
+        self.store_patch.stop()
+
+    def options(self, brand_values, attr_values, categories, brands, use_taxonomy=True):
+        user = SimpleNamespace(is_authenticated=True, category_arr=categories, brand_arr=brands)
+        self.app.config['LABEL_TAXONOMY_ENABLED'] = use_taxonomy
+        try:
+            with mock.patch.object(labeling, 'label_taxonomy', self.taxonomy), \
+                    mock.patch.object(labeling, 'current_user', user):
+                return compute_label_options.__wrapped__(brand_values, attr_values)
+        finally:
+            self.app.config['LABEL_TAXONOMY_ENABLED'] = True
+
+    def test_matches_sql_options(self):
+        for categories, brands in SCOPES:
+            for brand_values, attr_values in SELECTIONS:
+                with self.subTest(categories=categories, brands=brands, brand_values=brand_values,
+                                  attr_values=attr_values):
+                    self.assertEqual(self.options(brand_values, attr_values, categories, brands),
+                                     self.options(brand_values, attr_values, categories, brands, False))
+
+    def test_selected_attribute_narrows_other_attributes_only(self):
+        options = self.options(['B1'], {'attr1': ['Shampoo'], 'attr2': ['Dry']}, ['Hair Care'], None)
+        self.assertEqual(options['attr1'], ['Conditioner', 'Shampoo'])
+        self.assertEqual(options['attr2'], ['Dry', 'Oily'])
+        self.assertEqual(options['attr3'], ['Large'])
+
+    def test_label_writes_reload_only_touched_scopes(self):
+        sample = SampleData.query.filter_by(brand='B2').one()
+        sample.prod_attributes1 = 'Mask'
+        db.session.add(SampleData(category='Skin Care', brand='B4', prod_attributes1='Cream'))
+        SampleData.query.filter_by(brand='B3').delete()
+        db.session.commit()
+        invalidate_scopes([('Hair Care', 'B2'), ('Skin Care', 'B4'), ('Skin Care', 'B3')])
+
+        with mock.patch.object(self.taxonomy, '_start_background_build') as rebuild:
+            self.assertTrue(self.taxonomy.ensure_fresh())
+        rebuild.assert_not_called()
+        for brand_values, attr_values in SELECTIONS:
+            self.assertEqual(self.options(brand_values, attr_values, None, None),
+                             self.options(brand_values, attr_values, None, None, False))
+        self.assertIn('Cream', self.options([], {}, None, None)['attr1'])
+        self.assertNotIn('Toner', self.options([], {}, None, None)['attr1'])
+
+    def test_full_invalidation_triggers_rebuild(self):
+        cache.cache_store.clear()
+        with mock.patch.object(self.taxonomy, '_start_background_build') as rebuild:
+            self.assertFalse(self.taxonomy.ensure_fresh())
+        rebuild.assert_called_once()
+
+    def test_scope_reload_queries_without_holding_the_lock(self):
+        invalidate_scopes([('Hair Care', 'B2')])
+        load = self.taxonomy._load_scopes
+        lock_free = []
+
+        def try_lock():
+            acquired = self.taxonomy._lock.acquire(blocking=False)
+            if acquired:
+                self.taxonomy._lock.release()
+            lock_free.append(acquired)
+
+        def load_and_probe(pairs):
+            # 查询期间其它线程(其它请求)可以取得锁
+            probe = threading.Thread(target=try_lock)
+            probe.start()
+            probe.join()
+            return load(pairs)
+
+        with mock.patch.object(self.taxonomy, '_load_scopes', side_effect=load_and_probe):
+            self.assertTrue(self.taxonomy.ensure_fresh())
+        self.assertEqual(lock_free, [True])
+
+    def test_stale_reload_result_is_discarded(self):
+        invalidate_scopes([('Hair Care', 'B2')])
+        since = self.taxonomy.generation
+
+        def concurrent_sync(pairs):
+            # 查询期间另一个请求已同步到更新的代数
+            self.taxonomy.generation = since + 100
+            return {pair: () for pair in pairs}, ()
+
+        with mock.patch.object(self.taxonomy, '_load_scopes', side_effect=concurrent_sync):
+            self.assertTrue(self.taxonomy.ensure_fresh())
+        self.assertEqual(self.taxonomy.generation, since + 100)
+        self.assertIn('Shampoo', self.options(['B2'], {}, None, None)['attr1'])
+
+    def test_process_local_backend_rebuilds_after_max_age(self):
+        self.taxonomy.built_at -= 121
+        with mock.patch.object(self.taxonomy, '_start_background_build') as rebuild:
+            self.assertFalse(self.taxonomy.ensure_fresh())
+        rebuild.assert_called_once()
+
+        with mock.patch.object(cache.cache_store, 'shared', True, create=True), \
+                mock.patch.object(self.taxonomy, '_start_background_build') as rebuild:
+            self.assertTrue(self.taxonomy.ensure_fresh())
+        rebuild.assert_not_called()
+
+    def test_path_limit(self):
+        self.assertFalse(self.taxonomy.build(max_paths=3))
+        self.assertFalse(self.taxonomy.ready)
+
+
+# 列声明 SQLite 的 NOCASE(不区分大小写)/RTRIM(忽略尾部空格)排序规则，模拟 MySQL *_ci 列上的取值合并
+COLLATED_COLUMNS = {'category': 'NOCASE', 'brand': 'NOCASE', 'prod_attributes1': 'NOCASE',
+                    'prod_attributes2': 'RTRIM'}
+COLLATED_ROWS = [
+    ('Hair Care', 'Apple', 'Shampoo', 'Dry'),
+    ('hair care', 'apple', 'SHAMPOO', 'Dry '),
+    ('Hair Care', 'APPLE', 'shampoo', 'Oily'),
+    ('Skin Care', 'Apple', 'Serum', 'Dry  '),
+    ('Skin Care', 'B2', 'serum', '  '),
+]
+
+
+class LabelTaxonomyCollationTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = Flask(__name__)
+        cls.app.config.update(
+            SQLALCHEMY_DATABASE_URI='sqlite:///:memory:',
+            SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        )
+        db.init_app(cls.app)
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        columns = SampleData.__table__.c
+        patches = [mock.patch.object(columns[name].type, 'collation', collation)
+                   for name, collation in COLLATED_COLUMNS.items()]
+        for patch in patches:
+            patch.start()
+        try:
+            db.create_all()
+        finally:
+            for patch in patches:
+                patch.stop()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        db.drop_all()
+        cls.app_context.pop()
+
+    def setUp(self):
+        SampleData.query.delete()
+        for category, brand, attr1, attr2 in COLLATED_ROWS:
+            db.session.add(SampleData(category=category, brand=brand, prod_attributes1=attr1, prod_attributes2=attr2))
+        db.session.commit()
+        self.store_patch = mock.patch.object(cache, 'cache_store', LRUCache())
+        self.store_patch.start()
+        self.taxonomy = LabelTaxonomy(empty_marker=EMPTY_FILTER_VALUE)
+        self.assertTrue(self.taxonomy.build())
+
+    def tearDown(self):
+        self.store_patch.stop()
+
+    options = LabelTaxonomyTests.options
+
+    @staticmethod
+    def folded(options):
+        """按测试排序规则折叠候选项(两条路径保留的原始写法可能不同)"""
+        return {key: sorted(value.lower().rstrip() for value in values) for key, values in options.items()}
+
+    def test_variants_merge_like_sql(self):
+        options = self.options([], {}, None, None)
+        self.assertEqual(self.folded(options)['attr1'], ['serum', 'shampoo'])
+        self.assertEqual(options['attr2'], ['Dry', 'Oily'])
+
+        scopes = [(None, None), (['HAIR CARE'], None), (None, ['apple']), (['skin care'], ['Apple ', 'b2'])]
+        selections = [([], {}), (['APPLE'], {}), ([], {'attr1': ['SERUM']}), (['apple'], {'attr2': ['Dry   ']}),
+                      ([], {'attr2': ['dry']}), ([EMPTY_FILTER_VALUE], {'attr1': ['Shampoo']})]
+        for categories, brands in scopes:
+            for brand_values, attr_values in selections:
+                with self.subTest(categories=categories, brands=brands, brand_values=brand_values,
+                                  attr_values=attr_values):
+                    self.assertEqual(self.folded(self.options(brand_values, attr_values, categories, brands)),
+                                     self.folded(self.options(brand_values, attr_values, categories, brands, False)))
+
+    def test_reload_merges_scope_variants(self):
+        SampleData.query.filter_by(category='hair care').update({'prod_attributes1': 'Mask'})
+        db.session.commit()
+        invalidate_scopes([('hair care', 'apple')])
+        self.assertTrue(self.taxonomy.ensure_fresh())
+        self.assertEqual(self.taxonomy.stats()['scopes'], 3)
+        self.assertEqual(self.folded(self.options([], {}, None, None)),
+                         self.folded(self.options([], {}, None, None, False)))
+
+
+if __name__ == '__main__':
+    unittest.main()
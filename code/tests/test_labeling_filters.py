@@ -1,17 +1,27 @@
 import unittest
+from unittest import mock
 
 from flask import Flask
 from sqlalchemy import and_, or_
+from sqlalchemy.dialects import mysql
+from werkzeug.datastructures import MultiDict
 
 from app.models import SampleData, db
 from app.routes.labeling import (
     EMPTY_FILTER_VALUE,
     SEARCH_FIELDS,
+    apply_sample_filters,
+    apply_status_filter,
     ci_contains,
+    fulltext_search,
+    parse_sample_filters,
     parse_search_terms,
     resolve_search_fields,
+    sample_filters,
+    search_term_condition,
     selected_value_condition,
 )
+from app.utils.fulltext_search import against_phrases
 
 
 class LabelingFilterTests(unittest.TestCase):
@@ -132,6 +142,83 @@ class LabelingFilterTests(unittest.TestCase):
         self.assertEqual(without_sku_url.preferred_link, 'https://example.com/product')
         self.assertIsNone(without_links.preferred_link)
 
+    def test_sample_filters_shared_by_list_and_export(self):
+        db.session.get(SampleData, 4).status = 'Labeled'
+        db.session.commit()
+        filters = parse_sample_filters(MultiDict([
+            ('keyword', 'apple'), ('exclude_terms', 'lotion'), ('attr2', EMPTY_FILTER_VALUE), ('attr2', 'Dry'),
+            ('status', 'Unlabeled'), ('start_date', 'bad-date'),
+        ]))
+        self.assertTrue(filters['date_invalid'])
+
+        query = apply_sample_filters(SampleData.query, filters)
+        self.assertEqual(sorted(sample.id for sample in query), [1, 4])
+        query = apply_status_filter(query, filters['status'])
+        self.assertEqual([sample.id for sample in query], [1])
+
+    def test_equivalent_filter_specs_share_digest_and_compiled_criteria(self):
+        spec = sample_filters.from_args(MultiDict([
+            ('keyword', ' apple '), ('keyword_mode', 'all'), ('attr2', 'Dry'), ('attr2', EMPTY_FILTER_VALUE),
+            ('keyword_fields', 'sku'), ('keyword_fields', 'product_description'), ('keyword_fields', 'category'),
+            ('status', 'Unlabeled'), ('page', '2'),
+        ]))
+        same = sample_filters.from_args(MultiDict([
+            ('status', 'Unlabeled'), ('attr2', EMPTY_FILTER_VALUE), ('attr2', 'Dry'), ('attr2', 'Dry'),
+            ('keyword', 'apple'), ('cursor', 'x'),
+        ]))
+        self.assertEqual(spec.digest, same.digest)
+        self.assertEqual(spec.args, {'keyword': ['apple'], 'attr2': sorted(['Dry', EMPTY_FILTER_VALUE]),
+                                     'status': ['Unlabeled']})
+        self.assertIs(spec.criteria(), same.criteria())
+        self.assertNotEqual(spec.digest, spec.without('status').digest)
+
+        expected = apply_status_filter(apply_sample_filters(SampleData.query, spec.parsed), spec['status'])
+        self.assertEqual(sorted(sample.id for sample in spec.apply(SampleData.query)),
+                         sorted(sample.id for sample in expected))
+
+    def test_filter_spec_url_args_round_trip(self):
+        spec = sample_filters.from_args(MultiDict([
+            ('keyword', 'apple shampoo; sku'), ('exclude_terms', 'lotion'), ('exclude_fields', 'sku'),
+            ('eretailer', 'Tmall'), ('start_date', '2026-01-05'), ('end_date', 'bad'),
+        ]))
+        params = spec.url_args(page=2, sort='', cursor=None)
+        self.assertEqual(params['page'], 2)
+        self.assertNotIn('sort', params)
+        self.assertEqual(params['start_date'], ['2026-01-05'])
+        self.assertNotIn('end_date', params)  # 无效日期不参与筛选，也不透传
+        params.pop('page')
+        self.assertEqual(sample_filters.from_args(MultiDict([(key, value) for key, values in params.items()
+                                                             for value in values])).digest, spec.digest)
+
+    def test_fulltext_phrases_skip_short_pieces(self):
+        self.assertEqual(against_phrases('apple shampoo', 2), '+"apple" +"shampoo"')
+        self.assertEqual(against_phrases('洗发水 a', 2), '+"洗发水"')
+        self.assertIsNone(against_phrases('a b', 2))
+        self.assertIsNone(against_phrases('say "hi"', 2))
+
+    def test_fulltext_candidates_are_rechecked_with_like(self):
+        filters = parse_sample_filters(MultiDict([
+            ('keyword', 'apple, sku'), ('keyword_mode', 'any'), ('exclude_terms', 'LOTION; banana'),
+        ]))
+        expected = sorted(sample.id for sample in apply_sample_filters(SampleData.query, filters))
+        self.assertEqual(expected, [1, 4])
+
+        # 索引只负责取候选行(此处模拟为全部行)：复核后的结果与 LIKE 完全一致
+        with mock.patch.object(fulltext_search, 'match_condition',
+                               lambda field, term, engine: SampleData.id.isnot(None)):
+            query = apply_sample_filters(SampleData.query, filters)
+            self.assertEqual(sorted(sample.id for sample in query), expected)
+
+    def test_fulltext_condition_on_mysql(self):
+        indexed = (frozenset({'product_description', 'sku'}), 2)
+        with mock.patch.object(fulltext_search, '_probe', return_value=indexed):
+            sql = str(search_term_condition(SEARCH_FIELDS, 'Apple shampoo').compile(dialect=mysql.dialect()))
+            short = str(search_term_condition(SEARCH_FIELDS, 'a').compile(dialect=mysql.dialect()))
+        self.assertEqual(sql.count('MATCH ('), 2)
+        self.assertIn('IN BOOLEAN MODE', sql)
+        self.assertEqual(sql.count('LIKE'), 3)  # 候选行复核 + category 无索引
+        self.assertNotIn('MATCH', short)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+
+from flask import Flask
+
+from app.models import SampleData, db
+from app.utils.merge_import import merge_import_csv_to_db
+
+
+class MergeImportTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.app = Flask(__name__)
+        cls.app.config.update(
+            SQLALCHEMY_DATABASE_URI='sqlite:///' + os.path.join(cls.tmpdir.name, 'merge.db'),
+            SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        )
+        db.init_app(cls.app)
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        db.create_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        cls.app_context.pop()
+        cls.tmpdir.cleanup()
+
+    def setUp(self):
+        db.session.query(SampleData).delete()
+        db.session.add_all([
+            SampleData(id=1, product_description='Apple shampoo', sku='S1', url='u1', sku_url=None,
+                       total='10', prod_attributes1='Hair', prod_attributes2='Dry', status='Labeled'),
+            SampleData(id=2, product_description='Banana wash ', sku='S2', url='u2', sku_url='',
+                       total='20', status='Unlabeled'),
+            SampleData(id=3, product_description='Old item', sku='S3', url='u3', sku_url='x',
+                       total='30', status='Labeled', prod_attributes1='Body'),
+        ])
+        db.session.commit()
+
+    def write_csv(self, body):
+        path = os.path.join(self.tmpdir.name, 'month.csv')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('product_description,sku,url,sku_url,total,total_comments\n' + body)
+        return path
+
+    def test_merge_updates_metrics_keeps_labels_and_inserts_new_keys(self):
+        path = self.write_csv(
+            ' Apple shampoo ,S1,u1,,11,5\n'
+            'Banana wash,S2,u2,,21,6\n'
+            'New item,S4,u4,,40,7\n'
+        )
+        ok, message = merge_import_csv_to_db(path, chunk_size=2)
+        self.assertTrue(ok, message)
+
+        rows = {row.sku: row for row in SampleData.query.all()}
+        self.assertEqual(set(rows), {'S1', 'S2', 'S3', 'S4'})
+        self.assertEqual((rows['S1'].id, rows['S1'].total, rows['S1'].total_comments), (1, '11', '5'))
+        self.assertEqual((rows['S1'].prod_attributes1, rows['S1'].status), ('Hair', 'Historical'))
+        self.assertEqual((rows['S2'].total, rows['S2'].status), ('21', 'Unlabeled'))
+        self.assertEqual((rows['S3'].total, rows['S3'].status), ('30', 'Labeled'))
+        self.assertEqual(rows['S4'].status, 'Unlabeled')
+        self.assertIn('新增 1 条', message)
+        self.assertIn('更新 2 条(其中 1 条转为Historical)', message)
+
+    def test_delete_missing_removes_absent_keys_only(self):
+        path = self.write_csv('Apple shampoo,S1,u1,,12,1\nNew item,S4,u4,,40,7\n')
+        ok, message = merge_import_csv_to_db(path, delete_missing=True)
+        self.assertTrue(ok, message)
+        self.assertEqual(sorted(row.sku for row in SampleData.query.all()), ['S1', 'S4'])
+        self.assertIn('删除 2 条', message)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from flask import Flask
+from sqlalchemy.dialects import mysql
+
+from app.models import PermissionScopeValue, SampleData, User, db
+from app.routes import labeling
+from app.utils.permission_scope import materialize_user_scope, prune_unused_scopes, scope_key, scope_value_insert
+
+
+class PermissionScopeTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = Flask(__name__)
+        cls.app.config.update(
+            SQLALCHEMY_DATABASE_URI='sqlite:///:memory:',
+            SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        )
+        db.init_app(cls.app)
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        db.create_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        db.drop_all()
+        cls.app_context.pop()
+
+    def setUp(self):
+        db.session.query(PermissionScopeValue).delete()
+        db.session.query(User).delete()
+        db.session.query(SampleData).delete()
+        db.session.add_all([
+            SampleData(id=1, category='Hair Care', brand='B1'),
+            SampleData(id=2, category='Hair Care', brand='B2'),
+            SampleData(id=3, category='Skin Care', brand='B1'),
+            SampleData(id=4, category='Skin Care', brand='B3'),
+            SampleData(id=5, category=None, brand='B1'),
+        ])
+        db.session.commit()
+
+    def add_user(self, username, categories, brands):
+        user = User(username=username, role='Labeller', category_arr=categories, brand_arr=brands)
+        user.set_password('x')
+        db.session.add(user)
+        materialize_user_scope(user)
+        db.session.commit()
+        return user
+
+    def scoped_ids(self, user):
+        with mock.patch.object(labeling, 'current_user', user):
+            query = labeling.apply_permission_scope(SampleData.query)
+            return sorted(row.id for row in query.all()), str(query.statement.compile(dialect=mysql.dialect()))
+
+    def test_scope_key_ignores_order_and_duplicates(self):
+        self.assertEqual(scope_key('brand', ['B2', 'B1', 'B1']), scope_key('brand', ['B1', 'B2']))
+        self.assertNotEqual(scope_key('brand', ['B1']), scope_key('category', ['B1']))
+        self.assertIsNone(scope_key('brand', None))
+
+    def test_materialized_scope_filters_through_subquery(self):
+        user = self.add_user('lab', ['Hair Care'], ['B1', 'B2'])
+        ids, sql = self.scoped_ids(user)
+        self.assertEqual(ids, [1, 2])
+        self.assertIn('permission_scope_value', sql)
+        self.assertNotIn("'Hair Care'", sql)
+
+    def test_unmaterialized_scope_falls_back_to_in_list(self):
+        user = SimpleNamespace(category_arr=['Skin Care'], brand_arr=None)
+        ids, sql = self.scoped_ids(user)
+        self.assertEqual(ids, [3, 4])
+        self.assertNotIn('permission_scope_value', sql)
+
+        # 权限被直接改动、与记录的 key 不一致时同样回退
+        stale = self.add_user('lab', ['Hair Care'], None)
+        stale.category_arr = ['Skin Care']
+        ids, sql = self.scoped_ids(stale)
+        self.assertEqual(ids, [3, 4])
+        self.assertNotIn('permission_scope_value', sql)
+
+    def test_full_permission_and_empty_permission(self):
+        self.assertEqual(self.scoped_ids(SimpleNamespace(category_arr=None, brand_arr=None))[0], [1, 2, 3, 4, 5])
+        user = self.add_user('nobody', [], None)
+        self.assertEqual(self.scoped_ids(user)[0], [])
+
+    def test_edit_materializes_new_scope_and_prunes_unused(self):
+        user = self.add_user('lab', ['Hair Care'], ['B1'])
+        self.add_user('other', ['Skin Care'], ['B1'])
+        old_key = scope_key('category', ['Hair Care'])
+
+        user.category_arr = ['Hair Care', 'Skin Care']
+        materialize_user_scope(user)
+        self.assertEqual(prune_unused_scopes(), 1)
+        db.session.commit()
+
+        keys = set(db.session.scalars(db.select(PermissionScopeValue.scope_key)))
+        self.assertNotIn(old_key, keys)
+        self.assertIn(scope_key('brand', ['B1']), keys)  # 仍被另一个用户引用
+        self.assertEqual(self.scoped_ids(user)[0], [1, 3])
+
+    def test_collation_equal_values_do_not_collide(self):
+        user = self.add_user('lab', None, ['Apple', 'apple', 'Apple ', 'B1'])
+        self.add_user('other', None, ['B1', 'apple', 'Apple ', 'Apple'])  # 同一 key 再次物化
+        stored = sorted(db.session.scalars(db.select(PermissionScopeValue.value)
+                                           .where(PermissionScopeValue.scope_key == user.brand_scope_key)))
+        self.assertEqual(stored, ['Apple', 'Apple ', 'B1', 'apple'])  # SQLite BINARY 排序规则下互不相等
+        self.assertEqual(self.scoped_ids(user)[0], [1, 3, 5])
+
+        # MySQL 默认排序规则下三者相等：由数据库判重，重复时空更新而不是主键冲突
+        sql = str(scope_value_insert('mysql').compile(dialect=mysql.dialect()))
+        self.assertIn('ON DUPLICATE KEY UPDATE value = permission_scope_value.value', sql)
+
+
+if __name__ == '__main__':
+    unittest.main()
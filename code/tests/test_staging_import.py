@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from flask import Flask
+from sqlalchemy import inspect
+
+from app.models import SampleData, db
+from app.utils.staging_import import import_csv_via_staging
+
+
+class StagingImportTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.app = Flask(__name__)
+        cls.app.config.update(
+            SQLALCHEMY_DATABASE_URI='sqlite:///' + os.path.join(cls.tmpdir.name, 'staging.db'),
+            SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        )
+        db.init_app(cls.app)
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        db.create_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        cls.app_context.pop()
+        cls.tmpdir.cleanup()
+
+    def setUp(self):
+        db.session.query(SampleData).delete()
+        db.session.add_all([
+            SampleData(id=1, product_description='Old A', sku='S1', status='Labeled', prod_attributes1='Hair'),
+            SampleData(id=2, product_description='Old B', sku='S2', status='Unlabeled'),
+        ])
+        db.session.commit()
+
+    def write_csv(self, body):
+        path = os.path.join(self.tmpdir.name, 'full.csv')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('product_description,sku,brand,category\n' + body)
+        return path
+
+    def index_names(self, table_name):
+        return {ix['name'] for ix in inspect(db.engine).get_indexes(table_name)}
+
+    def test_replaces_table_and_keeps_indexes(self):
+        before = self.index_names('sample_data')
+        path = self.write_csv('New A,N1,B1,C1\nNew B,N2,B2,C2\nNew C,N3,B1,C1\n')
+
+        ok, message = import_csv_via_staging(path, chunk_size=2)
+
+        self.assertTrue(ok, message)
+        rows = SampleData.query.order_by(SampleData.id).all()
+        self.assertEqual([row.sku for row in rows], ['N1', 'N2', 'N3'])
+        self.assertTrue(all(row.status == 'Unlabeled' for row in rows))
+        self.assertEqual(self.index_names('sample_data'), before)
+        self.assertNotIn('sample_data_staging', inspect(db.engine).get_table_names())
+
+    def test_failure_leaves_live_table_untouched(self):
+        path = self.write_csv('New A,N1,B1,C1\n')
+        with mock.patch('app.utils.staging_import._swap_tables', side_effect=RuntimeError('boom')):
+            ok, message = import_csv_via_staging(path)
+
+        self.assertFalse(ok)
+        self.assertIn('boom', message)
+        self.assertEqual(sorted(row.sku for row in SampleData.query.all()), ['S1', 'S2'])
+        self.assertNotIn('sample_data_staging', inspect(db.engine).get_table_names())
+
+
+if __name__ == '__main__':
+    unittest.main()